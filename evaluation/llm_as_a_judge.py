@@ -0,0 +1,362 @@
+"""
+Score model answers against the ground truth with an LLM judge.
+
+Scripted replacement for llm_as_a_judge.ipynb. Every CSV in individual_results/
+is read lazily and joined to evaluation_dataset.csv by question id. Judge prompts
+are sent concurrently, with the answers of several models to the same question
+packed into one request. Verdicts are cached on disk, so re-runs only score
+answers that are new or changed.
+
+    python llm_as_a_judge.py --backend ollama --model llama3 --concurrency 8
+"""
+import os
+import re
+import csv
+import sys
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import argparse
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from tqdm import tqdm
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'general_question_answering'))
+
+from rate_limiter import TokenBucket  # noqa: E402
+
+# Some fine-tuned models ramble past the csv module's default 128 KB field limit
+csv.field_size_limit(sys.maxsize)
+
+JUDGE_SYSTEM_PROMPT = """
+You are an expert judge in an LLM-as-a-judge system. Given a question and an answer,
+rank the answer from a score of 0 to 5 given the following criteria and score interpretation.
+Be as unbiased as possible and output ONLY the integer value 0, 1, 2, 3, 4, or 5. Output nothing else
+except for this integer.
+
+The use case you are judging is whether an LLM fine-tuned on SEC filing data is capable of producing helpful,
+truthful, and insightful analysis about a particular stock or company. Good answers are ones that would provide any information
+necessary to both answer the original question and spread to any details that would potentially affect investment.
+
+Here is the information you will need to judge each output. You will be provided a question, a ground truth answer, and a
+test answer (this is the one you're supposed to judge). Whenever you assign a score to the test answer, it should always be
+based on its quality RELATIVE to the ground truth answer. Use the original question for context to make this distinction.
+
+Criteria:
+
+Does the answer answer the question correctly, in the appropriate level of detail, and at the appropriate degree of complexity/age range?
+
+Score Rubric:
+
+0: The output is inappropriate, harmful, or hateful OR the output is irrelevant, unhelpful, speaks to a different stock/company, etc.
+1: The answer does not accurately summarize, ignores all instructions, or is incomplete/otherwise incorrect
+2: The answer completes the required task, but ignores most/some of intended parameters
+3: The answer Completes task and considers all instructions, but output does not fully reflect intended tone
+4: The answer is complete, correct, and reflective of intended scope and difficulty, but is somewhat less detailed than gold standard answer
+5: The answer is generally equal to gold standard in all aspects
+
+The message will be formatted like this:
+
+Question:
+
+<<Question Text Goes Here>>
+
+Ground Truth Answer:
+
+<<Answer Text Goes Here>>
+
+Test Answer:
+
+<<Answer Text Goes Here>>
+"""
+
+PACKED_INSTRUCTIONS = """
+This message contains several numbered test answers to the same question. Judge each one independently
+with the rubric above and output ONLY a JSON list of integers, one score per test answer, in order.
+For example, for three test answers: [4, 2, 5]
+"""
+
+# Part of every cache key, so changing the prompt re-scores everything
+PROMPT_VERSION = hashlib.sha256((JUDGE_SYSTEM_PROMPT + PACKED_INSTRUCTIONS).encode()).hexdigest()[:16]
+
+
+def format_single(question: str, ground_truth: str, answer: str) -> str:
+    """Build the judge message for one test answer."""
+    return f"Question:\n\n{question}\n\nGround Truth Answer:\n\n{ground_truth}\n\nTest Answer:\n\n{answer}\n"
+
+
+def format_packed(question: str, ground_truth: str, answers: List[str]) -> str:
+    """Build one judge message scoring several test answers to the same question."""
+    parts = [f"Question:\n\n{question}\n\nGround Truth Answer:\n\n{ground_truth}\n"]
+    for i, answer in enumerate(answers, 1):
+        parts.append(f"Test Answer {i}:\n\n{answer}\n")
+    return "\n".join(parts)
+
+
+def parse_score(text: str) -> Optional[int]:
+    """Pull the 0-5 score out of a single-answer verdict."""
+    match = re.search(r"\b[0-5]\b", text)
+    return int(match.group()) if match else None
+
+
+def parse_scores(text: str, expected: int) -> Optional[List[int]]:
+    """Pull the list of scores out of a packed verdict; None if it does not have `expected` valid scores."""
+    match = re.search(r"\[[^\]]*\]", text)
+    if not match:
+        return None
+    try:
+        scores = json.loads(match.group())
+    except json.JSONDecodeError:
+        return None
+    if len(scores) != expected or not all(isinstance(s, int) and 0 <= s <= 5 for s in scores):
+        return None
+    return scores
+
+
+class VerdictCache:
+    def __init__(self, path: str):
+        """On-disk store of judge verdicts keyed by a hash of question, answer and judge prompt."""
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, model TEXT, question_id TEXT, score INTEGER)"
+        )
+
+    @staticmethod
+    def key(question: str, answer: str, judge_model: str) -> str:
+        return hashlib.sha256("\x1f".join([PROMPT_VERSION, judge_model, question, answer]).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[int]:
+        row = self.conn.execute("SELECT score FROM verdicts WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, model: str, question_id: str, score: int) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?)", (key, model, question_id, score))
+        self.conn.commit()
+
+
+class OllamaJudge:
+    def __init__(self, model: str = "llama3", host: str = "http://localhost:11434"):
+        """Judge backed by a local Ollama server, the setup the original notebook used."""
+        self.model = model
+        self.url = host.rstrip('/') + "/api/chat"
+        self._session = None
+
+    async def complete(self, system: str, message: str) -> str:
+        import aiohttp
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        payload = {
+            "model": self.model,
+            "stream": False,
+            "options": {"temperature": 0},
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": message}],
+        }
+        async with self._session.post(self.url, json=payload) as response:
+            response.raise_for_status()
+            return (await response.json())["message"]["content"]
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+class GeminiJudge:
+    def __init__(self, model: str = "gemini-1.5-flash"):
+        """Judge backed by the Gemini API; needs GEMINI_API_KEY."""
+        import google.generativeai as genai
+        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+        self._genai = genai
+        self.model = model
+
+    async def complete(self, system: str, message: str) -> str:
+        model = self._genai.GenerativeModel(self.model, system_instruction=system)
+        response = await model.generate_content_async(message, generation_config={"temperature": 0})
+        return response.text
+
+    async def close(self) -> None:
+        pass
+
+
+def load_dataset(path: str) -> Tuple[Dict[str, Dict[str, str]], List[str]]:
+    """Return ground-truth rows by question id, plus question ids in file order."""
+    by_id, order = {}, []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            by_id[row['Question ID']] = row
+            order.append(row['Question ID'])
+    return by_id, order
+
+
+def iter_answers(paths: List[str], order: List[str], by_id: Dict[str, Dict[str, str]]) -> Iterator[Tuple[str, str, str]]:
+    """
+    Lazily yield (model, question_id, answer) from every answer file.
+
+    Files either carry real question ids (batch_qa.py output) or a row number
+    ('no', or a numeric 'question_id') that points into evaluation_dataset.csv.
+    """
+    for path in paths:
+        model = os.path.splitext(os.path.basename(path))[0]
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            id_column = 'question_id' if 'question_id' in reader.fieldnames else 'no'
+            answer_column = 'model_output' if 'model_output' in reader.fieldnames else 'answer'
+            for row in reader:
+                ref = row.get(id_column, '')
+                if ref in by_id:
+                    question_id = ref
+                elif ref.isdigit() and int(ref) < len(order):
+                    question_id = order[int(ref)]
+                else:
+                    continue
+                yield model, question_id, row.get(answer_column) or ''
+
+
+class JudgePipeline:
+    def __init__(self, judge, cache: VerdictCache, concurrency: int = 8, requests_per_second: float = 0.0,
+                 pack_size: int = 5):
+        """
+        Score answers concurrently, packing up to pack_size answers to one question per judge call.
+
+        Args:
+            judge: Backend with an async complete(system, message) method.
+            cache (VerdictCache): Verdict store consulted before and updated after every call.
+            concurrency (int): Maximum judge calls in flight.
+            requests_per_second (float): Judge request rate limit; 0 disables it.
+            pack_size (int): Answers scored per request; 1 sends one request per answer.
+        """
+        self.judge = judge
+        self.cache = cache
+        self.concurrency = concurrency
+        self.rate_limiter = TokenBucket(rate=requests_per_second, capacity=concurrency)
+        self.pack_size = max(1, pack_size)
+        self.judge_model = getattr(judge, 'model', type(judge).__name__)
+
+    async def _call(self, system: str, message: str) -> str:
+        async with self.semaphore:
+            await self.rate_limiter.acquire_async()
+            return await self.judge.complete(system, message)
+
+    async def _score_pack(self, question_id: str, truth: Dict[str, str], pending: List[Tuple[str, str, str]],
+                          scores: Dict[Tuple[str, str], int], progress: tqdm) -> None:
+        """Score one pack of (model, answer, cache key) for a question, falling back to single calls."""
+        question, ground_truth = truth['Question'], truth['Answer']
+        results = None
+        if len(pending) > 1:
+            try:
+                reply = await self._call(JUDGE_SYSTEM_PROMPT + PACKED_INSTRUCTIONS,
+                                         format_packed(question, ground_truth, [a for _, a, _ in pending]))
+                results = parse_scores(reply, len(pending))
+            except Exception as e:
+                tqdm.write(f"Packed judge call for {question_id} failed: {str(e)}")
+        if results is None:
+            results = []
+            for _, answer, _ in pending:
+                try:
+                    results.append(parse_score(await self._call(JUDGE_SYSTEM_PROMPT, format_single(question, ground_truth, answer))))
+                except Exception as e:
+                    tqdm.write(f"Judge call for {question_id} failed: {str(e)}")
+                    results.append(None)
+
+        for (model, _, key), score in zip(pending, results):
+            if score is not None:
+                self.cache.put(key, model, question_id, score)
+                scores[(model, question_id)] = score
+        progress.update(len(pending))
+
+    async def run(self, answers: Iterator[Tuple[str, str, str]], by_id: Dict[str, Dict[str, str]]) -> Dict[Tuple[str, str], int]:
+        """Return a score for every (model, question_id), judging only what the cache does not already have."""
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        scores: Dict[Tuple[str, str], int] = {}
+        todo: Dict[str, List[Tuple[str, str, str]]] = {}
+        for model, question_id, answer in answers:
+            key = self.cache.key(by_id[question_id]['Question'], answer, self.judge_model)
+            cached = self.cache.get(key)
+            if cached is not None:
+                scores[(model, question_id)] = cached
+            else:
+                todo.setdefault(question_id, []).append((model, answer, key))
+
+        packs = [
+            (question_id, items[i:i + self.pack_size])
+            for question_id, items in todo.items()
+            for i in range(0, len(items), self.pack_size)
+        ]
+        with tqdm(total=sum(len(p) for _, p in packs), desc="Judging answers", unit="answer") as progress:
+            await asyncio.gather(*(
+                self._score_pack(question_id, by_id[question_id], pack, scores, progress)
+                for question_id, pack in packs
+            ))
+        return scores
+
+
+def write_aggregate(scores: Dict[Tuple[str, str], int], order: List[str], output_path: str) -> pd.Series:
+    """
+    Write the scores in the layout of LLM_judge_results.csv and return each model's average, best first.
+
+    Rows are questions in dataset order, numbered by "Question No". Each model
+    has a "{model} Score" column followed by an "Average Score" column whose
+    value is on the first row only.
+    """
+    if not scores:
+        raise ValueError("No scores to aggregate; check --results-dir and the judge's responses")
+    frame = pd.DataFrame(
+        [{"Question ID": q, "model": m, "score": s} for (m, q), s in scores.items()]
+    ).pivot(index="Question ID", columns="model", values="score")
+    frame = frame.reindex([q for q in order if q in frame.index])
+    position = {q: i for i, q in enumerate(order)}
+
+    names, values = ["Question No"], [[position[q] for q in frame.index]]
+    for model in frame.columns:
+        names += [f"{model} Score", "Average Score"]
+        values += [list(frame[model]), [frame[model].mean()] + [None] * (len(frame) - 1)]
+    result = pd.DataFrame(dict(enumerate(values)))
+    result.columns = names
+    result.to_csv(output_path)
+    return frame.mean().sort_values(ascending=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--results-dir", default=os.path.join(HERE, "individual_results"), help="Folder of model answer CSVs")
+    parser.add_argument("--dataset", default=os.path.join(HERE, "evaluation_dataset.csv"))
+    parser.add_argument("--output", default=os.path.join(HERE, "judge_results.csv"))
+    parser.add_argument("--cache", default=os.path.join(HERE, "judge_cache.sqlite"), help="On-disk verdict cache")
+    parser.add_argument("--backend", choices=["ollama", "gemini"], default="ollama")
+    parser.add_argument("--model", default=None, help="Judge model (default: llama3 for Ollama, gemini-1.5-flash for Gemini)")
+    parser.add_argument("--ollama-host", default=os.getenv("OLLAMA_HOST", "http://localhost:11434"))
+    parser.add_argument("--concurrency", type=int, default=8, help="Judge calls in flight")
+    parser.add_argument("--rps", type=float, default=0.0, help="Judge requests per second (0 = unlimited)")
+    parser.add_argument("--pack", type=int, default=5, help="Answers to one question scored per judge call")
+    args = parser.parse_args()
+
+    if args.backend == "ollama":
+        judge = OllamaJudge(args.model or "llama3", args.ollama_host)
+    else:
+        judge = GeminiJudge(args.model or "gemini-1.5-flash")
+
+    by_id, order = load_dataset(args.dataset)
+    paths = sorted(
+        os.path.join(args.results_dir, name) for name in os.listdir(args.results_dir) if name.endswith('.csv')
+    )
+    pipeline = JudgePipeline(judge, VerdictCache(args.cache), concurrency=args.concurrency,
+                             requests_per_second=args.rps, pack_size=args.pack)
+
+    async def run():
+        try:
+            return await pipeline.run(iter_answers(paths, order, by_id), by_id)
+        finally:
+            await judge.close()
+
+    started = time.perf_counter()
+    scores = asyncio.run(run())
+    averages = write_aggregate(scores, order, args.output)
+    print(f"Scored {len(scores)} answers in {time.perf_counter() - started:.1f}s; written to {args.output}")
+    print(averages.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,220 @@
+import os
+import re
 import json
+import stat
+import argparse
+import tempfile
+from collections import Counter
 from pathlib import Path
-from sec_cik_mapper import StockMapper
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from tqdm import tqdm
 
-# Script to add ticker symbol to the dataset. 
-
-# Initialize the stock mapper
-mapper = StockMapper()
+# Script to add ticker symbol to the dataset.
+#
+# The CIK -> ticker mapping is downloaded once with sec_cik_mapper and cached in
+# MAPPING_PATH; later runs read the cached file and need no network. Files that
+# already carry a stock_ticker are skipped without being parsed.
 
 # Path to the JSON files directory
 json_dir = Path("data/10-K")
+MAPPING_PATH = Path("data/cik_to_ticker.json")
+
+# stock_ticker is appended as the last key, so enriched files end with it
+TAIL_BYTES = 4096
+TICKER_PATTERN = re.compile(rb'"stock_ticker"\s*:\s*"([^"]*)"')
+# cik is the first key of every filing
+HEAD_BYTES = 1024
+CIK_PATTERN = re.compile(rb'"cik"\s*:\s*"?(\d+)')
+
+# Share classes the app already uses for companies with several tickers
+PREFERRED_TICKERS = {'GOOGL', 'BRK-B'}
+
+# Set in each worker process by _init_worker
+_mapping: Dict[str, str] = {}
+
 
 def pad_cik(cik: int) -> str:
     """Convert CIK to a 10-digit zero-padded string."""
     return str(cik).zfill(10)
 
-def add_stock_ticker_to_json(file_path: Path, mapper):
-    """Add stock ticker to JSON file based on CIK."""
-    with open(file_path, 'r') as f:
-        data = json.load(f)
-    
-    # Check if 'cik' key exists and pad to 10 digits
-    if "cik" in data:
-        cik_padded = pad_cik(data["cik"])
-        tickers = mapper.cik_to_tickers.get(cik_padded)
-
-        # If ticker found, add it to the JSON data
-        if tickers:
-            # Assuming we only take the first ticker if multiple are present
-            data["stock_ticker"] = list(tickers)[0]
-
-            # Write back the updated JSON data
-            with open(file_path, 'w') as f:
-                json.dump(data, f, indent=4)
-            print(f"Updated {file_path.name} with ticker {data['stock_ticker']} for company {data['company']}")
-        else:
-            print(f"No ticker found for CIK {cik_padded} in {file_path.name}")
+
+def load_cik_mapping(path: Path = MAPPING_PATH, refresh: bool = False) -> Dict[str, List[str]]:
+    """Return {10-digit CIK: tickers} from the local cache, downloading it only when missing or refresh is set."""
+    if path.exists() and not refresh:
+        with open(path, 'r') as f:
+            mapping = json.load(f)
+        # Caches written before every ticker of a CIK was kept hold a single ticker
+        return {cik: [tickers] if isinstance(tickers, str) else tickers for cik, tickers in mapping.items()}
+
+    from sec_cik_mapper import StockMapper
+    mapper = StockMapper()
+    mapping = {cik: sorted(tickers) for cik, tickers in mapper.cik_to_tickers.items() if tickers}
+    _write_atomic(path, mapping)
+    print(f"Cached {len(mapping)} CIK to ticker mappings in {path}")
+    return mapping
+
+
+def preferred_ticker(tickers: List[str]) -> str:
+    """
+    Pick one ticker for a company with several share classes, the same way on every run.
+
+    PREFERRED_TICKERS come first, then tickers without a class suffix, then the
+    shortest, then the alphabetically first.
+    """
+    return min(tickers, key=lambda t: (t not in PREFERRED_TICKERS, '-' in t or '.' in t, len(t), t))
+
+
+def corpus_tickers(folder: Path) -> Dict[str, str]:
+    """Return {10-digit CIK: ticker} for the filings in folder that already carry a stock_ticker."""
+    seen: Dict[str, Counter] = {}
+    for file_path in folder.glob("*.json"):
+        ticker = existing_ticker(file_path)
+        if not ticker:
+            continue
+        with open(file_path, 'rb') as f:
+            match = CIK_PATTERN.search(f.read(HEAD_BYTES))
+        if match:
+            seen.setdefault(pad_cik(int(match.group(1))), Counter())[ticker] += 1
+    return {cik: counts.most_common(1)[0][0] for cik, counts in seen.items()}
+
+
+def resolve_tickers(mapping: Dict[str, List[str]], corpus: Dict[str, str]) -> Dict[str, str]:
+    """
+    Choose one ticker per CIK: the one the corpus already uses, else preferred_ticker.
+
+    Keeping the corpus's choice means new filings of a company land under the
+    same stock_ticker as its older ones and its market data.
+    """
+    resolved = {cik: preferred_ticker(tickers) for cik, tickers in mapping.items() if tickers}
+    resolved.update(corpus)
+    return resolved
+
+
+def _write_atomic(path: Path, data: dict) -> None:
+    """Write compact JSON to a temp file in the same folder and rename it over path."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        # mkstemp creates the file as 0600; keep the mode of the file being replaced
+        os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode) if path.exists() else _default_mode())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _default_mode() -> int:
+    """The mode open() gives a new file under the current umask."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def existing_ticker(file_path: Path) -> Optional[str]:
+    """Return the stock_ticker already in a file by reading only its tail, or None."""
+    with open(file_path, 'rb') as f:
+        f.seek(max(0, os.fstat(f.fileno()).st_size - TAIL_BYTES))
+        match = TICKER_PATTERN.search(f.read())
+    return match.group(1).decode() if match else None
+
+
+def _init_worker(mapping: Dict[str, str]) -> None:
+    global _mapping
+    _mapping = mapping
+
+
+def add_stock_ticker_to_json(file_path: Path, write: bool = True) -> Tuple[str, str, Optional[str]]:
+    """
+    Add stock ticker to JSON file based on CIK.
+
+    Args:
+        file_path (Path): Filing to enrich.
+        write (bool): Rewrite the file; when False only the ticker is returned, for the sidecar manifest.
+
+    Returns:
+        Tuple of (file name, status, ticker) where status is one of
+        'skipped', 'updated', 'no_ticker', 'no_cik' or 'error'.
+    """
+    try:
+        ticker = existing_ticker(file_path)
+        if ticker:
+            return file_path.name, 'skipped', ticker
+
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+        if "cik" not in data:
+            return file_path.name, 'no_cik', None
+
+        ticker = _mapping.get(pad_cik(data["cik"]))
+        if not ticker:
+            return file_path.name, 'no_ticker', None
+        if write:
+            data["stock_ticker"] = ticker
+            _write_atomic(file_path, data)
+        return file_path.name, 'updated', ticker
+    except (OSError, json.JSONDecodeError) as e:
+        return file_path.name, 'error', str(e)
+
+
+def enrich_folder(folder: Path, mapping: Dict[str, str], workers: Optional[int] = None,
+                  sidecar: Optional[Path] = None) -> Dict[str, int]:
+    """
+    Add stock_ticker to every filing in folder that lacks one, in a process pool.
+
+    Args:
+        folder (Path): Folder of 10-K JSON files.
+        mapping (dict): {10-digit CIK: ticker}.
+        workers (int): Worker processes; defaults to the CPU count.
+        sidecar (Path): Instead of rewriting filings, write {file name: ticker} to this file.
+
+    Returns:
+        Count of files per status.
+    """
+    files = sorted(folder.glob("*.json"))
+    workers = workers or os.cpu_count() or 1
+    stats = {'skipped': 0, 'updated': 0, 'no_ticker': 0, 'no_cik': 0, 'error': 0}
+    tickers: Dict[str, str] = {}
+    write = sidecar is None
+
+    if workers <= 1:
+        _init_worker(mapping)
+        results = (add_stock_ticker_to_json(path, write) for path in files)
+        executor = None
     else:
-        print(f"No 'cik' field found in {file_path.name}")
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(mapping,))
+        results = executor.map(add_stock_ticker_to_json, files, [write] * len(files), chunksize=16)
+
+    try:
+        for name, status, detail in tqdm(results, total=len(files), desc="Adding tickers", unit="file"):
+            stats[status] += 1
+            if status in ('skipped', 'updated'):
+                tickers[name] = detail
+            elif status == 'error':
+                tqdm.write(f"Error processing {name}: {detail}")
+            else:
+                tqdm.write(f"No {'ticker' if status == 'no_ticker' else 'cik'} found for {name}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if sidecar is not None:
+        _write_atomic(sidecar, tickers)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add stock_ticker to 10-K JSON files based on their CIK.")
+    parser.add_argument("--folder", default=str(json_dir), help="Folder containing the JSON files")
+    parser.add_argument("--mapping", default=str(MAPPING_PATH), help="Cached CIK to ticker mapping")
+    parser.add_argument("--refresh-mapping", action="store_true", help="Download the mapping again with sec_cik_mapper")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--sidecar", default=None, help="Write a {file: ticker} manifest here instead of rewriting files")
+    args = parser.parse_args()
 
-# Process all JSON files in the directory
-for json_file in json_dir.glob("*.json"):
-    add_stock_ticker_to_json(json_file, mapper)
+    mapping = resolve_tickers(load_cik_mapping(Path(args.mapping), refresh=args.refresh_mapping),
+                              corpus_tickers(Path(args.folder)))
+    stats = enrich_folder(Path(args.folder), mapping, workers=args.workers,
+                          sidecar=Path(args.sidecar) if args.sidecar else None)
+    print(f"Ticker enrichment finished: {stats}")
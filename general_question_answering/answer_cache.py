@@ -0,0 +1,101 @@
+import hashlib
+import json
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING
+from pymongo.collection import Collection
+
+from cache import TTLCache
+
+# Collection in the stock_data database holding cached answers
+ANSWER_CACHE_COLLECTION = "answer_cache"
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case a question and collapse whitespace and trailing punctuation, so trivial variants share an entry."""
+    return re.sub(r"\s+", " ", question.lower()).strip(" ?!.")
+
+
+def answer_key(symbol: str, question: str, filenames: List[str], last_updated: Optional[datetime]) -> str:
+    """Key an answer by question, symbol and the version of the data it was based on."""
+    version = [symbol.upper(), normalize_question(question), filenames,
+               last_updated.isoformat() if last_updated is not None else None]
+    return hashlib.sha1(json.dumps(version).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    def __init__(self, collection: Optional[Collection] = None, ttl: float = 3600.0, max_entries: int = 10_000,
+                 memory_size: int = 1024, trim_every: int = 100):
+        """Answers to repeated questions, kept in memory and in MongoDB.
+
+        Entries are keyed by answer_key, so new filings or a market data refresh
+        change the key and old answers are simply never read again. They expire
+        ttl seconds after they are stored; MongoDB removes them with a TTL
+        index. Every trim_every stores, the oldest stored answers beyond
+        max_entries are deleted, so the collection can briefly exceed it by
+        that many per process. The memory tier evicts its least recently used
+        entries.
+
+        Args:
+            collection (Collection): Where answers are stored so restarts and other workers reuse them.
+            ttl (float): Seconds an answer stays valid.
+            max_entries (int): Maximum answers kept in MongoDB.
+            memory_size (int): Answers held in memory by each process.
+            trim_every (int): Stores between two checks of max_entries.
+        """
+        self.collection = collection
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory = TTLCache(maxsize=memory_size, ttl=ttl)
+        self.mongo_hits = 0
+        self.trim_every = trim_every
+        self._stores = 0
+        if collection is not None:
+            collection.create_index("expires_at", expireAfterSeconds=0, name="expires_at_ttl")
+            collection.create_index([("created_at", ASCENDING)], name="created_at")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached answer for key, or None."""
+        answer = self.memory.get(key)
+        if answer is not None or self.collection is None:
+            return answer
+        # The TTL monitor only runs once a minute, so expiry is checked here as well
+        now = datetime.utcnow()
+        doc = self.collection.find_one({"_id": key, "expires_at": {"$gt": now}}, {"answer": 1, "expires_at": 1})
+        if doc is None:
+            return None
+        self.mongo_hits += 1
+        # Keep the memory copy only as long as the stored answer is still valid
+        self.memory.set(key, doc["answer"], ttl=(doc["expires_at"] - now).total_seconds())
+        return doc["answer"]
+
+    def set(self, key: str, answer: str, **fields: Any) -> None:
+        """Store an answer, with any fields worth keeping next to it (symbol, question)."""
+        self.memory.set(key, answer)
+        if self.collection is None:
+            return
+        now = datetime.utcnow()
+        self.collection.replace_one({"_id": key}, {
+            "answer": answer, **fields, "created_at": now, "expires_at": now + timedelta(seconds=self.ttl),
+        }, upsert=True)
+        self._stores += 1
+        if self._stores % self.trim_every == 0:
+            self.trim()
+
+    def trim(self) -> int:
+        """Delete the oldest stored answers beyond max_entries; returns the number removed."""
+        if self.collection is None:
+            return 0
+        excess = self.collection.estimated_document_count() - self.max_entries
+        if excess <= 0:
+            return 0
+        oldest = [doc["_id"] for doc in self.collection.find({}, {"_id": 1}).sort("created_at", 1).limit(excess)]
+        return self.collection.delete_many({"_id": {"$in": oldest}}).deleted_count
+
+    def stats(self) -> Dict[str, Any]:
+        """Return memory tier counters, including answers found in MongoDB after a memory miss."""
+        stats = self.memory.stats()
+        stats["mongo_hits"] = self.mongo_hits
+        return stats
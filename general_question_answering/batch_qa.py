@@ -0,0 +1,178 @@
+import os
+import csv
+import time
+import asyncio
+import logging
+import argparse
+from typing import Any, Dict, Iterator, List, Optional, Set
+from tqdm import tqdm
+from dotenv import load_dotenv
+from main import StockAnalyzer
+from rate_limiter import TokenBucket
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET = os.path.join(HERE, '..', 'evaluation', 'evaluation_dataset.csv')
+DEFAULT_OUTPUT = os.path.join(HERE, '..', 'evaluation', 'individual_results', 'gemini_batch_results.csv')
+
+# Same layout as the other files in evaluation/individual_results
+OUTPUT_FIELDS = ['question_id', 'company', 'ticker', 'question', 'ground_truth', 'model_output', 'latency_s']
+
+
+def read_questions(dataset_path: str, done: Set[str], limit: Optional[int] = None) -> Iterator[Dict[str, str]]:
+    """Stream rows from the evaluation dataset, skipping question ids that already have answers."""
+    count = 0
+    with open(dataset_path, newline='') as f:
+        for row in csv.DictReader(f):
+            if row['Question ID'] in done:
+                continue
+            if limit is not None and count >= limit:
+                return
+            count += 1
+            yield row
+
+
+def completed_question_ids(output_path: str) -> Set[str]:
+    """Return the question ids already written to the output file, so a run can resume."""
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, newline='') as f:
+        return {row['question_id'] for row in csv.DictReader(f)}
+
+
+def company_tickers(analyzer: StockAnalyzer) -> Dict[str, str]:
+    """Map company names as they appear in the filings to their stock tickers."""
+    pipeline = [
+        {"$match": {"stock_ticker": {"$ne": None}}},
+        {"$group": {"_id": "$company", "ticker": {"$first": "$stock_ticker"}}},
+    ]
+    return {doc['_id']: doc['ticker'] for doc in analyzer.sec_db.filings.aggregate(pipeline)}
+
+
+class BatchQuestionAnswering:
+    def __init__(self, analyzer: StockAnalyzer, output_path: str, concurrency: int = 8,
+                 requests_per_second: float = 2.0, max_retries: int = 3):
+        """
+        Answer many evaluation questions with StockAnalyzer.ask_about_stock.
+
+        Questions are grouped by company so each company's data is fetched once.
+        Gemini calls run concurrently, capped by `concurrency` and paced by a rate
+        limiter. Each answer is appended to the output CSV as soon as it arrives,
+        so an interrupted run resumes where it stopped.
+
+        Args:
+            analyzer (StockAnalyzer): Analyzer used to build prompts and call Gemini.
+            output_path (str): CSV file answers are appended to.
+            concurrency (int): Maximum Gemini calls in flight.
+            requests_per_second (float): Gemini request rate limit.
+            max_retries (int): Attempts per question before it is left for the next run.
+        """
+        self.analyzer = analyzer
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.rate_limiter = TokenBucket(rate=requests_per_second, capacity=concurrency)
+        self.max_retries = max_retries
+        self.failed = 0
+
+    async def _answer(self, row: Dict[str, str], ticker: str, stock_data: Any, writer: csv.DictWriter,
+                      out_file, progress: tqdm) -> None:
+        """Answer one question with retries and append the result."""
+        async with self.semaphore:
+            for attempt in range(1, self.max_retries + 1):
+                await self.rate_limiter.acquire_async()
+                started = time.perf_counter()
+                try:
+                    answer = await self.analyzer.ask_about_stock(row['Question'], ticker, stock_data)
+                    break
+                except Exception as e:
+                    logging.warning(f"{row['Question ID']} attempt {attempt} failed: {str(e)}")
+                    await asyncio.sleep(2 ** attempt)
+            else:
+                self.failed += 1
+                progress.update(1)
+                return
+
+        writer.writerow({
+            'question_id': row['Question ID'],
+            'company': row['Company'],
+            'ticker': ticker,
+            'question': row['Question'],
+            'ground_truth': row['Answer'],
+            'model_output': answer,
+            'latency_s': round(time.perf_counter() - started, 3),
+        })
+        out_file.flush()
+        progress.update(1)
+
+    async def _run_company(self, company: str, rows: List[Dict[str, str]], ticker: Optional[str],
+                           writer: csv.DictWriter, out_file, progress: tqdm) -> None:
+        """Fetch a company's data once, then answer all its questions concurrently."""
+        if not ticker:
+            logging.error(f"No ticker found for {company}; skipping {len(rows)} questions")
+            self.failed += len(rows)
+            progress.update(len(rows))
+            return
+        try:
+            stock_data = await self.analyzer.get_stock_data_async(ticker)
+        except Exception as e:
+            logging.error(f"Error fetching data for {company} ({ticker}): {str(e)}")
+            self.failed += len(rows)
+            progress.update(len(rows))
+            return
+        await asyncio.gather(*(
+            self._answer(row, ticker, stock_data, writer, out_file, progress) for row in rows
+        ))
+
+    async def run(self, dataset_path: str, limit: Optional[int] = None) -> Dict[str, int]:
+        """Answer every unanswered question in the dataset and return counts."""
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        done = completed_question_ids(self.output_path)
+        by_company: Dict[str, List[Dict[str, str]]] = {}
+        for row in read_questions(dataset_path, done, limit):
+            by_company.setdefault(row['Company'], []).append(row)
+        total = sum(len(rows) for rows in by_company.values())
+        tickers = company_tickers(self.analyzer)
+
+        new_file = not os.path.exists(self.output_path)
+        with open(self.output_path, 'a', newline='') as out_file, \
+                tqdm(total=total, desc="Answering questions", unit="question") as progress:
+            writer = csv.DictWriter(out_file, fieldnames=OUTPUT_FIELDS)
+            if new_file:
+                writer.writeheader()
+            await asyncio.gather(*(
+                self._run_company(company, rows, tickers.get(company), writer, out_file, progress)
+                for company, rows in by_company.items()
+            ))
+
+        return {"skipped": len(done), "answered": total - self.failed, "failed": self.failed}
+
+
+def main():
+    """Run the batch question answering from the command line."""
+    parser = argparse.ArgumentParser(description="Answer the evaluation dataset with StockAnalyzer.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Evaluation CSV with Question ID, Company, Question, Answer")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="CSV answers are appended to; re-runs resume from it")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum Gemini calls in flight")
+    parser.add_argument("--rps", type=float, default=2.0, help="Gemini requests per second")
+    parser.add_argument("--limit", type=int, default=None, help="Only answer this many new questions")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    load_dotenv()
+    api_key = os.getenv('GEMINI_API_KEY')
+    mongodb_uri = os.getenv('MONGODB_URI')
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+    if not mongodb_uri:
+        raise ValueError("MONGODB_URI not found in environment variables")
+
+    analyzer = StockAnalyzer(api_key, mongodb_uri, io_workers=args.concurrency * 2)
+    runner = BatchQuestionAnswering(analyzer, args.output, concurrency=args.concurrency,
+                                    requests_per_second=args.rps)
+    started = time.perf_counter()
+    stats = asyncio.run(runner.run(args.dataset, limit=args.limit))
+    stats["seconds"] = round(time.perf_counter() - started, 1)
+    print(f"Batch run finished: {stats}")
+
+
+if __name__ == "__main__":
+    main()
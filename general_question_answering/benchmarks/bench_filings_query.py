@@ -0,0 +1,79 @@
+"""
+Benchmark StockAnalyzer.get_sec_filings latency against a MongoDB server.
+
+Queries every ticker in a scratch copy of the filings repeatedly, with and
+without the (stock_ticker, filing_date) compound index, for full,
+metadata-only and item-subset projections, and prints p50/p99 latencies as
+JSON. The index is only dropped in the scratch database, never in sec_data.
+
+    python benchmarks/bench_filings_query.py --uri mongodb://localhost:27017/ --seed
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from pymongo import MongoClient
+
+from common import CORPUS_DIR, percentiles
+
+from load_data_into_mongodb import load_sec_filings_to_mongo
+from main import StockAnalyzer
+
+SCENARIOS = {
+    "latest_full": {},
+    "latest_metadata": {"items": []},
+    "latest_item_1A_7": {"items": ["item_1A", "item_7"]},
+    "recent_5_metadata": {"items": [], "limit": 5},
+}
+
+
+def run_scenarios(analyzer, tickers, rounds):
+    results = {}
+    for name, kwargs in SCENARIOS.items():
+        samples = []
+        for _ in range(rounds):
+            for ticker in random.sample(tickers, len(tickers)):
+                started = time.perf_counter()
+                analyzer.get_sec_filings(ticker, **kwargs)
+                samples.append(time.perf_counter() - started)
+        results[name] = percentiles(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="sec_data_bench", help="Scratch database holding the filings")
+    parser.add_argument("--seed", action="store_true", help="Drop the scratch database and load data/10-K into it")
+    parser.add_argument("--rounds", type=int, default=5, help="Queries per ticker per scenario")
+    args = parser.parse_args()
+
+    if args.db == "sec_data":
+        raise SystemExit("--db must be a scratch database; the benchmark drops indexes in it")
+    if args.seed:
+        MongoClient(args.uri).drop_database(args.db)
+        load_sec_filings_to_mongo(CORPUS_DIR, args.uri, db_name=args.db)
+
+    analyzer = StockAnalyzer("benchmark", args.uri)
+    analyzer.sec_db = analyzer.mongo_client[args.db]
+    filings = analyzer.sec_db.filings
+    tickers = sorted(t for t in filings.distinct("stock_ticker") if t)
+    if not tickers:
+        raise SystemExit(f"{args.db}.filings is empty; run with --seed")
+
+    try:
+        if "stock_ticker_filing_date" in filings.index_information():
+            filings.drop_index("stock_ticker_filing_date")
+        without_index = run_scenarios(analyzer, tickers, args.rounds)
+    finally:
+        analyzer.ensure_indexes()
+    with_index = run_scenarios(analyzer, tickers, args.rounds)
+
+    print(json.dumps({"tickers": len(tickers), "without_compound_index": without_index,
+                      "with_compound_index": with_index}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark load_sec_filings_to_mongo on the local 10-K corpus.
+
+Runs a forced (cold) load followed by a warm load, where every file is
+unchanged and should be skipped, and prints files/s and MB/s for both as JSON.
+
+    python benchmarks/bench_loader.py --uri mongodb://localhost:27017/ --workers 4
+"""
+import argparse
+import json
+import os
+
+from common import CORPUS_DIR
+
+import load_data_into_mongodb
+
+
+def _rates(stats):
+    seconds = stats["seconds"] or 1e-9
+    return {
+        **stats,
+        "files_per_sec": round(stats["files"] / seconds, 1),
+        "mb_per_sec": round(stats["bytes"] / 1_000_000 / seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--folder", default=CORPUS_DIR)
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="sec_data_bench", help="Scratch database, dropped before the run")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--mongomock", action="store_true", help="Use an in-memory mongomock client instead of --uri")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        client = mongomock.MongoClient()
+        load_data_into_mongodb.MongoClient = lambda uri: client
+    else:
+        from pymongo import MongoClient
+        MongoClient(args.uri).drop_database(args.db)
+
+    results = {}
+    for run, force in (("cold", True), ("warm", False)):
+        stats = load_data_into_mongodb.load_sec_filings_to_mongo(
+            args.folder, args.uri, db_name=args.db,
+            workers=args.workers, batch_size=args.batch_size, force=force
+        )
+        results[run] = _rates(stats)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
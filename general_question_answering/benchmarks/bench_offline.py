@@ -0,0 +1,169 @@
+"""
+End-to-end benchmark suite that runs without Yahoo, Atlas or a Gemini key.
+
+Yahoo Finance answers from benchmarks/fixtures (or synthetic data) after a
+simulated delay. MongoDB is mongomock unless --uri points at a scratch mongod.
+Gemini is a stub with a configurable time to first token and token rate.
+Scenarios:
+    bulk_load         load data/10-K into sec_data.filings
+    single_ask        sequential StockAnalyzer.ask_about_stock calls
+    concurrent_asks   --concurrency asks in flight at once
+    collector_sweep   StockDataCollector over every corpus ticker
+
+Throughput and p50/p95/p99 latencies are printed as JSON and optionally
+written to --output, so runs can be compared over time.
+
+    python benchmarks/bench_offline.py --asks 20 --concurrency 16 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from datetime import datetime
+
+from common import APP_DIR, CORPUS_DIR, percentiles
+
+import fakes
+
+QUESTIONS = [
+    "What are the main risk factors facing the company?",
+    "How has revenue grown and what drives it?",
+    "What does management say about liquidity and capital resources?",
+    "How does the company compete in its market?",
+    "What legal proceedings is the company involved in?",
+]
+
+SCENARIOS = ["bulk_load", "single_ask", "concurrent_asks", "collector_sweep"]
+
+
+def bulk_load(args):
+    from load_data_into_mongodb import load_sec_filings_to_mongo
+    stats = load_sec_filings_to_mongo(args.corpus, args.uri or "mongomock", workers=args.workers, force=True)
+    return {
+        "files": stats["files"],
+        "seconds": round(stats["seconds"], 3),
+        "files_per_sec": round(stats["files"] / stats["seconds"], 1),
+        "mb_per_sec": round(stats["bytes"] / 1e6 / stats["seconds"], 1),
+    }
+
+
+async def _timed_ask(analyzer, ticker, question, samples):
+    started = time.perf_counter()
+    await analyzer.ask_about_stock(question, ticker)
+    samples.append(time.perf_counter() - started)
+
+
+async def single_ask(analyzer, tickers, args):
+    samples = []
+    started = time.perf_counter()
+    for i in range(args.asks):
+        await _timed_ask(analyzer, tickers[i % len(tickers)], QUESTIONS[i % len(QUESTIONS)], samples)
+    elapsed = time.perf_counter() - started
+    return {**percentiles(samples), "asks_per_sec": round(len(samples) / elapsed, 2)}
+
+
+async def concurrent_asks(analyzer, tickers, args):
+    samples = []
+    total = args.asks * args.concurrency
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await _timed_ask(analyzer, random.choice(tickers), random.choice(QUESTIONS), samples)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    return {**percentiles(samples), "concurrency": args.concurrency, "asks_per_sec": round(total / elapsed, 2)}
+
+
+def collector_sweep(tickers, args):
+    from stock_collector import StockDataCollector
+    collector = StockDataCollector(args.uri or "mongomock", max_workers=args.collector_workers,
+                                   requests_per_second=args.collector_rps)
+    collector.get_index_components = lambda: set(tickers)
+    started = time.perf_counter()
+    collector.collect_stock_data(resume=False, batch_prices=args.batch_prices)
+    elapsed = time.perf_counter() - started
+    return {"symbols": len(tickers), "seconds": round(elapsed, 3),
+            "symbols_per_sec": round(len(tickers) / elapsed, 1), "batch_prices": args.batch_prices}
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--uri", default=None, help="Scratch mongod to use instead of mongomock")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="Folder of 10-K JSON files to load")
+    parser.add_argument("--workers", type=int, default=None, help="Loader parser processes")
+    parser.add_argument("--asks", type=int, default=20, help="Sequential asks, and asks per concurrent slot")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--yahoo-latency", type=float, default=0.1, help="Seconds per fake yfinance call")
+    parser.add_argument("--gemini-latency", type=float, default=0.5, help="Stub Gemini time to first token")
+    parser.add_argument("--gemini-tps", type=float, default=200.0, help="Stub Gemini tokens per second")
+    parser.add_argument("--response-tokens", type=int, default=300)
+    parser.add_argument("--collector-workers", type=int, default=5)
+    parser.add_argument("--collector-rps", type=float, default=0.0, help="Collector rate limit (0 = unlimited)")
+    parser.add_argument("--batch-prices", action="store_true", help="Run the collector sweep in --batch-prices mode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Also write the JSON report here")
+    parser.add_argument("--record-fixtures", action="store_true",
+                        help="Record real yfinance info for the corpus tickers into benchmarks/fixtures and exit")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    if args.record_fixtures:
+        from split_test_train import build_manifest
+        manifest = build_manifest(args.corpus, os.path.join(args.corpus, ".split_manifest"))
+        tickers = sorted({entry["ticker"] for entry in manifest.values() if entry["ticker"]})
+        print(f"Recorded {fakes.record_fixtures(tickers)} symbols in {fakes.FIXTURES_PATH}")
+        return
+
+    yahoo = fakes.FakeYahoo(latency=args.yahoo_latency)
+    fakes.install(yahoo, args.uri)
+    report = {
+        "started": datetime.utcnow().isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "record_fixtures")},
+        "mongo": "mongod" if args.uri else "mongomock",
+        "yahoo_fixtures": len(yahoo.fixtures),
+        "results": {},
+    }
+
+    # The ask and collector scenarios need filings, so the corpus is always loaded
+    report["results"]["bulk_load"] = bulk_load(args)
+
+    from main import StockAnalyzer
+    analyzer = StockAnalyzer("offline-benchmark", args.uri or "mongomock")
+    analyzer.model = fakes.StubGeminiModel(args.gemini_latency, args.gemini_tps, args.response_tokens)
+    tickers = sorted(t for t in analyzer.sec_db.filings.distinct("stock_ticker") if t)
+
+    if "single_ask" in args.scenarios:
+        report["results"]["single_ask"] = asyncio.run(single_ask(analyzer, tickers, args))
+    if "concurrent_asks" in args.scenarios:
+        report["results"]["concurrent_asks"] = asyncio.run(concurrent_asks(analyzer, tickers, args))
+    if "collector_sweep" in args.scenarios:
+        report["results"]["collector_sweep"] = collector_sweep(tickers, args)
+    if "bulk_load" not in args.scenarios:
+        del report["results"]["bulk_load"]
+
+    report["yahoo_calls"] = yahoo.calls
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
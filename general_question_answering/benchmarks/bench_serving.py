@@ -0,0 +1,196 @@
+"""
+Synthetic load test of the serving mode, run once per worker count.
+
+Each run starts the real app (main.StockQAApp.build_app) under uvicorn with
+--workers processes on one port. Every worker loads the corpus into its own
+mongomock database and answers with the stub Gemini model from fakes.py, so no
+network access or keys are needed. Once every worker reports it is warm, --clients
+concurrent clients POST /api/ask for --duration seconds. Answered and rejected
+requests per second and latency percentiles are reported as JSON, next to the
+answer cache hits and misses of all workers. The answer cache is off unless
+--answer-cache gives it a TTL, since the fixed question set would otherwise
+turn most requests into cache hits after the first round.
+
+    python benchmarks/bench_serving.py --workers 1 2 4 --clients 64 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+import aiohttp
+
+from common import APP_DIR, CORPUS_DIR, percentiles
+
+BENCH_DIR = os.path.join(APP_DIR, "benchmarks")
+
+QUESTIONS = [
+    "What are the main risk factors facing the company?",
+    "How has revenue grown and what drives it?",
+    "What does management say about liquidity and capital resources?",
+    "How does the company compete in its market?",
+]
+
+
+def create_offline_app():
+    """uvicorn app factory: the real app on fakes, configured through BENCH_* variables."""
+    import fakes
+    from load_data_into_mongodb import load_sec_filings_to_mongo
+
+    fakes.install(fakes.FakeYahoo(latency=float(os.environ["BENCH_YAHOO_LATENCY"])))
+    load_sec_filings_to_mongo(os.environ["BENCH_CORPUS"], "mongomock", workers=1)
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    os.environ.setdefault("MONGODB_URI", "mongomock")
+
+    from main import StockQAApp
+    app = StockQAApp()
+    app.analyzer.model = fakes.StubGeminiModel(
+        float(os.environ["BENCH_GEMINI_LATENCY"]), float(os.environ["BENCH_GEMINI_TPS"]),
+        int(os.environ["BENCH_RESPONSE_TOKENS"])
+    )
+    if not os.getenv("WARM_SYMBOLS"):
+        app.warm_symbols = sorted(t for t in app.analyzer.sec_db.filings.distinct("stock_ticker") if t)
+    return app.build_app()
+
+
+def _healthz(port: int):
+    # A fresh connection per call, so the kernel can hand it to any worker
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=2) as response:
+        return json.load(response)
+
+
+def wait_until_warm(port: int, workers: int, timeout: float) -> float:
+    """Poll /healthz until `workers` distinct processes report warmed; returns seconds waited."""
+    started = time.perf_counter()
+    warm_pids = set()
+    while len(warm_pids) < workers:
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"Only {len(warm_pids)} of {workers} workers warmed up in {timeout}s")
+        try:
+            health = _healthz(port)
+            if health["warmed"]:
+                warm_pids.add(health["pid"])
+        except OSError:
+            time.sleep(0.2)
+    return time.perf_counter() - started
+
+
+def answer_cache_counts(port: int, workers: int, timeout: float = 10.0):
+    """Sum the answer cache counters that /healthz reports, once from every worker."""
+    started = time.perf_counter()
+    by_pid = {}
+    while len(by_pid) < workers and time.perf_counter() - started < timeout:
+        health = _healthz(port)
+        by_pid[health["pid"]] = health["answer_cache"]
+    if not any(by_pid.values()):
+        return {"enabled": False}
+    counts = [stats for stats in by_pid.values() if stats]
+    mongo_hits = sum(stats["mongo_hits"] for stats in counts)
+    hits = sum(stats["hits"] for stats in counts) + mongo_hits
+    misses = sum(stats["misses"] for stats in counts) - mongo_hits
+    return {"enabled": True, "workers_reporting": len(by_pid), "hits": hits, "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0}
+
+
+async def load(port: int, tickers, args):
+    """Keep --clients requests in flight for --duration seconds."""
+    samples, statuses = [], {}
+    url = f"http://127.0.0.1:{port}/api/ask"
+    deadline = time.perf_counter() + args.duration
+
+    async def client(session):
+        while time.perf_counter() < deadline:
+            payload = {"symbol": random.choice(tickers), "question": random.choice(QUESTIONS)}
+            started = time.perf_counter()
+            async with session.post(url, json=payload) as response:
+                await response.read()
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+                if response.status == 200:
+                    samples.append(time.perf_counter() - started)
+                elif response.status == 503:
+                    await asyncio.sleep(0.05)
+
+    # One connection per client so connections spread over the workers
+    connector = aiohttp.TCPConnector(limit=args.clients)
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(client(session) for _ in range(args.clients)))
+    elapsed = time.perf_counter() - started
+    return {
+        **percentiles(samples),
+        "answers_per_sec": round(len(samples) / elapsed, 2),
+        "rejected_per_sec": round(statuses.get(503, 0) / elapsed, 2),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+def run_workers(workers: int, tickers, args):
+    env = {
+        **os.environ,
+        "BENCH_CORPUS": args.corpus, "BENCH_YAHOO_LATENCY": str(args.yahoo_latency),
+        "BENCH_GEMINI_LATENCY": str(args.gemini_latency), "BENCH_GEMINI_TPS": str(args.gemini_tps),
+        "BENCH_RESPONSE_TOKENS": str(args.response_tokens),
+        "GRADIO_CONCURRENCY_LIMIT": str(args.concurrency_limit), "QUEUE_MAX_SIZE": str(args.queue_size),
+        "METRICS_ENABLED": "1" if args.metrics else "0",
+        "ANSWER_CACHE_TTL": str(args.answer_cache),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench_serving:create_offline_app", "--factory",
+         "--app-dir", BENCH_DIR, "--port", str(args.port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=APP_DIR, env=env
+    )
+    try:
+        warm_seconds = wait_until_warm(args.port, workers, args.startup_timeout)
+        result = asyncio.run(load(args.port, tickers, args))
+        return {"workers": workers, "warmup_seconds": round(warm_seconds, 1), **result,
+                "answer_cache": answer_cache_counts(args.port, workers)}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, os.cpu_count() or 1}))
+    parser.add_argument("--clients", type=int, default=64, help="Concurrent HTTP clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per worker count")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="Folder of 10-K JSON files each worker loads")
+    parser.add_argument("--port", type=int, default=7870)
+    parser.add_argument("--concurrency-limit", type=int, default=16, help="GRADIO_CONCURRENCY_LIMIT per worker")
+    parser.add_argument("--queue-size", type=int, default=64, help="QUEUE_MAX_SIZE per worker")
+    parser.add_argument("--yahoo-latency", type=float, default=0.1)
+    parser.add_argument("--gemini-latency", type=float, default=0.05, help="Stub Gemini time to first token")
+    parser.add_argument("--gemini-tps", type=float, default=2000.0, help="Stub Gemini tokens per second")
+    parser.add_argument("--response-tokens", type=int, default=200)
+    parser.add_argument("--metrics", action="store_true", help="Keep request metrics on in the workers")
+    parser.add_argument("--answer-cache", type=float, default=0.0,
+                        help="ANSWER_CACHE_TTL in the workers; 0 (default) measures uncached answers")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Also write the JSON report here")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    from split_test_train import build_manifest
+    manifest = build_manifest(args.corpus, os.path.join(args.corpus, ".split_manifest"))
+    tickers = sorted({entry["ticker"] for entry in manifest.values() if entry["ticker"]})
+
+    runs = [run_workers(workers, tickers, args) for workers in args.workers]
+    baseline = runs[0]["answers_per_sec"] or 1
+    for run in runs:
+        run["speedup"] = round(run["answers_per_sec"] / baseline, 2)
+    report = {"cpus": os.cpu_count(), "config": {k: v for k, v in vars(args).items() if k != "output"}, "runs": runs}
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
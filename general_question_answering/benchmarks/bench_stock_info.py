@@ -0,0 +1,106 @@
+"""
+Benchmark ComprehensiveStockInfo memory and conversion speed over synthetic symbols.
+
+Compares the slotted class holding filing metadata references with an
+equivalent plain dataclass holding embedded full filings, converted with
+dataclasses.asdict as the app used to do. Prints memory per instance and
+throughput for construction from MongoDB documents and serialization as JSON.
+
+    python benchmarks/bench_stock_info.py --symbols 3000
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from dataclasses import asdict, fields, make_dataclass
+from datetime import datetime
+
+import common  # noqa: F401  (puts the app on sys.path)
+
+from market_data import ComprehensiveStockInfo
+
+# The same fields as a regular, __dict__-backed dataclass
+PlainStockInfo = make_dataclass(
+    "PlainStockInfo", [(f.name, f.type, f.default) if f.name != "symbol" else (f.name, f.type)
+                       for f in fields(ComprehensiveStockInfo)]
+)
+
+ITEMS = ["item_1", "item_1A", "item_2", "item_3", "item_7", "item_7A", "item_8"]
+
+
+def synthetic_doc(i: int) -> dict:
+    """A stock_data.stocks document with every market field set."""
+    doc = {"_id": i, "symbol": f"SYM{i}", "fundamentals_updated": datetime.utcnow()}
+    for f in fields(ComprehensiveStockInfo):
+        if f.name in ("symbol", "sec_filings"):
+            continue
+        doc[f.name] = datetime.utcnow() if f.name == "last_updated" else random.random() * 1e9
+    return doc
+
+
+def synthetic_filings(i: int, items: bool, item_chars: int) -> list:
+    """Five filings per symbol, as metadata only or with item text embedded."""
+    filings = []
+    for year in range(2020, 2025):
+        filing = {"filing_type": "10-K", "filing_date": f"{year}-02-01", "company": f"Company {i}",
+                  "filename": f"{i}_10K_{year}.json", "content_hash": f"{i:08x}{year}"}
+        if items:
+            filing.update({item: "x" * item_chars for item in ITEMS})
+        filings.append(filing)
+    return filings
+
+
+def measure(build, n: int) -> dict:
+    """Build n objects, returning bytes per object and build throughput."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    objects = [build(i) for i in range(n)]
+    seconds = time.perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"objects": objects, "bytes_per_symbol": size // n, "build_per_sec": round(n / seconds)}
+
+
+def throughput(func, objects) -> int:
+    started = time.perf_counter()
+    for obj in objects:
+        func(obj)
+    return round(len(objects) / (time.perf_counter() - started))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=3000)
+    parser.add_argument("--item-chars", type=int, default=20000, help="Characters per embedded filing item")
+    args = parser.parse_args()
+
+    docs = [synthetic_doc(i) for i in range(args.symbols)]
+    embedded = [synthetic_filings(i, True, args.item_chars) for i in range(args.symbols)]
+    refs = [synthetic_filings(i, False, 0) for i in range(args.symbols)]
+    market_fields = {f.name for f in fields(PlainStockInfo)}
+
+    plain = measure(lambda i: PlainStockInfo(sec_filings=embedded[i], **{
+        k: v for k, v in docs[i].items() if k in market_fields}), args.symbols)
+    slotted = measure(lambda i: ComprehensiveStockInfo.from_mongo(docs[i], sec_filings=refs[i]), args.symbols)
+
+    results = {
+        "symbols": args.symbols,
+        "plain_dataclass_embedded_filings": {
+            "bytes_per_symbol_excluding_filings": plain["bytes_per_symbol"],
+            "build_per_sec": plain["build_per_sec"],
+            "asdict_per_sec": throughput(asdict, plain["objects"]),
+            "json_per_sec": throughput(lambda o: json.dumps(asdict(o), default=str), plain["objects"]),
+        },
+        "slotted_filing_refs": {
+            "bytes_per_symbol_excluding_filings": slotted["bytes_per_symbol"],
+            "build_per_sec": slotted["build_per_sec"],
+            "to_dict_per_sec": throughput(ComprehensiveStockInfo.to_dict, slotted["objects"]),
+            "json_per_sec": throughput(lambda o: json.dumps(o.to_dict(), default=str), slotted["objects"]),
+        },
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Helpers shared by the benchmark scripts."""
+import os
+import sys
+from typing import Dict, List
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(APP_DIR, "data", "10-K")
+
+# Benchmarks import the application modules the same way the app does, from its own directory
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Summarize latency samples in seconds as p50/p95/p99/mean/max in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "n": len(ordered),
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
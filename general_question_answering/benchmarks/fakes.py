@@ -0,0 +1,164 @@
+"""
+Local stand-ins for Yahoo Finance, MongoDB and Gemini used by the offline benchmarks.
+
+install() patches the application modules in place, so StockAnalyzer,
+StockDataCollector and the filing loader run unchanged without a network.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from common import APP_DIR
+
+FIXTURES_PATH = os.path.join(APP_DIR, "benchmarks", "fixtures", "yfinance_info.json")
+
+# The yfinance info keys MarketDataFetcher reads
+INFO_KEYS = [
+    "currentPrice", "previousClose", "open", "dayLow", "dayHigh", "fiftyTwoWeekLow", "fiftyTwoWeekHigh",
+    "volume", "averageVolume", "averageVolume10days", "averageVolume3month", "marketCap", "enterpriseValue",
+    "beta", "trailingPE", "forwardPE", "pegRatio", "priceToBook", "priceToSalesTrailing12Months",
+    "dividendRate", "dividendYield", "totalRevenue", "revenuePerShare", "revenueGrowth", "grossProfits",
+    "ebitda", "netIncomeToCommon", "earningsGrowth", "totalCash", "totalDebt", "totalAssets",
+    "sharesOutstanding", "floatShares", "heldPercentInsiders", "heldPercentInstitutions", "shortRatio",
+    "shortPercentOfFloat",
+]
+
+
+def synthetic_info(symbol: str) -> Dict[str, Any]:
+    """A deterministic yfinance-style info dict for symbols without a recorded fixture."""
+    rng = random.Random(symbol)
+    info = {key: round(rng.uniform(0.1, 1e9), 4) for key in INFO_KEYS}
+    info.update({"longName": f"{symbol} Inc.", "sector": "Technology", "industry": "Software",
+                 "country": "United States", "website": f"https://www.{symbol.lower()}.com",
+                 "exDividendDate": 1700000000})
+    return info
+
+
+def load_fixtures(path: str = FIXTURES_PATH) -> Dict[str, Dict[str, Any]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def record_fixtures(symbols: Iterable[str], path: str = FIXTURES_PATH) -> int:
+    """Save real yfinance info dicts for symbols, for later offline runs. Needs network access."""
+    import yfinance as yf
+    fixtures = load_fixtures(path)
+    for symbol in symbols:
+        try:
+            fixtures[symbol] = {k: v for k, v in yf.Ticker(symbol).info.items() if k in INFO_KEYS or
+                                k in ("longName", "sector", "industry", "country", "website", "exDividendDate")}
+        except Exception as e:
+            print(f"Could not record {symbol}: {str(e)}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(fixtures, f, indent=1, sort_keys=True)
+    return len(fixtures)
+
+
+class FakeYahoo:
+    def __init__(self, latency: float = 0.1, fixtures: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Serve yf.Ticker(...).info and yf.download(...) from fixtures after a simulated network delay.
+
+        Args:
+            latency (float): Seconds each Ticker.info or download call takes.
+            fixtures (dict): Recorded info dicts by symbol; other symbols get synthetic data.
+        """
+        self.latency = latency
+        self.fixtures = load_fixtures() if fixtures is None else fixtures
+        self.calls = 0
+        yahoo = self
+
+        class Ticker:
+            def __init__(self, symbol: str):
+                self.symbol = symbol
+                self.components = []
+
+            @property
+            def info(self) -> Dict[str, Any]:
+                yahoo.calls += 1
+                time.sleep(yahoo.latency)
+                return dict(yahoo.fixtures.get(self.symbol) or synthetic_info(self.symbol))
+
+        self.Ticker = Ticker
+
+    def download(self, symbols: List[str], period: str = "1y", **kwargs: Any) -> pd.DataFrame:
+        """A year of synthetic daily bars for every symbol, shaped like yf.download(group_by='column')."""
+        self.calls += 1
+        time.sleep(self.latency)
+        days = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=252)
+        rng = np.random.default_rng(len(symbols))
+        close = pd.DataFrame(100 + rng.standard_normal((len(days), len(symbols))).cumsum(axis=0),
+                             index=days, columns=symbols)
+        frames = {
+            "Open": close.shift(1).fillna(close), "High": close * 1.01, "Low": close * 0.99,
+            "Close": close, "Adj Close": close,
+            "Volume": pd.DataFrame(rng.integers(1e5, 1e7, close.shape), index=days, columns=symbols),
+        }
+        return pd.concat(frames, axis=1)
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubGeminiModel:
+    def __init__(self, latency: float = 0.5, tokens_per_sec: float = 200.0, response_tokens: int = 300):
+        """
+        Stand-in for genai.GenerativeModel with a fixed time to first token and a token rate.
+
+        Args:
+            latency (float): Seconds before the first token.
+            tokens_per_sec (float): Generation speed after the first token.
+            response_tokens (int): Length of every answer.
+        """
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.response_tokens = response_tokens
+        self.prompt_chars: List[int] = []
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs: Any):
+        self.prompt_chars.append(len(prompt))
+        words = ["token"] * self.response_tokens
+        await asyncio.sleep(self.latency)
+        if not stream:
+            await asyncio.sleep(self.response_tokens / self.tokens_per_sec)
+            return _Response(" ".join(words))
+
+        async def chunks():
+            step = 20
+            for start in range(0, len(words), step):
+                await asyncio.sleep(min(step, len(words) - start) / self.tokens_per_sec)
+                yield _Response(" ".join(words[start:start + step]) + " ")
+        return chunks()
+
+
+def install(yahoo: FakeYahoo, mongo_uri: Optional[str] = None):
+    """
+    Patch the app's modules to use the fakes.
+
+    With mongo_uri None every MongoClient is one shared in-memory mongomock
+    client; otherwise the real server at mongo_uri is used as is.
+    """
+    import market_data
+    import load_data_into_mongodb
+
+    market_data.yf.Ticker = yahoo.Ticker
+    market_data.yf.download = yahoo.download
+    if mongo_uri is None:
+        import mongomock
+        client = mongomock.MongoClient()
+        market_data.MongoClient = lambda *args, **kwargs: client
+        load_data_into_mongodb.MongoClient = lambda *args, **kwargs: client
+        market_data._clients.clear()
+        return client
+    return None
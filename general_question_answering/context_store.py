@@ -0,0 +1,77 @@
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from pymongo.collection import Collection
+from pymongo.errors import DuplicateKeyError
+
+from cache import TTLCache
+
+# Collection in the sec_data database holding pre-rendered filing blocks
+CONTEXT_BLOCKS_COLLECTION = "context_blocks"
+
+
+def filing_block_key(filing: Dict[str, Any], kind: str) -> str:
+    """Key a filing block by filename and content hash so a reloaded filing never hits a stale block."""
+    return f"{kind}:{filing.get('filename')}:{filing.get('content_hash', '')}"
+
+
+class ContextStore:
+    def __init__(self, collection: Optional[Collection] = None, cache_size: int = 1024,
+                 provisional_ttl: float = 300.0):
+        """Pre-rendered context blocks, kept in memory and optionally persisted to MongoDB.
+
+        A 10-K never changes after it is filed, so its rendered text only has to be
+        built once. It is keyed by filename and content hash, and by data timestamp
+        for metric sections. Entries are never stale by time, only evicted when
+        the memory cache is full. Blocks built from data that is still being
+        produced, such as summaries of a running job, are provisional: they are
+        kept in memory for provisional_ttl seconds and never persisted.
+
+        Args:
+            collection (Collection): Where persistent blocks are stored, normally sec_data.context_blocks.
+            cache_size (int): Number of blocks kept in memory.
+            provisional_ttl (float): Seconds a provisional block is reused before it is built again.
+        """
+        self.collection = collection
+        self.memory = TTLCache(maxsize=cache_size, ttl=float('inf'))
+        self.provisional = TTLCache(maxsize=cache_size, ttl=provisional_ttl)
+
+    def get(self, key: str, build: Callable[[], Dict[str, Any]], persist: bool = True,
+            final: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Dict[str, Any]:
+        """Return the block stored under key, building and saving it on the first request.
+
+        Args:
+            key (str): Block key.
+            build (Callable): Produces the block as a dict when it is not stored yet.
+            persist (bool): Also keep the block in MongoDB so other processes and restarts reuse it.
+            final (Callable): Tells whether a built block is complete; if not, it is only kept provisionally.
+        """
+        block = self.memory.get(key)
+        if block is None and final is not None:
+            block = self.provisional.get(key)
+        if block is not None:
+            return block
+
+        if persist and self.collection is not None:
+            block = self.collection.find_one({"_id": key})
+        if block is None:
+            block = build()
+            if final is not None and not final(block):
+                self.provisional.set(key, block)
+                return block
+            if persist and self.collection is not None:
+                try:
+                    self.collection.replace_one({"_id": key}, {**block, "_id": key}, upsert=True)
+                except DuplicateKeyError:
+                    # Another request stored the same block at the same moment
+                    pass
+
+        self.memory.set(key, block)
+        return block
+
+
+def invalidate_filing_blocks(collection: Collection, filenames: Iterable[str]) -> int:
+    """Delete the persisted blocks of filings that were reloaded; returns the number removed."""
+    filenames = list(filenames)
+    if not filenames:
+        return 0
+    return collection.delete_many({"filename": {"$in": filenames}}).deleted_count
@@ -0,0 +1,197 @@
+"""
+Columnar snapshot of the 10-K corpus.
+
+Converts the JSON filings into one compressed Parquet file with one row per
+filing. It holds metadata columns (cik, ticker, filing_date, split, ...) and one
+string column per item. Readers memory-map the file and decode only the columns
+and rows they ask for, so nothing has to re-parse hundreds of MB of JSON. The
+train/test split is a column, so data/train and data/test are not needed.
+
+    python corpus_snapshot.py --input data/10-K --output data/corpus.parquet
+    python corpus_snapshot.py --split-seed 42     # split by hash instead of data/train, data/test
+
+Requires pyarrow (pip install pyarrow).
+"""
+import os
+import re
+import time
+import argparse
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pq = None
+
+from load_data_into_mongodb import _list_json_files, _parse_all
+from split_test_train import is_test_company
+
+SNAPSHOT_PATH = os.path.join("data", "corpus.parquet")
+
+METADATA_COLUMNS = [
+    "filename", "cik", "ticker", "company", "filing_type", "filing_date", "period_of_report",
+    "sic", "state_of_inc", "state_location", "fiscal_year_end", "filing_html_index", "htm_filing_link",
+    "complete_text_filing_link", "content_hash", "split",
+]
+
+# Filings per row group; readers filtering on ticker or split skip whole groups
+ROW_GROUP_SIZE = 32
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("corpus_snapshot needs pyarrow: pip install pyarrow")
+
+
+def _item_sort_key(column: str):
+    """Order item columns as in the filing: item_1, item_1A, ..., item_9C, item_10."""
+    match = re.match(r"item_(\d+)(\w*)", column)
+    return (int(match.group(1)), match.group(2)) if match else (1 << 30, column)
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def _split_from_folders(train_folder: Optional[str], test_folder: Optional[str]) -> Dict[str, str]:
+    """Read the existing split from which folder each filing was copied to."""
+    split = {}
+    for name, folder in (("train", train_folder), ("test", test_folder)):
+        if folder and os.path.isdir(folder):
+            split.update({os.path.basename(path): name for path in _list_json_files(folder)})
+    return split
+
+
+def build_snapshot(input_folder: str, output_path: str = SNAPSHOT_PATH, train_folder: Optional[str] = "data/train",
+                   test_folder: Optional[str] = "data/test", split_seed: Optional[int] = None,
+                   test_ratio: float = 0.2, workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Convert every JSON filing in input_folder into a zstd-compressed Parquet file.
+
+    Args:
+        input_folder (str): Folder containing the JSON files.
+        output_path (str): Parquet file to write; replaced atomically.
+        train_folder (str): Existing train folder used to fill the split column.
+        test_folder (str): Existing test folder used to fill the split column.
+        split_seed (int): If set, assign the split per company with split_test_train's seeded hash instead.
+        test_ratio (float): Proportion of companies in test when split_seed is set.
+        workers (int): Parser processes; defaults to the CPU count.
+
+    Returns:
+        Dict with the number of filings, source and snapshot bytes, and elapsed seconds.
+    """
+    _require_pyarrow()
+    started = time.perf_counter()
+    folder_split = {} if split_seed is not None else _split_from_folders(train_folder, test_folder)
+
+    rows: List[Dict[str, Any]] = []
+    item_columns = set()
+    source_bytes = 0
+    for file_path, data, error, size in _parse_all(_list_json_files(input_folder), {}, workers or os.cpu_count() or 1):
+        if error:
+            print(error)
+            continue
+        source_bytes += size
+        filename = os.path.basename(file_path)
+        ticker = data.get("stock_ticker")
+        if split_seed is not None:
+            split = ("test" if is_test_company(ticker, test_ratio, split_seed) else "train") if ticker else None
+        else:
+            split = folder_split.get(filename)
+        row = {
+            **{key: value for key, value in data.items() if key.startswith("item_")},
+            "filename": filename,
+            "cik": str(data["cik"]) if data.get("cik") is not None else None,
+            "ticker": ticker,
+            "filing_date": _parse_date(data.get("filing_date")),
+            "split": split,
+        }
+        for column in METADATA_COLUMNS:
+            row.setdefault(column, data.get(column))
+        item_columns.update(key for key in row if key.startswith("item_"))
+        rows.append(row)
+
+    # Sorted by ticker and date so row-group statistics prune ticker filters
+    rows.sort(key=lambda r: (r["ticker"] or "", r["filing_date"] or date.min))
+    items = sorted(item_columns, key=_item_sort_key)
+    schema = pa.schema(
+        [(column, pa.date32() if column == "filing_date" else pa.string()) for column in METADATA_COLUMNS]
+        + [(column, pa.string()) for column in items]
+    )
+    table = pa.Table.from_pylist(rows, schema=schema)
+
+    tmp_path = output_path + ".tmp"
+    pq.write_table(table, tmp_path, compression="zstd", row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, output_path)
+
+    return {
+        "filings": table.num_rows,
+        "source_bytes": source_bytes,
+        "snapshot_bytes": os.path.getsize(output_path),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def _filters(split: Optional[str], tickers: Optional[Sequence[str]]) -> Optional[list]:
+    filters = []
+    if split is not None:
+        filters.append(("split", "=", split))
+    if tickers is not None:
+        filters.append(("ticker", "in", list(tickers)))
+    return filters or None
+
+
+def read_snapshot(path: str = SNAPSHOT_PATH, columns: Optional[Sequence[str]] = None, split: Optional[str] = None,
+                  tickers: Optional[Sequence[str]] = None) -> "pa.Table":
+    """
+    Memory-map the snapshot and read only the requested columns and rows.
+
+    Args:
+        path (str): Snapshot written by build_snapshot.
+        columns (list): Columns to read, e.g. ["ticker", "filing_date", "item_1A"]; all when None.
+        split (str): Keep only 'train' or 'test' filings.
+        tickers (list): Keep only filings of these tickers.
+    """
+    _require_pyarrow()
+    return pq.read_table(path, columns=list(columns) if columns else None,
+                         filters=_filters(split, tickers), memory_map=True)
+
+
+def iter_filings(path: str = SNAPSHOT_PATH, columns: Optional[Sequence[str]] = None, split: Optional[str] = None,
+                 tickers: Optional[Sequence[str]] = None, batch_size: int = 64) -> Iterator[Dict[str, Any]]:
+    """Yield filings as dicts shaped like the JSON files, batch by batch.
+
+    Metadata is renamed back to the JSON keys (ticker -> stock_ticker, filing_date as ISO string).
+    filename is the JSON file name, as stored in MongoDB by the loader.
+    """
+    table = read_snapshot(path, columns, split, tickers)
+    for batch in table.to_batches(max_chunksize=batch_size):
+        for row in batch.to_pylist():
+            if "ticker" in row:
+                row["stock_ticker"] = row.pop("ticker")
+            if isinstance(row.get("filing_date"), date):
+                row["filing_date"] = row["filing_date"].isoformat()
+            yield row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a Parquet snapshot of the 10-K JSON corpus.")
+    parser.add_argument("--input", default="./data/10-K", help="Folder containing the JSON files")
+    parser.add_argument("--output", default=SNAPSHOT_PATH, help="Parquet file to write")
+    parser.add_argument("--train", default="./data/train", help="Existing train folder used for the split column")
+    parser.add_argument("--test", default="./data/test", help="Existing test folder used for the split column")
+    parser.add_argument("--split-seed", type=int, default=None, help="Assign the split by seeded ticker hash instead")
+    parser.add_argument("--test-ratio", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    args = parser.parse_args()
+
+    stats = build_snapshot(args.input, args.output, args.train, args.test, split_seed=args.split_seed,
+                           test_ratio=args.test_ratio, workers=args.workers)
+    print(f"Snapshot written to {args.output}: {stats['filings']} filings, "
+          f"{stats['source_bytes'] / 1e6:.1f} MB JSON -> {stats['snapshot_bytes'] / 1e6:.1f} MB Parquet "
+          f"in {stats['seconds']}s")
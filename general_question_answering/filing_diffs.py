@@ -0,0 +1,184 @@
+import os
+import re
+import time
+import logging
+import argparse
+from collections import Counter, defaultdict
+from datetime import datetime
+from itertools import chain
+from typing import Any, Dict, List, Optional, Set, Tuple
+from pymongo import ASCENDING, DESCENDING
+from pymongo.collection import Collection
+from tqdm import tqdm
+from dotenv import load_dotenv
+from market_data import get_mongo_client
+from prompt_builder import truncate_to_tokens
+
+# Collection in the sec_data database holding one diff document per filing, keyed by its filename
+FILING_DIFFS_COLLECTION = "filing_diffs"
+
+# Serves the history of a ticker newest first
+DIFFS_BY_TICKER_INDEX = [("stock_ticker", ASCENDING), ("filing_date", DESCENDING)]
+
+DIFF_ITEMS = ["item_1", "item_1A", "item_3", "item_7", "item_7A"]
+
+# Paragraphs shorter than this are headings, page numbers and the like
+MIN_PARAGRAPH_CHARS = 80
+# Word overlap (Jaccard) at which a paragraph counts as unchanged, and below which it counts as new
+SAME_THRESHOLD = 0.8
+REVISED_THRESHOLD = 0.5
+
+_WORD = re.compile(r"[a-z#]+")
+
+
+def paragraphs(text: str) -> List[str]:
+    """Split an item into its substantive paragraphs."""
+    return [p.strip() for p in re.split(r"\n+", text or "") if len(p.strip()) >= MIN_PARAGRAPH_CHARS]
+
+
+def _words(paragraph: str) -> Set[str]:
+    # Digits are masked so a paragraph that only moved to the next fiscal year still matches
+    return set(_WORD.findall(re.sub(r"\d+", "#", paragraph.lower())))
+
+
+def _best_matches(ours: List[str], theirs: List[str]) -> List[float]:
+    """For each paragraph of ours, the highest word overlap with any paragraph of theirs."""
+    their_words = [_words(p) for p in theirs]
+    postings: Dict[str, List[int]] = defaultdict(list)
+    for j, words in enumerate(their_words):
+        for word in words:
+            postings[word].append(j)
+    scores = []
+    for paragraph in ours:
+        words = _words(paragraph)
+        # Shared word counts with every paragraph of theirs that has any word in common
+        shared = Counter(chain.from_iterable(postings.get(word, ()) for word in words))
+        scores.append(max(
+            (count / (len(words) + len(their_words[j]) - count) for j, count in shared.items()), default=0.0
+        ))
+    return scores
+
+
+def _compact(passages: List[str], max_passages: int, passage_tokens: int) -> List[str]:
+    """Keep the longest passages, in document order, each cut to passage_tokens."""
+    keep = set(sorted(range(len(passages)), key=lambda i: -len(passages[i]))[:max_passages])
+    return [truncate_to_tokens(passages[i], passage_tokens) for i in sorted(keep)]
+
+
+def diff_item(previous: str, current: str, max_passages: int = 8, passage_tokens: int = 150) -> Dict[str, Any]:
+    """Passages added to, substantially revised in, and removed from one item between two filings."""
+    old, new = paragraphs(previous), paragraphs(current)
+    new_scores, old_scores = _best_matches(new, old), _best_matches(old, new)
+    changes = {
+        "added": [p for p, score in zip(new, new_scores) if score < REVISED_THRESHOLD],
+        "revised": [p for p, score in zip(new, new_scores) if REVISED_THRESHOLD <= score < SAME_THRESHOLD],
+        "removed": [p for p, score in zip(old, old_scores) if score < REVISED_THRESHOLD],
+    }
+    result: Dict[str, Any] = {}
+    for kind, passages in changes.items():
+        result[kind] = _compact(passages, max_passages, passage_tokens)
+        result[f"{kind}_total"] = len(passages)
+    return result
+
+
+def ensure_diff_indexes(collection: Collection) -> None:
+    collection.create_index(DIFFS_BY_TICKER_INDEX, name="stock_ticker_filing_date")
+
+
+def compute_diffs(filings: Collection, diffs: Collection, tickers: Optional[List[str]] = None,
+                  items: List[str] = DIFF_ITEMS, max_passages: int = 8, passage_tokens: int = 150,
+                  force: bool = False) -> Dict[str, int]:
+    """
+    Diff every pair of consecutive 10-K filings per ticker and store the changes.
+
+    Each document is keyed by the newer filing's filename and records both
+    filings' content_hash, so pairs that are already stored are skipped and a
+    reloaded filing is diffed again.
+
+    Args:
+        filings (Collection): sec_data.filings.
+        diffs (Collection): Where diffs are stored, normally sec_data.filing_diffs.
+        tickers (list): Only these tickers; all by default.
+        items (list): Item fields to compare.
+        max_passages (int): Added, revised and removed passages kept per item.
+        passage_tokens (int): Each kept passage is cut to about this many tokens.
+        force (bool): Recompute pairs that are already stored.
+    """
+    ensure_diff_indexes(diffs)
+    query = {"filing_type": "10-K", "stock_ticker": {"$in": tickers} if tickers else {"$ne": None}}
+    metadata = list(filings.find(query, {"_id": 0, "filename": 1, "content_hash": 1, "filing_date": 1,
+                                         "stock_ticker": 1}))
+    by_ticker: Dict[str, List[Dict[str, Any]]] = {}
+    for filing in metadata:
+        by_ticker.setdefault(filing["stock_ticker"], []).append(filing)
+
+    stored = {} if force else {
+        doc["_id"]: (doc.get("content_hash"), doc.get("previous_content_hash"))
+        for doc in diffs.find({}, {"content_hash": 1, "previous_content_hash": 1})
+    }
+    pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+    for ticker_filings in by_ticker.values():
+        ticker_filings.sort(key=lambda f: f["filing_date"])
+        for previous, current in zip(ticker_filings, ticker_filings[1:]):
+            if stored.get(current["filename"]) != (current.get("content_hash"), previous.get("content_hash")):
+                pairs.append((previous, current))
+
+    stats = {"pairs": len(pairs), "stored": 0, "failed": 0}
+    projection = {"_id": 0, **{item: 1 for item in items}}
+    texts: Dict[str, Dict[str, Any]] = {}
+    for previous, current in tqdm(pairs, desc="Diffing filings", unit="pair"):
+        try:
+            # Pairs of a ticker come in date order, so the previous pair's newer filing is this pair's older one
+            texts = {name: text for name, text in texts.items() if name == previous["filename"]}
+            for filing in (previous, current):
+                if filing["filename"] not in texts:
+                    texts[filing["filename"]] = filings.find_one({"filename": filing["filename"]}, projection) or {}
+            old, new = texts[previous["filename"]], texts[current["filename"]]
+            item_diffs = {
+                item: diff_item(old.get(item, ""), new.get(item, ""), max_passages, passage_tokens)
+                for item in items if old.get(item) or new.get(item)
+            }
+            diffs.replace_one({"_id": current["filename"]}, {
+                "stock_ticker": current["stock_ticker"],
+                "filename": current["filename"],
+                "filing_date": current["filing_date"],
+                "content_hash": current.get("content_hash"),
+                "previous_filename": previous["filename"],
+                "previous_filing_date": previous["filing_date"],
+                "previous_content_hash": previous.get("content_hash"),
+                "items": item_diffs,
+                "updated": datetime.utcnow(),
+            }, upsert=True)
+            stats["stored"] += 1
+        except Exception as e:
+            logging.error(f"Error diffing {previous['filename']} and {current['filename']}: {str(e)}")
+            stats["failed"] += 1
+    return stats
+
+
+def main():
+    """Compute filing diffs from the command line."""
+    parser = argparse.ArgumentParser(description="Store the changes between consecutive 10-K filings of each ticker.")
+    parser.add_argument("--tickers", nargs="+", default=None, help="Only these tickers")
+    parser.add_argument("--items", nargs="+", default=DIFF_ITEMS, help="Item fields to compare")
+    parser.add_argument("--max-passages", type=int, default=8, help="Passages of each kind kept per item")
+    parser.add_argument("--passage-tokens", type=int, default=150, help="Approximate length of each kept passage")
+    parser.add_argument("--force", action="store_true", help="Recompute diffs that are already stored")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    load_dotenv()
+    mongodb_uri = os.getenv('MONGODB_URI')
+    if not mongodb_uri:
+        raise ValueError("MONGODB_URI not found in environment variables")
+
+    sec_db = get_mongo_client(mongodb_uri).sec_data
+    started = time.perf_counter()
+    stats = compute_diffs(sec_db.filings, sec_db[FILING_DIFFS_COLLECTION], tickers=args.tickers, items=args.items,
+                          max_passages=args.max_passages, passage_tokens=args.passage_tokens, force=args.force)
+    stats["seconds"] = round(time.perf_counter() - started, 1)
+    print(f"Filing diffs finished: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,82 +1,201 @@
 import os
 import json
-from pymongo import MongoClient
+import hashlib
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from pymongo import ASCENDING, DESCENDING, MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
 from tqdm import tqdm
 from dotenv import load_dotenv
+from context_store import CONTEXT_BLOCKS_COLLECTION, invalidate_filing_blocks
 
-def load_sec_filings_to_mongo(folder_path: str, mongodb_uri: str, db_name: str = "sec_data", collection_name: str = "filings"):
+
+def _list_json_files(folder_path: str) -> List[str]:
+    """Return the paths of all JSON files below folder_path."""
+    return sorted(
+        os.path.join(root, file)
+        for root, _, files in os.walk(folder_path)
+        for file in files if file.endswith('.json')
+    )
+
+
+def _parse_filing(file_path: str, known_hash: Optional[str]) -> Tuple[str, Optional[Dict[str, Any]], Optional[str], int]:
+    """
+    Read and parse one filing, skipping the JSON parse when its content hash is already loaded.
+
+    Runs in a worker process.
+
+    Returns:
+        Tuple of (file_path, document or None if unchanged, error message or None, bytes read).
+    """
+    try:
+        with open(file_path, 'rb') as json_file:
+            raw = json_file.read()
+    except OSError as e:
+        return file_path, None, f"Error reading {file_path}: {str(e)}", 0
+
+    content_hash = hashlib.sha1(raw).hexdigest()
+    if content_hash == known_hash:
+        return file_path, None, None, len(raw)
+
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        return file_path, None, f"Error reading {file_path}: Not a valid JSON file", len(raw)
+
+    data["content_hash"] = content_hash
+    data["source_mtime"] = os.path.getmtime(file_path)
+    return file_path, data, None, len(raw)
+
+
+def _parse_all(paths: List[str], known_hashes: Dict[str, str], workers: int) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[str], int]]:
+    """Parse filings in a process pool, or inline when workers is 1."""
+    hashes = [known_hashes.get(os.path.basename(p)) for p in paths]
+    if workers <= 1:
+        yield from map(_parse_filing, paths, hashes)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_parse_filing, paths, hashes, chunksize=8)
+
+
+def _flush(collection, operations: List[UpdateOne], filings: List[Optional[str]], stats: Dict[str, Any]) -> None:
+    """Send a batch of upserts, counting failures instead of aborting the load.
+
+    filings[i] is the filename operations[i] (re)loads, or None for an update of
+    the recorded mtime only. In an unordered batch only the writes listed in a
+    BulkWriteError failed, so the others still count as loaded. Pre-rendered
+    context blocks of the filings that were (re)loaded are dropped.
+    """
+    failed = set()
+    try:
+        collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        failed = {error["index"] for error in e.details.get("writeErrors", [])}
+        applied = sum(e.details.get(field, 0) for field in ("nInserted", "nUpserted", "nModified"))
+        tqdm.write(f"{len(failed)} of {len(operations)} filings failed to insert ({applied} written): "
+                   f"{e.details.get('writeErrors', [{}])[0].get('errmsg')}")
+    except Exception as e:
+        stats["errors"] += len(operations)
+        tqdm.write(f"Error inserting batch of {len(operations)} filings: {str(e)}")
+        return
+    stats["errors"] += len(failed)
+    loaded = [file for i, file in enumerate(filings) if file is not None and i not in failed]
+    stats["loaded"] += len(loaded)
+    invalidate_filing_blocks(collection.database[CONTEXT_BLOCKS_COLLECTION], loaded)
+
+
+def load_sec_filings_to_mongo(folder_path: str, mongodb_uri: str, db_name: str = "sec_data", collection_name: str = "filings",
+                              workers: Optional[int] = None, batch_size: int = 50, force: bool = False) -> Dict[str, Any]:
     """
     Load JSON files from a specified folder into a MongoDB collection.
-    
+
+    Files are parsed in a process pool and upserted with bulk_write in batches.
+    Files whose mtime and size, or content hash, match what was loaded last
+    time are skipped unless force is set.
+
     Args:
         folder_path (str): Path to the folder containing JSON files.
         mongodb_uri (str): URI for MongoDB connection.
         db_name (str): Name of the MongoDB database.
         collection_name (str): Name of the MongoDB collection to insert the data.
+        workers (int): Number of parser processes; defaults to the CPU count. 1 parses inline.
+        batch_size (int): Number of upserts sent per bulk_write call.
+        force (bool): Reload every file even if it has not changed.
+
+    Returns:
+        Dict with counts of files seen, loaded, skipped and failed, bytes read and elapsed seconds.
     """
+    started = time.perf_counter()
     client = MongoClient(mongodb_uri)
     db = client[db_name]
     collection = db[collection_name]
-    
+
     collection.create_index("filename", unique=True)
     collection.create_index("stock_ticker")
-    
-    # Count total JSON files for progress tracking
-    total_files = sum(1 for _, _, files in os.walk(folder_path) for file in files if file.endswith('.json'))
-    
-    # Iterate over JSON files in the folder
-    current_file_index = 0  # Initialize current file index
-
-    for root, _, files in os.walk(folder_path):
-        for file in tqdm(files, desc="Loading SEC filings"):
-            if file.endswith('.json'):
-                current_file_index += 1  # Increment current file index
-                file_path = os.path.join(root, file)
-                with open(file_path, 'r') as json_file:
-                    try:
-                        data = json.load(json_file)
-                        # Add filename as an identifier in case it's needed for reference
-                        data["filename"] = file
-                        print(f"Inserting data for company: {data.get('company', 'Unknown')} ({current_file_index}/{total_files})")  
-
-                        # Insert into MongoDB with upsert to prevent duplicates
-                        collection.update_one(
-                            {"filename": file},  # Match on filename to avoid re-inserting
-                            {"$set": data},       # Update document if exists
-                            upsert=True           # Insert if not exists
-                        )
-                    except json.JSONDecodeError:
-                        print(f"Error reading {file_path}: Not a valid JSON file")
-                    except Exception as e:
-                        print(f"Error inserting {file}: {str(e)}")
-
-    print(f"Data loaded into MongoDB collection '{collection_name}' in database '{db_name}'.")
+    collection.create_index([("stock_ticker", ASCENDING), ("filing_date", DESCENDING)], name="stock_ticker_filing_date")
+
+    # What was loaded last time, used to skip unchanged files
+    loaded = {} if force else {
+        doc["filename"]: doc
+        for doc in collection.find({}, {"_id": 0, "filename": 1, "content_hash": 1, "source_mtime": 1, "source_size": 1})
+    }
+
+    paths = _list_json_files(folder_path)
+    stats = {"files": len(paths), "loaded": 0, "skipped": 0, "errors": 0, "bytes": 0}
+
+    to_parse = []
+    for file_path in paths:
+        previous = loaded.get(os.path.basename(file_path))
+        stat = os.stat(file_path)
+        if previous and previous.get("source_mtime") == stat.st_mtime and previous.get("source_size") == stat.st_size:
+            stats["skipped"] += 1
+        else:
+            to_parse.append(file_path)
+    known_hashes = {name: doc.get("content_hash") for name, doc in loaded.items()}
+
+    operations = []
+    filings = []
+    with tqdm(total=len(paths), initial=stats["skipped"], desc="Loading SEC filings", unit="file") as progress:
+        for file_path, data, error, size in _parse_all(to_parse, known_hashes, workers or os.cpu_count() or 1):
+            file = os.path.basename(file_path)
+            stats["bytes"] += size
+            progress.update(1)
+            if error:
+                stats["errors"] += 1
+                tqdm.write(error)
+                continue
+            if data is None:
+                # Content unchanged; only the mtime moved, so record it to skip the read next time
+                stats["skipped"] += 1
+                operations.append(UpdateOne(
+                    {"filename": file},
+                    {"$set": {"source_mtime": os.path.getmtime(file_path), "source_size": size}}
+                ))
+                filings.append(None)
+            else:
+                # Add filename as an identifier in case it's needed for reference
+                data["filename"] = file
+                data["source_size"] = size
+                operations.append(UpdateOne({"filename": file}, {"$set": data}, upsert=True))
+                filings.append(file)
+
+            if len(operations) >= batch_size:
+                _flush(collection, operations, filings, stats)
+                operations, filings = [], []
+                progress.set_postfix(loaded=stats["loaded"], skipped=stats["skipped"])
+        if operations:
+            _flush(collection, operations, filings, stats)
+
+    stats["seconds"] = time.perf_counter() - started
+    print(f"Data loaded into MongoDB collection '{collection_name}' in database '{db_name}': "
+          f"{stats['loaded']} loaded, {stats['skipped']} unchanged, {stats['errors']} failed.")
+    return stats
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load SEC filing JSON files into MongoDB.")
+    parser.add_argument("--folder", default="/data/10-K", help="Folder containing the JSON files")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=50, help="Upserts per bulk_write call")
+    parser.add_argument("--force", action="store_true", help="Reload files even if unchanged")
+    args = parser.parse_args()
+
     # Load environment variables
     load_dotenv()
     mongodb_uri = os.getenv("MONGODB_URI")
-    
+    if not mongodb_uri:
+        raise ValueError("MONGODB_URI not found in environment variables")
+
     # Define path to JSON files
-    data_folder_path = '/data/10-K'
+    data_folder_path = args.folder
     print("data folder path:", data_folder_path)
-    
+
     # Check if the folder exists
     if os.path.exists(data_folder_path):
-        # List all files in the directory
-        files = os.listdir(data_folder_path)
-
-        # Print the list of files
-        # print("Files in data/10-K folder:")
-        # for file in files:
-        #     print(file)
-
         # Run the loader function
-        load_sec_filings_to_mongo(data_folder_path, mongodb_uri)
+        load_sec_filings_to_mongo(data_folder_path, mongodb_uri, workers=args.workers,
+                                  batch_size=args.batch_size, force=args.force)
     else:
         print(f"The specified folder does not exist: {data_folder_path}")
-
-    if not mongodb_uri:
-        raise ValueError("MONGODB_URI not found in environment variables")
-    else:
-        print(f"MONGODB_URI: {mongodb_uri}")
@@ -1,196 +1,312 @@
-from typing import Optional, Dict, Any, List, Union
-from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Callable, AsyncIterator, Iterable
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import google.generativeai as genai
-from datetime import datetime
-import yfinance as yf
 import os
+import re
 import gradio as gr 
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel
 from dotenv import load_dotenv
-import pandas as pd
 from decimal import Decimal
-from pymongo import MongoClient
+from dataclasses import asdict
+from pymongo import ASCENDING, DESCENDING
+from retrieval import FilingRetriever, Passage, item_label
+from market_data import ComprehensiveStockInfo, MarketDataFetcher, get_mongo_client
+from context_store import CONTEXT_BLOCKS_COLLECTION, ContextStore, filing_block_key
+from metrics import metrics
+from prompt_builder import GeminiTokenCounter, PromptBuilder, PromptSection
+from summarize_filings import ITEM_TITLES, PROMPT_VERSION, SUMMARIES_COLLECTION, filing_summaries
+from serving import AdmissionQueue, QueueFullError
+from answer_cache import ANSWER_CACHE_COLLECTION, AnswerCache, answer_key
+from singleflight import SingleFlight
+from filing_diffs import FILING_DIFFS_COLLECTION
+from search_index import SEARCH_INDEX_DIR, FilingSearchIndex
 
-@dataclass
-class ComprehensiveStockInfo:
-    # Basic Info
-    symbol: str
-    company_name: Optional[str] = None
-    sector: Optional[str] = None
-    industry: Optional[str] = None
-    country: Optional[str] = None
-    website: Optional[str] = None
-    
-    # Price Information
-    current_price: Optional[float] = None
-    previous_close: Optional[float] = None
-    open_price: Optional[float] = None
-    day_low: Optional[float] = None
-    day_high: Optional[float] = None
-    fifty_two_week_low: Optional[float] = None
-    fifty_two_week_high: Optional[float] = None
-    
-    # Trading Information
-    volume: Optional[int] = None
-    avg_volume: Optional[int] = None
-    avg_volume_10d: Optional[int] = None
-    avg_volume_3m: Optional[int] = None
-    
-    # Market Metrics
-    market_cap: Optional[float] = None
-    enterprise_value: Optional[float] = None
-    beta: Optional[float] = None
-    
-    # Financial Ratios
-    pe_ratio: Optional[float] = None
-    forward_pe: Optional[float] = None
-    peg_ratio: Optional[float] = None
-    price_to_book: Optional[float] = None
-    price_to_sales: Optional[float] = None
-    
-    # Dividend Information
-    dividend_rate: Optional[float] = None
-    dividend_yield: Optional[float] = None
-    ex_dividend_date: Optional[str] = None
-    
-    # Financial Metrics
-    revenue: Optional[float] = None
-    revenue_per_share: Optional[float] = None
-    revenue_growth: Optional[float] = None
-    gross_profits: Optional[float] = None
-    ebitda: Optional[float] = None
-    net_income: Optional[float] = None
-    earnings_growth: Optional[float] = None
-    
-    # Balance Sheet Metrics
-    total_cash: Optional[float] = None
-    total_debt: Optional[float] = None
-    total_assets: Optional[float] = None
-    total_liabilities: Optional[float] = None
-    
-    # Additional Metrics
-    shares_outstanding: Optional[int] = None
-    float_shares: Optional[int] = None
-    held_percent_insiders: Optional[float] = None
-    held_percent_institutions: Optional[float] = None
-    short_ratio: Optional[float] = None
-    short_percent_of_float: Optional[float] = None
-    
-    # SEC Filings
-    sec_filings: Optional[List[Dict[str, Any]]] = None
+FILING_METADATA_FIELDS = [
+    "filing_type", "filing_date", "company", "filing_description", "filename", "content_hash",
+]
+
+# Serves {"stock_ticker": t} sorted by filing_date descending straight from the index
+FILINGS_BY_TICKER_INDEX = [("stock_ticker", ASCENDING), ("filing_date", DESCENDING)]
 
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert all non-None values to a dictionary."""
-        return {k: v for k, v in self.__dict__.items() if v is not None}
+ITEM_FIELDS = [
+    "item_1", "item_1A", "item_1B", "item_1C", "item_2", "item_3", "item_4", "item_5",
+    "item_6", "item_7", "item_7A", "item_8", "item_9", "item_9A", "item_9B", "item_9C",
+    "item_10", "item_11", "item_12", "item_13", "item_14", "item_15", "item_16",
+]
+
+# When the prompt budget is tight, lower numbers keep their place first
+METRIC_PRIORITIES = {
+    "Company Information": 1, "Price Information": 1, "Financial Metrics": 3, "Financial Ratios": 3,
+    "Market Metrics": 4, "Balance Sheet": 4, "Trading Information": 5, "Dividend Information": 6,
+    "Ownership & Float": 6,
+}
+ITEM_PRIORITIES = {"item_1": 4, "item_7": 4, "item_3": 6, "item_5": 6, "item_8": 7}
+# The first few retrieved passages are the most relevant to the question
+TOP_PASSAGES = 3
+# Questions about how things developed get the year-over-year filing changes in their context.
+# Only explicit change-over-time phrasing counts, so "growth strategy" or "how does it differ
+# from competitors" stay on the cheaper single-filing context.
+TREND_QUESTION = re.compile(
+    r"\b(how|has|have|did)\b[^?.]{0,60}?\b(chang|evolv|grow|grown|grew|shift|declin|increas|decreas)\w*"
+    r"|\btrend(s|ing)?\b"
+    r"|\bover (the )?((last|past|previous|prior) )?(\w+ )?(years|quarters|filings|time)\b"
+    r"|\b(last|past|previous|prior) (\w+ )?(years|filings)\b"
+    r"|\byear[- ]over[- ]year\b|\byoy\b"
+    r"|\bsince (the )?((19|20)\d\d|ipo|(last|previous|prior) (year|filing|10-k))\b"
+    r"|\b(from|between) (19|20)\d\d (to|and) (19|20)\d\d\b"
+    r"|\bcompared (to|with) (the )?(last|previous|prior) (year|filing|10-k)\b",
+    re.IGNORECASE
+)
+# Filing pairs whose changes go into a trend question's context, newest first
+HISTORY_PAIRS = 4
 
 class StockAnalyzer:
-    def __init__(self, api_key: str, mongodb_uri: str):
-        """Initialize the StockAnalyzer with Gemini API key and MongoDB connection."""
+    def __init__(self, api_key: str, mongodb_uri: str, retriever: Optional[FilingRetriever] = None,
+                 stock_cache_ttl: float = 300.0, stock_cache_size: int = 256, io_workers: int = 16,
+                 prompt_token_budget: int = 8000, remote_token_count: bool = False,
+                 answer_cache_ttl: float = 0.0, answer_cache_size: int = 10_000):
+        """Initialize the StockAnalyzer with Gemini API key and MongoDB connection.
+
+        When a question is passed to format_context, only the filing passages the
+        retriever ranks as relevant are included instead of every item in full.
+        Market data is cached per symbol for stock_cache_ttl seconds, and documents
+        in stock_data.stocks younger than that are used before calling Yahoo.
+        Blocking MongoDB and yfinance calls made from the async path run on a
+        thread pool bounded by io_workers so the event loop stays free.
+        Prompts are fitted into prompt_token_budget tokens by section priority,
+        estimated locally or, with remote_token_count, counted by the Gemini API once per distinct section.
+        With answer_cache_ttl above zero, answers are cached in stock_data.answer_cache
+        by question, symbol and data version for that many seconds.
+        Concurrent requests for the same symbol share one data fetch, one
+        retrieval index build and, for the same question, one rendered context.
+        """
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel('gemini-1.5-flash')
-        self.mongo_client = MongoClient(mongodb_uri)
+        self.mongo_client = get_mongo_client(mongodb_uri)
         self.sec_db = self.mongo_client.sec_data
+        self.retriever = retriever or FilingRetriever()
+        self.market_data = MarketDataFetcher(
+            self.mongo_client.stock_data.stocks,
+            cache_ttl=stock_cache_ttl,
+            cache_size=stock_cache_size
+        )
+        self.ensure_indexes()
+        self.executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="stock-io")
+        self.context_store = ContextStore(self.sec_db[CONTEXT_BLOCKS_COLLECTION])
+        self.retriever.passage_source = self._filing_passages
+        self.prompt_builder = PromptBuilder(
+            prompt_token_budget,
+            section_counter=GeminiTokenCounter(self.model) if remote_token_count else None
+        )
+        self.answer_cache = AnswerCache(
+            self.mongo_client.stock_data[ANSWER_CACHE_COLLECTION],
+            ttl=answer_cache_ttl,
+            max_entries=answer_cache_size
+        ) if answer_cache_ttl > 0 else None
+        self.in_flight = SingleFlight()
 
-    def _safe_get(self, info: Dict[str, Any], key: str, default: Any = None) -> Any:
-        """Safely get a value from the info dictionary."""
-        try:
-            value = info.get(key, default)
-            return None if value in ['-', '', 'nan', float('nan')] else value
-        except:
-            return default
+    def ensure_indexes(self) -> None:
+        """Create the compound index that serves get_sec_filings without an in-memory sort."""
+        self.sec_db.filings.create_index(FILINGS_BY_TICKER_INDEX, name="stock_ticker_filing_date")
 
-    def get_sec_filings(self, ticker: str) -> List[Dict[str, Any]]:
-        """Fetch SEC filings data from MongoDB for a given ticker."""
+    @metrics.timed("sec_filings")
+    def get_sec_filings(self, ticker: str, items: Optional[Iterable[str]] = None, limit: int = 1) -> List[Dict[str, Any]]:
+        """Fetch SEC filings data from MongoDB for a given ticker, newest first.
+
+        Args:
+            ticker (str): Stock ticker.
+            items (Iterable[str]): Item fields to include; defaults to all of them. Pass
+                an empty list to fetch only filing metadata.
+            limit (int): Number of most recent filings to return.
+        """
         filings_collection = self.sec_db.filings
+        projection = {field: 1 for field in FILING_METADATA_FIELDS}
+        projection.update({item: 1 for item in (ITEM_FIELDS if items is None else items)})
+        projection["_id"] = 0
         filings = list(filings_collection.find(
             {"stock_ticker": ticker},
-            {
-                "filing_type": 1,
-                "filing_date": 1,
-                "company": 1,
-                "filing_description": 1,
-                "item_1": 1,
-                "item_2": 1,
-                "item_3": 1,
-                "item_4": 1,
-                "item_5": 1,
-                "item_6": 1,
-                "item_7": 1,
-                "item_8": 1,
-                "item_9": 1,
-                "item_10": 1,
-                "item_11": 1,
-                "item_12": 1,
-                "item_13": 1,
-                "item_14": 1,
-                "item_15": 1,
-                "_id": 0
-            }
-        ).sort("filing_date", -1).limit(1))
+            projection
+        ).sort("filing_date", -1).limit(limit))
         return filings
 
+    def get_filing_history(self, ticker: str, items: Optional[Iterable[str]] = None,
+                           limit: int = HISTORY_PAIRS) -> List[Dict[str, Any]]:
+        """Return the changes between a ticker's consecutive 10-K filings, newest first.
+
+        Each entry covers one pair of filings, as computed by filing_diffs.py:
+        filing_date and previous_filing_date, and per item the added, revised
+        and removed passages with their totals.
+
+        Args:
+            ticker (str): Stock ticker.
+            items (Iterable[str]): Items to include; defaults to every item that was compared.
+            limit (int): Number of filing pairs to return.
+        """
+        projection = {"_id": 0, "filename": 1, "filing_date": 1, "previous_filename": 1, "previous_filing_date": 1}
+        if items is None:
+            projection["items"] = 1
+        else:
+            projection.update({f"items.{item}": 1 for item in items})
+        return list(self.sec_db[FILING_DIFFS_COLLECTION].find(
+            {"stock_ticker": ticker},
+            projection
+        ).sort("filing_date", -1).limit(limit))
+
+    def history_sections(self, ticker: str) -> List[PromptSection]:
+        """Render a ticker's filing history as prompt sections; the latest changes have the higher priority."""
+        history = self.get_filing_history(ticker)
+        if not history:
+            return []
+        sections = [PromptSection("history", "Changes Between Annual Filings:", 0, truncatable=False)]
+        for age, entry in enumerate(history):
+            period = f"{entry['previous_filing_date']} to {entry['filing_date']}"
+            changes = [(item_key, entry["items"][item_key]) for item_key in ITEM_FIELDS
+                       if any(entry.get("items", {}).get(item_key, {}).get(f"{kind}_total")
+                              for kind in ("added", "revised", "removed"))]
+            counts = ", ".join(
+                f"{item_label(item_key)}: {change['added_total']} paragraphs added, "
+                f"{change.get('revised_total', 0)} revised, {change['removed_total']} removed"
+                for item_key, change in changes
+            )
+            sections.append(PromptSection(f"history {period}", f"- {period} ({counts}):", 0, truncatable=False))
+            for item_key, change in changes:
+                for kind in ("added", "revised", "removed"):
+                    for rank, passage in enumerate(change.get(kind, [])):
+                        sections.append(PromptSection(
+                            f"{item_key} {kind} {entry['filing_date']}",
+                            f"  • {item_label(item_key)} {kind}: {passage}",
+                            3 if age == 0 and rank < 2 else 6 + age
+                        ))
+        sections.append(PromptSection("blank", "", 0, truncatable=False))
+        return sections
+
+    def _with_items(self, filing: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the filing with its item texts, fetching them if only metadata was loaded."""
+        if any(key in filing for key in ITEM_FIELDS) or not filing.get('filename'):
+            return filing
+        items = self.sec_db.filings.find_one(
+            {"filename": filing['filename']},
+            {**{item: 1 for item in ITEM_FIELDS}, "_id": 0}
+        )
+        return {**filing, **(items or {})}
+
+    def _filing_block(self, filing: Dict[str, Any], kind: str, build: Callable[[], Dict[str, Any]],
+                      final: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Dict[str, Any]:
+        """Look up a pre-rendered block for a filing, building it once if it is not stored yet."""
+        if not filing.get('filename'):
+            return build()
+        return self.context_store.get(
+            filing_block_key(filing, kind),
+            lambda: {"filename": filing['filename'], **build()},
+            final=final
+        )
+
+    def _filing_passages(self, filing: Dict[str, Any]) -> List[Passage]:
+        """Return the retrieval passages of a filing from the context store."""
+        block = self._filing_block(filing, "passages", lambda: {
+            "passages": [asdict(p) for p in self.retriever.chunk(self._with_items(filing))]
+        })
+        return [Passage(**p) for p in block["passages"]]
+
+    def filing_item_lines(self, filing: Dict[str, Any]) -> List[List[str]]:
+        """Render the full item text of a filing as [item key, line] pairs."""
+        filing = self._with_items(filing)
+        # The same items the summary job covers, so both paths render the whole filing
+        return [[item_key, f"  • {item_label(item_key)}: {filing[item_key]}"]
+                for item_key in ITEM_FIELDS if filing.get(item_key)]
+
+    def render_filing_items(self, filing: Dict[str, Any]) -> str:
+        """Render the full item text of a filing, one line per item."""
+        return "\n".join(line for _, line in self.filing_item_lines(filing))
+
+    def filing_summary_lines(self, filing: Dict[str, Any]) -> Optional[List[List[str]]]:
+        """Render the stored item summaries of a filing as [item key, line] pairs.
+
+        Items the summary job has not finished keep their full text. Returns
+        None when summarize_filings.py has not summarized the filing's current
+        content yet. The lines are kept in the context store by filename and
+        content hash; until every item is summarized they are only reused for
+        a few minutes, so the job's progress shows up.
+        """
+        return self._filing_block(filing, f"summary_lines_v{PROMPT_VERSION}", lambda: self._summary_block(filing),
+                                  final=lambda block: block["complete"])["items"]
+
+    def _summary_block(self, filing: Dict[str, Any]) -> Dict[str, Any]:
+        summaries = filing_summaries(self.sec_db[SUMMARIES_COLLECTION], filing)
+        if summaries is None:
+            return {"items": None, "complete": False}
+        lines = {
+            item_key: f"  • {item_label(item_key)}: {summary}"
+            for item_key, summary in summaries.get('items', {}).items()
+        }
+        done = set(summaries['done'])
+        complete = all(item_key in done for item_key in ITEM_FIELDS)
+        if not complete:
+            for item_key, line in self._full_item_lines(filing):
+                if item_key not in done:
+                    lines[item_key] = line
+        return {
+            "items": [[item_key, lines[item_key]] for item_key in ITEM_FIELDS if lines.get(item_key)],
+            "complete": complete,
+        }
+
+    @metrics.timed("market_data")
+    def get_market_data(self, symbol: str) -> Dict[str, Any]:
+        """Fetch market data fields for a symbol: in-process cache, then MongoDB, then yfinance."""
+        return self.market_data.get(symbol)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return market data cache counters, including MongoDB read-through hits, and coalesced calls."""
+        return {**self.market_data.cache_stats(), "coalesced": self.in_flight.shared}
+
+    @metrics.timed("get_stock_data")
     def get_stock_data(self, symbol: str) -> ComprehensiveStockInfo:
         """Fetch comprehensive stock data using yfinance and SEC filings."""
-        stock = yf.Ticker(symbol)
-        info = stock.info
+        market_data = self.get_market_data(symbol)
         
-        # Fetch SEC filings
-        sec_filings = self.get_sec_filings(symbol)
+        # Fetch SEC filing metadata; item texts are read by filename when the context is built
+        sec_filings = self.get_sec_filings(symbol, [])
         
-        stock_info = ComprehensiveStockInfo(
-            symbol=symbol,
-            company_name=self._safe_get(info, 'longName'),
-            sector=self._safe_get(info, 'sector'),
-            industry=self._safe_get(info, 'industry'),
-            country=self._safe_get(info, 'country'),
-            website=self._safe_get(info, 'website'),
-            current_price=self._safe_get(info, 'currentPrice'),
-            previous_close=self._safe_get(info, 'previousClose'),
-            open_price=self._safe_get(info, 'open'),
-            day_low=self._safe_get(info, 'dayLow'),
-            day_high=self._safe_get(info, 'dayHigh'),
-            fifty_two_week_low=self._safe_get(info, 'fiftyTwoWeekLow'),
-            fifty_two_week_high=self._safe_get(info, 'fiftyTwoWeekHigh'),
-            volume=self._safe_get(info, 'volume'),
-            avg_volume=self._safe_get(info, 'averageVolume'),
-            avg_volume_10d=self._safe_get(info, 'averageVolume10days'),
-            avg_volume_3m=self._safe_get(info, 'averageVolume3month'),
-            market_cap=self._safe_get(info, 'marketCap'),
-            enterprise_value=self._safe_get(info, 'enterpriseValue'),
-            beta=self._safe_get(info, 'beta'),
-            pe_ratio=self._safe_get(info, 'trailingPE'),
-            forward_pe=self._safe_get(info, 'forwardPE'),
-            peg_ratio=self._safe_get(info, 'pegRatio'),
-            price_to_book=self._safe_get(info, 'priceToBook'),
-            price_to_sales=self._safe_get(info, 'priceToSalesTrailing12Months'),
-            dividend_rate=self._safe_get(info, 'dividendRate'),
-            dividend_yield=self._safe_get(info, 'dividendYield'),
-            ex_dividend_date=self._safe_get(info, 'exDividendDate'),
-            revenue=self._safe_get(info, 'totalRevenue'),
-            revenue_per_share=self._safe_get(info, 'revenuePerShare'),
-            revenue_growth=self._safe_get(info, 'revenueGrowth'),
-            gross_profits=self._safe_get(info, 'grossProfits'),
-            ebitda=self._safe_get(info, 'ebitda'),
-            net_income=self._safe_get(info, 'netIncomeToCommon'),
-            earnings_growth=self._safe_get(info, 'earningsGrowth'),
-            total_cash=self._safe_get(info, 'totalCash'),
-            total_debt=self._safe_get(info, 'totalDebt'),
-            total_assets=self._safe_get(info, 'totalAssets'),
-            total_liabilities=self._safe_get(info, 'totalDebt'),
-            shares_outstanding=self._safe_get(info, 'sharesOutstanding'),
-            float_shares=self._safe_get(info, 'floatShares'),
-            held_percent_insiders=self._safe_get(info, 'heldPercentInsiders'),
-            held_percent_institutions=self._safe_get(info, 'heldPercentInstitutions'),
-            short_ratio=self._safe_get(info, 'shortRatio'),
-            short_percent_of_float=self._safe_get(info, 'shortPercentOfFloat'),
-            sec_filings=sec_filings
+        return ComprehensiveStockInfo.from_mongo(market_data, symbol=symbol, sec_filings=sec_filings)
+
+    async def _run_blocking(self, func: Callable, *args: Any) -> Any:
+        """Run a blocking call on the I/O thread pool and await its result.
+
+        The call runs in a copy of the caller's context so its timings land in the request's metrics.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, partial(context.run, func, *args))
+
+    @metrics.timed("get_stock_data")
+    async def get_stock_data_async(self, symbol: str) -> ComprehensiveStockInfo:
+        """Fetch market data and SEC filing metadata concurrently without blocking the event loop.
+
+        Item texts are not fetched; format_context reads them from the context store.
+        Requests for a symbol that is already being fetched wait for that fetch.
+        """
+        return await self.in_flight.do(("stock_data", symbol), lambda: self._fetch_stock_data(symbol))
+
+    async def _fetch_stock_data(self, symbol: str) -> ComprehensiveStockInfo:
+        market_data, sec_filings = await asyncio.gather(
+            self._run_blocking(self.get_market_data, symbol),
+            self._run_blocking(self.get_sec_filings, symbol, [])
         )
-        
-        return stock_info
+        return ComprehensiveStockInfo.from_mongo(market_data, symbol=symbol, sec_filings=sec_filings)
 
-    def format_context(self, stock_data: ComprehensiveStockInfo) -> str:
-        """Format stock data into a readable context string."""
+    def render_metric_sections(self, stock_data: ComprehensiveStockInfo) -> List[List[str]]:
+        """Render the market data sections of the context as [category, text] pairs."""
         data_dict = stock_data.to_dict()
-        context_parts = []
+        sections = []
         
         categories = {
             "Company Information": ["company_name", "sector", "industry", "country", "website"],
@@ -210,7 +326,7 @@ class StockAnalyzer:
         for category, fields in categories.items():
             category_data = {k: data_dict[k] for k in fields if k in data_dict}
             if category_data:
-                context_parts.append(f"\n{category}:")
+                context_parts = [f"\n{category}:"]
                 for key, value in category_data.items():
                     formatted_key = key.replace('_', ' ').title()
                     if isinstance(value, (float, Decimal)):
@@ -225,43 +341,242 @@ class StockAnalyzer:
                     else:
                         formatted_value = str(value)
                     context_parts.append(f"- {formatted_key}: {formatted_value}")
+                sections.append([category, "\n".join(context_parts)])
+
+        return sections
+
+    def render_metrics(self, stock_data: ComprehensiveStockInfo) -> str:
+        """Render the market data sections of the context."""
+        return "\n".join(text for _, text in self.render_metric_sections(stock_data))
+
+    @metrics.timed("format_context")
+    def context_sections(self, stock_data: ComprehensiveStockInfo, question: Optional[str] = None,
+                         full_text: bool = False, history: Optional[bool] = None) -> List[PromptSection]:
+        """Split the context into prioritized sections for the prompt builder.
+
+        If a question is given, the SEC filing section holds only the passages
+        relevant to it, or the item summaries when none match. Otherwise every
+        item is included as its stored summary, or in full with full_text or
+        when the filing has not been summarized. Rendered sections come from
+        the context store when they have been built before. The changes between
+        earlier filings are added with history, or by default for questions
+        about trends and changes.
+        """
+        if stock_data.last_updated is not None:
+            metric_sections = self.context_store.get(
+                f"metrics:{stock_data.symbol}:{stock_data.last_updated.isoformat()}",
+                lambda: {"sections": self.render_metric_sections(stock_data)},
+                persist=False
+            )["sections"]
+        else:
+            metric_sections = self.render_metric_sections(stock_data)
+        sections = [
+            PromptSection(category, text, METRIC_PRIORITIES.get(category, 5))
+            for category, text in metric_sections
+        ]
         
         # Add SEC Filings section
         if hasattr(stock_data, 'sec_filings') and stock_data.sec_filings:
-            context_parts.append("\nRecent SEC Filings:")
+            sections.append(PromptSection("filings", "\nRecent SEC Filings:", 0, truncatable=False))
             for filing in stock_data.sec_filings:
                 filing_date = filing.get('filing_date', 'N/A')
                 filing_type = filing.get('filing_type', 'N/A')
                 filing_desc = filing.get('filing_description', 'N/A')
                 
                 # Add the main filing information
-                context_parts.append(f"- {filing_date}: {filing_type} - {filing_desc}")
+                sections.append(PromptSection(
+                    f"filing {filing_date}", f"- {filing_date}: {filing_type} - {filing_desc}", 0, truncatable=False
+                ))
                 
-                # Add items 1-15 on separate lines if they exist
-                for i in range(1, 16):
-                    item_key = f'item_{i}'
-                    if filing.get(item_key):
-                        context_parts.append(f"  • Item {i}: {filing[item_key]}")
+                if question is None:
+                    for item_key, line in self._item_lines(filing, full_text):
+                        sections.append(PromptSection(
+                            f"{item_key} {filing_date}", line, ITEM_PRIORITIES.get(item_key, 8)
+                        ))
                 
                 # Add a blank line between filings for better readability
-                context_parts.append("")
+                sections.append(PromptSection("blank", "", 0, truncatable=False))
 
-        return "\n".join(context_parts)
+            if question is not None:
+                passages = self.retriever.retrieve(stock_data.symbol, stock_data.sec_filings, question)
+                if passages:
+                    sections.append(PromptSection("excerpts", "Relevant SEC Filing Excerpts:", 0, truncatable=False))
+                    for rank, passage in enumerate(passages):
+                        sections.append(PromptSection(
+                            f"excerpt {rank + 1}",
+                            f"  • {item_label(passage.item)} ({passage.filing_date}): {passage.text}",
+                            2 if rank < TOP_PASSAGES else 5
+                        ))
+                    sections.append(PromptSection("blank", "", 0, truncatable=False))
+                else:
+                    summary_sections = [
+                        PromptSection(f"{item_key} {filing.get('filing_date', 'N/A')}", line, ITEM_PRIORITIES.get(item_key, 8))
+                        for filing in stock_data.sec_filings
+                        for item_key, line in (self.filing_summary_lines(filing) or [])
+                    ]
+                    if summary_sections:
+                        sections.append(PromptSection("summaries", "SEC Filing Item Summaries:", 0, truncatable=False))
+                        sections.extend(summary_sections)
+                        sections.append(PromptSection("blank", "", 0, truncatable=False))
 
-    async def ask_about_stock(self, question: str, symbol: str) -> str:
-        """Ask questions about a stock and get AI-generated responses."""
-        stock_data = self.get_stock_data(symbol)
-        context = self.format_context(stock_data)
-        
-        prompt = f"""Based on the following comprehensive stock information for {symbol}:
+        if history is None:
+            history = question is not None and TREND_QUESTION.search(question) is not None
+        if history:
+            sections.extend(self.history_sections(stock_data.symbol))
+
+        return sections
+
+    def _full_item_lines(self, filing: Dict[str, Any]) -> List[List[str]]:
+        """The full item lines of a filing from the context store."""
+        return self._filing_block(filing, "item_lines_v2", lambda: {"items": self.filing_item_lines(filing)})["items"]
+
+    def _item_lines(self, filing: Dict[str, Any], full_text: bool) -> List[List[str]]:
+        """Item summaries of a filing, or its full item text on request or when it has no summaries."""
+        if not full_text:
+            lines = self.filing_summary_lines(filing)
+            if lines is not None:
+                return lines
+        return self._full_item_lines(filing)
+
+    def format_context(self, stock_data: ComprehensiveStockInfo, question: Optional[str] = None,
+                       full_text: bool = False, history: Optional[bool] = None) -> str:
+        """Format stock data into a readable context string, without a token limit.
+
+        Filing items appear as their precomputed summaries unless full_text is set.
+        history adds or leaves out the changes between earlier filings.
+        """
+        return "\n".join(
+            section.text for section in self.context_sections(stock_data, question, full_text, history)
+        )
+
+    @staticmethod
+    def prompt_template(symbol: str, question: str) -> Callable[[str], str]:
+        """Return a function wrapping a context in the question prompt."""
+        def render(context: str) -> str:
+            return f"""Based on the following comprehensive stock information for {symbol}:
         {context}
         
         Please answer this question: {question}
         
         Provide a detailed analysis based on the available data, highlighting key metrics and their implications."""
-        
-        response = self.model.generate_content(prompt)
-        return response.text
+        return render
+
+    async def shared_context_sections(self, stock_data: ComprehensiveStockInfo,
+                                      question: Optional[str] = None) -> List[PromptSection]:
+        """Run context_sections on the I/O pool, sharing the work between concurrent requests.
+
+        The symbol's retrieval index is built once however many questions
+        arrive together, and requests with the same question share the rendered
+        sections.
+        """
+        filings = stock_data.sec_filings or []
+        filenames = tuple(f.get('filename') for f in filings)
+        if question is not None and filings:
+            await self.in_flight.do(
+                ("index", stock_data.symbol, filenames),
+                lambda: self._run_blocking(self.retriever.index_for, stock_data.symbol, filings)
+            )
+        return await self.in_flight.do(
+            ("context", stock_data.symbol, stock_data.last_updated, filenames, question),
+            lambda: self._run_blocking(self.context_sections, stock_data, question)
+        )
+
+    async def build_prompt(self, question: str, symbol: str,
+                           stock_data: Optional[ComprehensiveStockInfo] = None) -> str:
+        """Assemble the Gemini prompt for a question within the prompt token budget.
+
+        The symbol's data is fetched unless it is passed in. The prompt's token
+        count, and any sections truncated or dropped to fit, are recorded on the
+        request's metrics.
+        """
+        if stock_data is None:
+            stock_data = await self.get_stock_data_async(symbol)
+        sections = await self.shared_context_sections(stock_data, question)
+        fitted = await self._run_blocking(self.prompt_builder.build, self.prompt_template(symbol, question), sections)
+        metrics.observe_tokens("prompt", fitted.tokens, counted_tokens=fitted.counted_tokens,
+                               estimated_tokens=fitted.estimated_tokens, truncated=fitted.truncated, dropped=fitted.dropped)
+        return fitted.text
+
+    def _answer_key(self, question: str, symbol: str, stock_data: ComprehensiveStockInfo) -> Optional[str]:
+        """Answer cache key for a question on this version of the symbol's data, or None when caching is off."""
+        if self.answer_cache is None:
+            return None
+        filenames = [filing.get('filename') for filing in stock_data.sec_filings or []]
+        return answer_key(symbol, question, filenames, stock_data.last_updated)
+
+    async def _cached_answer(self, key: Optional[str], use_cache: bool,
+                             record: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Look up an answer in the answer cache and note the outcome on the request's metrics."""
+        if key is None:
+            return None
+        answer = None
+        if use_cache:
+            with metrics.timer("answer_cache"):
+                answer = await self._run_blocking(self.answer_cache.get, key)
+        if record is not None:
+            record["answer_cache"] = "bypass" if not use_cache else "hit" if answer is not None else "miss"
+        return answer
+
+    async def _store_answer(self, key: Optional[str], answer: str, symbol: str, question: str) -> None:
+        if key is not None and answer:
+            await self._run_blocking(partial(self.answer_cache.set, key, answer, symbol=symbol.upper(),
+                                             question=question))
+
+    async def ask_about_stock(self, question: str, symbol: str,
+                              stock_data: Optional[ComprehensiveStockInfo] = None, use_cache: bool = True) -> str:
+        """Ask questions about a stock and get AI-generated responses.
+
+        Callers asking several questions about one symbol can pass stock_data
+        from get_stock_data_async to fetch it only once. A cached answer for the
+        same question and data version is returned without calling Gemini
+        unless use_cache is False; the fresh answer then replaces it.
+        """
+        with metrics.request("ask", symbol=symbol) as record:
+            if stock_data is None:
+                stock_data = await self.get_stock_data_async(symbol)
+            key = self._answer_key(question, symbol, stock_data)
+            cached = await self._cached_answer(key, use_cache, record)
+            if cached is not None:
+                return cached
+
+            prompt = await self.build_prompt(question, symbol, stock_data)
+            metrics.observe_size("prompt", len(prompt))
+            with metrics.timer("gemini"):
+                response = await self.model.generate_content_async(prompt)
+            metrics.observe_size("response", len(response.text))
+            await self._store_answer(key, response.text, symbol, question)
+            return response.text
+
+    async def stream_about_stock(self, question: str, symbol: str, use_cache: bool = True) -> AsyncIterator[str]:
+        """Like ask_about_stock, but yield the response text chunk by chunk as Gemini produces it.
+
+        A cached answer is yielded as a single chunk.
+        """
+        with metrics.request("stream", symbol=symbol) as record:
+            stock_data = await self.get_stock_data_async(symbol)
+            key = self._answer_key(question, symbol, stock_data)
+            cached = await self._cached_answer(key, use_cache, record)
+            if cached is not None:
+                yield cached
+                return
+
+            prompt = await self.build_prompt(question, symbol, stock_data)
+            metrics.observe_size("prompt", len(prompt))
+            started = time.perf_counter()
+            first_chunk = True
+            chunks = []
+            with metrics.timer("gemini"):
+                response = await self.model.generate_content_async(prompt, stream=True)
+                async for chunk in response:
+                    if chunk.text:
+                        if first_chunk:
+                            metrics.observe_stage("gemini_first_chunk", time.perf_counter() - started)
+                            first_chunk = False
+                        chunks.append(chunk.text)
+                        yield chunk.text
+            answer = "".join(chunks)
+            metrics.observe_size("response", len(answer))
+            await self._store_answer(key, answer, symbol, question)
 
 # class StockQAApp:
 #     def __init__(self):
@@ -296,9 +611,25 @@ class StockAnalyzer:
 #                 print("\nAnalysis:", answer)
 #             except Exception as e:
 #                 print(f"Error: {str(e)}")
+# Runs retrieval once per warmed symbol so its passage index is built before the first user arrives
+WARM_QUESTION = "What are the company's main risks and how is its business performing?"
+
+
+class AskRequest(BaseModel):
+    symbol: str
+    question: str
+    # Skip the answer cache and ask Gemini again
+    fresh: bool = False
+
+
 class StockQAApp:
     def __init__(self):
-        """Initialize the Stock Q&A Application."""
+        """Initialize the Stock Q&A Application.
+
+        Every process serving requests builds its own instance, so MongoDB pools,
+        the Gemini client and all caches are per process. They are warmed for
+        WARM_SYMBOLS when the server starts.
+        """
         load_dotenv()
         api_key = os.getenv('GEMINI_API_KEY')
         mongodb_uri = os.getenv('MONGODB_URI')
@@ -307,10 +638,76 @@ class StockQAApp:
         if not mongodb_uri:
             raise ValueError("MONGODB_URI not found in environment variables")
 
-        self.analyzer = StockAnalyzer(api_key, mongodb_uri)
+        retriever = FilingRetriever(
+            top_k=int(os.getenv('RETRIEVAL_TOP_K', '8')),
+            token_budget=int(os.getenv('CONTEXT_TOKEN_BUDGET', '3000')),
+            index_cache_size=int(os.getenv('RETRIEVAL_INDEX_CACHE_SIZE', '64'))
+        )
+        self.analyzer = StockAnalyzer(
+            api_key,
+            mongodb_uri,
+            retriever=retriever,
+            stock_cache_ttl=float(os.getenv('STOCK_CACHE_TTL', '300')),
+            stock_cache_size=int(os.getenv('STOCK_CACHE_SIZE', '256')),
+            io_workers=int(os.getenv('IO_WORKERS', '16')),
+            prompt_token_budget=int(os.getenv('PROMPT_TOKEN_BUDGET', '8000')),
+            remote_token_count=os.getenv('PROMPT_REMOTE_TOKEN_COUNT', '0') == '1',
+            answer_cache_ttl=float(os.getenv('ANSWER_CACHE_TTL', '3600')),
+            answer_cache_size=int(os.getenv('ANSWER_CACHE_SIZE', '10000'))
+        )
+        self.concurrency_limit = int(os.getenv('GRADIO_CONCURRENCY_LIMIT', '16'))
+        self.queue = AdmissionQueue(self.concurrency_limit, int(os.getenv('QUEUE_MAX_SIZE', '64')))
+        self.warm_symbols = [s.strip().upper() for s in os.getenv('WARM_SYMBOLS', 'AAPL,MSFT,GOOGL,AMZN').split(',')
+                             if s.strip()]
+        self.warmed = False
+        self.search = self.load_search_index(os.getenv('SEARCH_INDEX_PATH', SEARCH_INDEX_DIR))
+
+    @staticmethod
+    def load_search_index(path: str) -> Optional[FilingSearchIndex]:
+        """Open the cross-company filing search index if search_index.py --build has written one."""
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            logging.info(f"No filing search index at {path}; the Search Filings tab is disabled")
+            return None
+        return FilingSearchIndex(path)
+
+    def build_search_tab(self) -> None:
+        """Add the controls of the cross-company filing search to the current Gradio block."""
+        if self.search is None:
+            gr.Markdown("Filing search is not available yet. Build the index with `python search_index.py --build`.")
+            return
+
+        with gr.Row():
+            query_input = gr.Textbox(label="Search", placeholder="e.g., supply chain disruption", lines=1, scale=3)
+            search_btn = gr.Button("Search", variant="primary", scale=1)
+        with gr.Row():
+            items_input = gr.Dropdown(
+                choices=[(f"{item_label(item)}: {title}", item) for item, title in ITEM_TITLES.items()],
+                label="Items", multiselect=True
+            )
+            years_input = gr.Dropdown(choices=self.search.years(), label="Filing Years", multiselect=True)
+            sectors_input = gr.Dropdown(choices=self.search.sectors(), label="Sectors", multiselect=True)
+        per_company_input = gr.Checkbox(label="Best passage per company only", value=True)
+        results = gr.Markdown()
 
-    def run(self):
-        """Run the interactive Q&A session with Gradio UI."""
+        def search(query: str, items: List[str], years: List[int], sectors: List[str], per_company: bool) -> str:
+            started = time.perf_counter()
+            hits = self.search.search(query, items=items, years=years, sectors=sectors, top_k=20,
+                                      per_company=per_company, highlight="**")
+            elapsed = (time.perf_counter() - started) * 1000
+            if not hits:
+                return f"No passages match *{query}*."
+            lines = [f"**{len(hits)} results** in {elapsed:.0f} ms\n"]
+            for hit in hits:
+                lines.append(f"#### {hit.ticker} · {hit.company} · {hit.filing_date} · "
+                             f"{item_label(hit.item)}: {ITEM_TITLES[hit.item]}\n{hit.snippet}\n")
+            return "\n".join(lines)
+
+        inputs = [query_input, items_input, years_input, sectors_input, per_company_input]
+        search_btn.click(fn=search, inputs=inputs, outputs=results)
+        query_input.submit(fn=search, inputs=inputs, outputs=results)
+
+    def build_interface(self) -> gr.Blocks:
+        """Build the Gradio UI for the interactive Q&A session."""
         with gr.Blocks(theme=gr.themes.Soft()) as interface:
             gr.Markdown(
                 """
@@ -319,70 +716,140 @@ class StockQAApp:
                 """
             )
             
-            with gr.Row():
-                with gr.Column(scale=1):
-                    symbol_input = gr.Textbox(
-                        label="Stock Symbol",
-                        placeholder="e.g., AAPL",
-                        lines=1
-                    )
-                with gr.Column(scale=2):
-                    question_input = gr.Textbox(
-                        label="Your Question",
-                        placeholder="What would you like to know about this stock?",
-                        lines=2
-                    )
+            with gr.Tab("Ask"):
+                with gr.Row():
+                    with gr.Column(scale=1):
+                        symbol_input = gr.Textbox(
+                            label="Stock Symbol",
+                            placeholder="e.g., AAPL",
+                            lines=1
+                        )
+                    with gr.Column(scale=2):
+                        question_input = gr.Textbox(
+                            label="Your Question",
+                            placeholder="What would you like to know about this stock?",
+                            lines=2
+                        )
             
-            with gr.Row():
-                analyze_btn = gr.Button("Analyze", variant="primary")
-                clear_btn = gr.Button("Clear")
+                with gr.Row():
+                    analyze_btn = gr.Button("Analyze", variant="primary")
+                    clear_btn = gr.Button("Clear")
             
-            output = gr.Markdown(
-                label="Analysis",
-                value="Your analysis will appear here...",
-            )
+                output = gr.Markdown(
+                    label="Analysis",
+                    value="Your analysis will appear here...",
+                )
             
-            gr.Examples(
-                examples=[
-                    ["AAPL", "What's the company's financial health based on recent SEC filings and metrics?"],
-                    ["MSFT", "How does the current valuation look considering all ratios?"],
-                    ["GOOGL", "What's the institutional ownership and recent SEC filing trends?"],
-                    ["AMZN", "Analyze the company's profitability, growth, and recent 10-K highlights"],
-                ],
-                inputs=[symbol_input, question_input],
-            )
+                gr.Examples(
+                    examples=[
+                        ["AAPL", "What's the company's financial health based on recent SEC filings and metrics?"],
+                        ["MSFT", "How does the current valuation look considering all ratios?"],
+                        ["GOOGL", "What's the institutional ownership and recent SEC filing trends?"],
+                        ["AMZN", "Analyze the company's profitability, growth, and recent 10-K highlights"],
+                    ],
+                    inputs=[symbol_input, question_input],
+                )
 
-            def clear_outputs():
-                return {
-                    symbol_input: "",
-                    question_input: "",
-                    output: "Your analysis will appear here..."
-                }
-
-            async def analyze(symbol: str, question: str) -> str:
-                try:
-                    result = await self.analyzer.ask_about_stock(question, symbol)
-                    return f"### Analysis for {symbol.upper()}\n\n{result}"
-                except Exception as e:
-                    return f"Error analyzing {symbol.upper()}: {str(e)}"
-
-            analyze_btn.click(
-                fn=analyze,
-                inputs=[symbol_input, question_input],
-                outputs=output
-            )
+                def clear_outputs():
+                    return {
+                        symbol_input: "",
+                        question_input: "",
+                        output: "Your analysis will appear here..."
+                    }
+
+                async def analyze(symbol: str, question: str) -> AsyncIterator[str]:
+                    header = f"### Analysis for {symbol.upper()}\n\n"
+                    result = ""
+                    try:
+                        async with self.queue.slot():
+                            async for chunk in self.analyzer.stream_about_stock(question, symbol):
+                                result += chunk
+                                yield header + result
+                    except QueueFullError:
+                        yield "The server is busy right now. Please try again in a moment."
+                    except Exception as e:
+                        yield f"Error analyzing {symbol.upper()}: {str(e)}"
+
+                analyze_btn.click(
+                    fn=analyze,
+                    inputs=[symbol_input, question_input],
+                    outputs=output,
+                    concurrency_limit=self.concurrency_limit
+                )
             
-            clear_btn.click(
-                fn=clear_outputs,
-                inputs=[],
-                outputs=[symbol_input, question_input, output]
+                clear_btn.click(
+                    fn=clear_outputs,
+                    inputs=[],
+                    outputs=[symbol_input, question_input, output]
+                )
+
+            with gr.Tab("Search Filings"):
+                self.build_search_tab()
+
+        # Gradio's own queue is bounded too, so the UI never holds more than the admission queue would
+        interface.queue(default_concurrency_limit=self.concurrency_limit, max_size=self.queue.max_size)
+        return interface
+
+    async def warm(self) -> None:
+        """Open this process's MongoDB connections and fill its caches for warm_symbols."""
+        started = time.perf_counter()
+        try:
+            await self.analyzer._run_blocking(self.analyzer.mongo_client.admin.command, 'ping')
+        except Exception as e:
+            logging.warning(f"MongoDB ping failed during warm-up: {str(e)}")
+
+        async def warm_symbol(symbol: str) -> None:
+            stock_data = await self.analyzer.get_stock_data_async(symbol)
+            await self.analyzer.shared_context_sections(stock_data, WARM_QUESTION)
+
+        results = await asyncio.gather(*(warm_symbol(s) for s in self.warm_symbols), return_exceptions=True)
+        for symbol, result in zip(self.warm_symbols, results):
+            if isinstance(result, Exception):
+                logging.warning(f"Could not warm {symbol}: {str(result)}")
+        self.warmed = True
+        logging.info(f"Process {os.getpid()} warmed {len(self.warm_symbols)} symbols in "
+                     f"{time.perf_counter() - started:.1f}s")
+
+    @asynccontextmanager
+    async def lifespan(self, app: FastAPI) -> AsyncIterator[None]:
+        """Warm up before accepting requests and release the I/O threads on shutdown."""
+        await self.warm()
+        yield
+        self.analyzer.executor.shutdown(wait=False)
+
+    async def api_ask(self, request: AskRequest):
+        """Answer one question as JSON; 503 with Retry-After when the queue is full."""
+        try:
+            async with self.queue.slot():
+                answer = await self.analyzer.ask_about_stock(request.question, request.symbol,
+                                                              use_cache=not request.fresh)
+        except QueueFullError as e:
+            return JSONResponse({"detail": str(e)}, status_code=503, headers={"Retry-After": "1"})
+        return {"symbol": request.symbol.upper(), "answer": answer}
+
+    def healthz(self) -> Dict[str, Any]:
+        """Report this process's warm-up state, queue counters and answer cache counters."""
+        answer_cache = self.analyzer.answer_cache
+        return {"pid": os.getpid(), "warmed": self.warmed, **self.queue.stats(),
+                "answer_cache": answer_cache.stats() if answer_cache is not None else None}
+
+    def build_app(self) -> FastAPI:
+        """Serve the Gradio UI with a JSON /api/ask endpoint, /healthz and Prometheus /metrics."""
+        app = FastAPI(lifespan=self.lifespan)
+        app.add_api_route("/api/ask", self.api_ask, methods=["POST"])
+        app.add_api_route("/healthz", self.healthz, methods=["GET"])
+        if metrics.enabled:
+            app.add_api_route(
+                "/metrics",
+                lambda: PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4"),
+                methods=["GET"]
             )
+        return gr.mount_gradio_app(app, self.build_interface(), path="")
 
-        interface.launch(
-            share=False,
-            server_name="0.0.0.0",
-            server_port=7860
-        )
+    async def run(self):
+        """Run the interactive Q&A session with Gradio UI on port 7860."""
+        config = uvicorn.Config(self.build_app(), host="0.0.0.0", port=7860)
+        await uvicorn.Server(config).serve()
 
     def ask_stock_question(self, symbol: str, question: str) -> str:
         """Handle stock question input from Gradio."""
@@ -393,11 +860,21 @@ class StockQAApp:
             return f"Error: {str(e)}"
 
 
-async def main():
+def create_app() -> FastAPI:
+    """App factory run inside each worker process when SERVE_WORKERS > 1."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    return StockQAApp().build_app()
+
+
+def main():
     """Main entry point for the application."""
-    app = StockQAApp()
-    app.run()  
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    workers = int(os.getenv('SERVE_WORKERS', '1'))
+    if workers > 1:
+        # The workers share port 7860; each one imports this module and builds its own app after it starts
+        uvicorn.run("main:create_app", factory=True, host="0.0.0.0", port=7860, workers=workers)
+    else:
+        asyncio.run(StockQAApp().run())
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,316 @@
+import logging
+import os
+import threading
+from dataclasses import dataclass, fields
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+import yfinance as yf
+from pymongo import MongoClient
+from pymongo.collection import Collection
+
+from cache import TTLCache
+
+def _slotted(cls):
+    """Rebuild a dataclass with __slots__ (dataclass(slots=True) needs Python 3.10).
+
+    Instances then have no per-object __dict__, which matters when thousands
+    of them sit in caches. Field defaults live in the generated __init__, so the
+    class attributes that would clash with the slots can be dropped.
+    """
+    names = tuple(f.name for f in fields(cls))
+    namespace = {k: v for k, v in cls.__dict__.items() if k not in names + ('__dict__', '__weakref__')}
+    namespace['__slots__'] = names
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+@_slotted
+@dataclass
+class ComprehensiveStockInfo:
+    # Basic Info
+    symbol: str
+    company_name: Optional[str] = None
+    sector: Optional[str] = None
+    industry: Optional[str] = None
+    country: Optional[str] = None
+    website: Optional[str] = None
+    
+    # Price Information
+    current_price: Optional[float] = None
+    previous_close: Optional[float] = None
+    open_price: Optional[float] = None
+    day_low: Optional[float] = None
+    day_high: Optional[float] = None
+    fifty_two_week_low: Optional[float] = None
+    fifty_two_week_high: Optional[float] = None
+    
+    # Trading Information
+    volume: Optional[int] = None
+    avg_volume: Optional[int] = None
+    avg_volume_10d: Optional[int] = None
+    avg_volume_3m: Optional[int] = None
+    
+    # Market Metrics
+    market_cap: Optional[float] = None
+    enterprise_value: Optional[float] = None
+    beta: Optional[float] = None
+    
+    # Financial Ratios
+    pe_ratio: Optional[float] = None
+    forward_pe: Optional[float] = None
+    peg_ratio: Optional[float] = None
+    price_to_book: Optional[float] = None
+    price_to_sales: Optional[float] = None
+    
+    # Dividend Information
+    dividend_rate: Optional[float] = None
+    dividend_yield: Optional[float] = None
+    ex_dividend_date: Optional[str] = None
+    
+    # Financial Metrics
+    revenue: Optional[float] = None
+    revenue_per_share: Optional[float] = None
+    revenue_growth: Optional[float] = None
+    gross_profits: Optional[float] = None
+    ebitda: Optional[float] = None
+    net_income: Optional[float] = None
+    earnings_growth: Optional[float] = None
+    
+    # Balance Sheet Metrics
+    total_cash: Optional[float] = None
+    total_debt: Optional[float] = None
+    total_assets: Optional[float] = None
+    total_liabilities: Optional[float] = None
+    
+    # Additional Metrics
+    shares_outstanding: Optional[int] = None
+    float_shares: Optional[int] = None
+    held_percent_insiders: Optional[float] = None
+    held_percent_institutions: Optional[float] = None
+    short_ratio: Optional[float] = None
+    short_percent_of_float: Optional[float] = None
+    
+    # Metadata
+    last_updated: Optional[datetime] = None
+    
+    # SEC Filings: metadata documents only; item text is read by filename when needed
+    sec_filings: Optional[List[Dict[str, Any]]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert all non-None values to a dictionary.
+
+        Values are not copied; sec_filings is the same list object. Use this
+        rather than dataclasses.asdict, which deep-copies every filing.
+        """
+        values = {}
+        for name in _STOCK_INFO_FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                values[name] = value
+        return values
+
+    @classmethod
+    def from_mongo(cls, doc: Dict[str, Any], symbol: Optional[str] = None,
+                   sec_filings: Optional[List[Dict[str, Any]]] = None) -> 'ComprehensiveStockInfo':
+        """Build from a stock_data.stocks document or a market data dict without copying values.
+
+        Keys that are not fields, such as _id or the collector's timestamps, are ignored.
+        """
+        values = {name: doc[name] for name in _STOCK_INFO_FIELDS if name in doc}
+        if symbol is not None:
+            values['symbol'] = symbol
+        if sec_filings is not None:
+            values['sec_filings'] = sec_filings
+        return cls(**values)
+
+_STOCK_INFO_FIELDS = tuple(f.name for f in fields(ComprehensiveStockInfo))
+
+# Fields that come from market data rather than from SEC filings
+MARKET_DATA_FIELDS = {
+    f.name for f in fields(ComprehensiveStockInfo) if f.name not in ('symbol', 'sec_filings')
+}
+
+# Fast-moving fields that fetch_prices derives from batched daily history, each matching its info
+# counterpart. avg_volume is left to the per-symbol info fetch, since Yahoo's averageVolume has
+# no documented window to reproduce from daily bars.
+PRICE_FIELDS = [
+    'current_price', 'previous_close', 'open_price', 'day_low', 'day_high',
+    'fifty_two_week_low', 'fifty_two_week_high',
+    'volume', 'avg_volume_10d', 'avg_volume_3m',
+]
+
+_clients: Dict[Tuple[int, str], MongoClient] = {}
+_clients_lock = threading.Lock()
+
+def get_mongo_client(mongodb_uri: str, max_pool_size: Optional[int] = None) -> MongoClient:
+    """Return the process-wide MongoClient for a URI, creating it on first use.
+
+    MongoClient is thread-safe and pools its own connections, so every component
+    in a process shares one. The pool size defaults to MONGO_MAX_POOL_SIZE.
+    Clients are keyed by process id so forked workers never reuse a parent's pool.
+    """
+    key = (os.getpid(), mongodb_uri)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            if max_pool_size is None:
+                max_pool_size = int(os.getenv('MONGO_MAX_POOL_SIZE', '100'))
+            client = MongoClient(mongodb_uri, maxPoolSize=max_pool_size)
+            _clients[key] = client
+        return client
+
+class MarketDataFetcher:
+    def __init__(self, stocks_collection: Optional[Collection] = None, cache_ttl: float = 300.0, cache_size: int = 256):
+        """Fetch market data fields for symbols from yfinance.
+
+        Shared by StockAnalyzer and StockDataCollector; it needs no Gemini setup.
+        get() caches results per symbol and, if stocks_collection is given,
+        reads fresh documents from it before calling Yahoo and writes what it
+        fetched back, so other processes share the same data and last_updated.
+        fetch() always goes to Yahoo.
+        """
+        self.stocks_collection = stocks_collection
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.mongo_hits = 0
+
+    def _safe_get(self, info: Dict[str, Any], key: str, default: Any = None) -> Any:
+        """Safely get a value from the info dictionary."""
+        try:
+            value = info.get(key, default)
+            return None if value in ['-', '', 'nan', float('nan')] else value
+        except:
+            return default
+
+    def _info_to_fields(self, info: Dict[str, Any]) -> Dict[str, Any]:
+        """Map a yfinance info dictionary onto ComprehensiveStockInfo field names."""
+        return dict(
+            company_name=self._safe_get(info, 'longName'),
+            sector=self._safe_get(info, 'sector'),
+            industry=self._safe_get(info, 'industry'),
+            country=self._safe_get(info, 'country'),
+            website=self._safe_get(info, 'website'),
+            current_price=self._safe_get(info, 'currentPrice'),
+            previous_close=self._safe_get(info, 'previousClose'),
+            open_price=self._safe_get(info, 'open'),
+            day_low=self._safe_get(info, 'dayLow'),
+            day_high=self._safe_get(info, 'dayHigh'),
+            fifty_two_week_low=self._safe_get(info, 'fiftyTwoWeekLow'),
+            fifty_two_week_high=self._safe_get(info, 'fiftyTwoWeekHigh'),
+            volume=self._safe_get(info, 'volume'),
+            avg_volume=self._safe_get(info, 'averageVolume'),
+            avg_volume_10d=self._safe_get(info, 'averageVolume10days'),
+            avg_volume_3m=self._safe_get(info, 'averageVolume3month'),
+            market_cap=self._safe_get(info, 'marketCap'),
+            enterprise_value=self._safe_get(info, 'enterpriseValue'),
+            beta=self._safe_get(info, 'beta'),
+            pe_ratio=self._safe_get(info, 'trailingPE'),
+            forward_pe=self._safe_get(info, 'forwardPE'),
+            peg_ratio=self._safe_get(info, 'pegRatio'),
+            price_to_book=self._safe_get(info, 'priceToBook'),
+            price_to_sales=self._safe_get(info, 'priceToSalesTrailing12Months'),
+            dividend_rate=self._safe_get(info, 'dividendRate'),
+            dividend_yield=self._safe_get(info, 'dividendYield'),
+            ex_dividend_date=self._safe_get(info, 'exDividendDate'),
+            revenue=self._safe_get(info, 'totalRevenue'),
+            revenue_per_share=self._safe_get(info, 'revenuePerShare'),
+            revenue_growth=self._safe_get(info, 'revenueGrowth'),
+            gross_profits=self._safe_get(info, 'grossProfits'),
+            ebitda=self._safe_get(info, 'ebitda'),
+            net_income=self._safe_get(info, 'netIncomeToCommon'),
+            earnings_growth=self._safe_get(info, 'earningsGrowth'),
+            total_cash=self._safe_get(info, 'totalCash'),
+            total_debt=self._safe_get(info, 'totalDebt'),
+            total_assets=self._safe_get(info, 'totalAssets'),
+            total_liabilities=self._safe_get(info, 'totalDebt'),
+            shares_outstanding=self._safe_get(info, 'sharesOutstanding'),
+            float_shares=self._safe_get(info, 'floatShares'),
+            held_percent_insiders=self._safe_get(info, 'heldPercentInsiders'),
+            held_percent_institutions=self._safe_get(info, 'heldPercentInstitutions'),
+            short_ratio=self._safe_get(info, 'shortRatio'),
+            short_percent_of_float=self._safe_get(info, 'shortPercentOfFloat')
+        )
+
+    def fetch(self, symbol: str) -> Dict[str, Any]:
+        """Fetch market data fields for a symbol straight from yfinance."""
+        market_data = self._info_to_fields(yf.Ticker(symbol).info)
+        # MongoDB keeps milliseconds, so the timestamp reads back exactly as it was written
+        now = datetime.utcnow()
+        market_data['last_updated'] = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        return market_data
+
+    def fetch_prices(self, symbols: List[str]) -> pd.DataFrame:
+        """Fetch price and volume fields for many symbols in one batched yfinance call.
+
+        Returns a frame indexed by symbol with one column per PRICE_FIELDS entry,
+        computed from a year of daily bars. Symbols Yahoo returns no data for are
+        left out.
+        """
+        history = yf.download(
+            symbols, period='1y', interval='1d', group_by='column',
+            auto_adjust=False, progress=False, threads=True
+        )
+        if history.empty:
+            return pd.DataFrame(columns=PRICE_FIELDS)
+        if not isinstance(history.columns, pd.MultiIndex):
+            history.columns = pd.MultiIndex.from_product([history.columns, symbols[:1]])
+
+        bars = history.ffill()
+        close, volume = bars['Close'], history['Volume']
+        prices = pd.DataFrame({
+            'current_price': close.iloc[-1],
+            'previous_close': close.iloc[-2] if len(close) > 1 else close.iloc[-1],
+            'open_price': bars['Open'].iloc[-1],
+            'day_low': bars['Low'].iloc[-1],
+            'day_high': bars['High'].iloc[-1],
+            'fifty_two_week_low': history['Low'].min(),
+            'fifty_two_week_high': history['High'].max(),
+            'volume': volume.ffill().iloc[-1],
+            'avg_volume_10d': volume.tail(10).mean(),
+            'avg_volume_3m': volume.tail(63).mean(),
+        })
+        prices.index.name = 'symbol'
+        return prices.dropna(subset=['current_price'])
+
+    def _get_stored(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """Return market data for symbol from the stocks collection if the document is still fresh."""
+        if self.stocks_collection is None:
+            return None
+        cutoff = datetime.utcnow() - timedelta(seconds=self.cache.ttl)
+        doc = self.stocks_collection.find_one(
+            {"symbol": symbol, "last_updated": {"$gte": cutoff}},
+            {"_id": 0, "sec_filings": 0, "symbol": 0}
+        )
+        if doc is None:
+            return None
+        return {k: v for k, v in doc.items() if k in MARKET_DATA_FIELDS}
+
+    def _store(self, symbol: str, market_data: Dict[str, Any]) -> None:
+        """Write freshly fetched market data to the stocks collection, the way the collector does."""
+        if self.stocks_collection is None:
+            return
+        try:
+            self.stocks_collection.update_one({'symbol': symbol}, {'$set': {'symbol': symbol, **market_data}}, upsert=True)
+        except Exception as e:
+            logging.warning(f"Could not store market data for {symbol}: {str(e)}")
+
+    def get(self, symbol: str) -> Dict[str, Any]:
+        """Fetch market data fields for a symbol: in-process cache, then MongoDB, then yfinance."""
+        market_data = self.cache.get(symbol)
+        if market_data is not None:
+            return market_data
+
+        market_data = self._get_stored(symbol)
+        if market_data is not None:
+            self.mongo_hits += 1
+        else:
+            market_data = self.fetch(symbol)
+            self._store(symbol, market_data)
+
+        self.cache.set(symbol, market_data)
+        return market_data
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return cache counters, including MongoDB read-through hits."""
+        stats = self.cache.stats()
+        stats["mongo_hits"] = self.mongo_hits
+        return stats
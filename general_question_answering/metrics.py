@@ -0,0 +1,208 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence
+
+# Seconds; Gemini calls sit at the top end, cache hits at the bottom
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Characters of prompt or response text
+SIZE_BUCKETS = (1_000, 4_000, 16_000, 64_000, 256_000, 1_000_000)
+TOKEN_BUCKETS = (250, 500, 1_000, 2_000, 4_000, 8_000, 16_000, 32_000, 128_000)
+
+request_log = logging.getLogger("stocksensei.requests")
+
+# Record of the request being handled in the current task, or None
+_current_request: contextvars.ContextVar = contextvars.ContextVar("current_request", default=None)
+_NO_TIMER = nullcontext()
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float], label: str):
+        """Prometheus histogram with a single label, safe to update from several threads."""
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label = label
+        self._series: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label: str, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then sum and count
+                series = self._series[label] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = {label: list(series) for label, series in self._series.items()}
+        for label, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f'{self.name}_bucket{{{self.label}="{label}",le="{le}"}} {cumulative}'
+            yield f'{self.name}_sum{{{self.label}="{label}"}} {series[-2]}'
+            yield f'{self.name}_count{{{self.label}="{label}"}} {series[-1]}'
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label: str):
+        """Prometheus counter with a single label."""
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = dict(self._values)
+        for label, value in sorted(values.items()):
+            yield f'{self.name}{{{self.label}="{label}"}} {value}'
+
+
+class Metrics:
+    def __init__(self, enabled: bool = True):
+        """Per-stage request timings and payload sizes, exported in Prometheus text format.
+
+        Stages are recorded into process-wide histograms and into the record of
+        the request in progress, which request() logs as one JSON line when the
+        request ends. When disabled, timers and decorators reduce to a flag check.
+
+        Args:
+            enabled (bool): Record anything at all.
+        """
+        self.enabled = enabled
+        self.stage_seconds = Histogram("stocksensei_stage_seconds", "Time spent in each request stage.",
+                                       LATENCY_BUCKETS, "stage")
+        self.payload_chars = Histogram("stocksensei_payload_chars", "Prompt and response sizes in characters.",
+                                       SIZE_BUCKETS, "kind")
+        self.payload_tokens = Histogram("stocksensei_payload_tokens", "Prompt and response sizes in tokens.",
+                                        TOKEN_BUCKETS, "kind")
+        self.requests = Counter("stocksensei_requests_total", "Questions handled, by outcome.", "outcome")
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        """Record how long a stage took."""
+        if not self.enabled:
+            return
+        self.stage_seconds.observe(stage, seconds)
+        record = _current_request.get()
+        if record is not None:
+            stages = record["stages_ms"]
+            stages[stage] = round(stages.get(stage, 0.0) + seconds * 1000, 3)
+
+    def observe_size(self, kind: str, chars: int) -> None:
+        """Record the size of a prompt or response."""
+        if not self.enabled:
+            return
+        self.payload_chars.observe(kind, chars)
+        record = _current_request.get()
+        if record is not None:
+            record[f"{kind}_chars"] = chars
+
+    def observe_tokens(self, kind: str, tokens: int, **fields: Any) -> None:
+        """Record the token count of a prompt or response, with any details for the request log."""
+        if not self.enabled:
+            return
+        self.payload_tokens.observe(kind, tokens)
+        record = _current_request.get()
+        if record is not None:
+            record[f"{kind}_tokens"] = tokens
+            record.update({f"{kind}_{key}": value for key, value in fields.items()})
+
+    @contextmanager
+    def _timer(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started)
+
+    def timer(self, stage: str):
+        """Context manager timing a block as `stage`."""
+        return self._timer(stage) if self.enabled else _NO_TIMER
+
+    def timed(self, stage: str) -> Callable:
+        """Decorator timing every call of a function or coroutine function as `stage`."""
+        def decorate(func: Callable) -> Callable:
+            if asyncio.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                    if not self.enabled:
+                        return await func(*args, **kwargs)
+                    started = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        self.observe_stage(stage, time.perf_counter() - started)
+                return async_wrapper
+
+            @wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe_stage(stage, time.perf_counter() - started)
+            return wrapper
+        return decorate
+
+    @contextmanager
+    def request(self, event: str, **fields: Any) -> Iterator[Optional[Dict[str, Any]]]:
+        """Track one request: collect its stages, then count it and log it as a JSON line."""
+        if not self.enabled:
+            yield None
+            return
+        record = {"event": event, **fields, "stages_ms": {}}
+        _current_request.set(record)
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield record
+        except (GeneratorExit, asyncio.CancelledError):
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            outcome = "error"
+            record["error"] = str(e)
+            raise
+        finally:
+            _current_request.set(None)
+            record["outcome"] = outcome
+            record["total_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            self.stage_seconds.observe(event, record["total_ms"] / 1000)
+            self.requests.inc(outcome)
+            request_log.info(json.dumps(record, default=str))
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in (self.stage_seconds, self.payload_chars, self.payload_tokens, self.requests):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every StockAnalyzer in the process; METRICS_ENABLED=0 turns recording off
+metrics = Metrics(enabled=os.getenv("METRICS_ENABLED", "1") != "0")
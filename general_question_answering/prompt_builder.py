@@ -0,0 +1,164 @@
+import hashlib
+import math
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from cache import TTLCache
+from retrieval import CHARS_PER_TOKEN, estimate_tokens
+
+TokenCounter = Callable[[str], int]
+
+TRUNCATION_MARK = " [...]"
+
+
+@dataclass
+class PromptSection:
+    name: str
+    text: str
+    # Lower numbers are filled first
+    priority: int = 10
+    # A section cut below this many tokens is dropped instead
+    min_tokens: int = 40
+    truncatable: bool = True
+
+
+@dataclass
+class FittedPrompt:
+    text: str
+    tokens: int
+    budget: int
+    # Tokens measured by the section counter; the rest of `tokens` is estimated
+    counted_tokens: int = 0
+    truncated: List[str] = field(default_factory=list)
+    dropped: List[str] = field(default_factory=list)
+
+    @property
+    def estimated_tokens(self) -> int:
+        return self.tokens - self.counted_tokens
+
+
+class GeminiTokenCounter:
+    def __init__(self, model):
+        """Token counts from the Gemini count_tokens API; one request per call."""
+        self.model = model
+
+    def __call__(self, text: str) -> int:
+        return self.model.count_tokens(text).total_tokens
+
+
+class CachedTokenCounter:
+    def __init__(self, counter: TokenCounter, maxsize: int = 10_000, workers: int = 8):
+        """Remember the token count of every distinct text so a slow counter runs once per text.
+
+        Filing passages and metric blocks recur across requests, so with
+        GeminiTokenCounter most sections cost no API call after the first
+        prompt that used them.
+
+        Args:
+            counter (Callable): The counter whose results are cached.
+            maxsize (int): Distinct texts remembered; the least recently used is forgotten.
+            workers (int): Texts count_all counts at the same time.
+        """
+        self.counter = counter
+        self.cache = TTLCache(maxsize=maxsize, ttl=math.inf)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="token-count")
+
+    def __call__(self, text: str) -> int:
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        tokens = self.cache.get(key)
+        if tokens is None:
+            tokens = self.counter(text)
+            self.cache.set(key, tokens)
+        return tokens
+
+    def count_all(self, texts: List[str]) -> List[int]:
+        """Count several texts, running the uncached ones concurrently."""
+        return list(self.executor.map(self, texts))
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Cut text to roughly `tokens` tokens at a line or word boundary."""
+    max_chars = max(0, tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARK))
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind('\n', 0, max_chars)
+    if cut < max_chars // 2:
+        cut = text.rfind(' ', 0, max_chars)
+    if cut <= 0:
+        cut = max_chars
+    return text[:cut].rstrip() + TRUNCATION_MARK
+
+
+class PromptBuilder:
+    def __init__(self, token_budget: int = 8000, counter: TokenCounter = estimate_tokens,
+                 section_counter: Optional[TokenCounter] = None):
+        """Fit prompt sections into a token budget by priority.
+
+        Sections are allocated highest priority first. A section that does not
+        fit is truncated to the tokens left, or dropped if that is below its
+        min_tokens. Counting is local by default, with the fast approximate
+        counter. A section counter, if given, counts whole sections only. Its
+        results are cached per section text, so repeated sections cost
+        nothing. The template and the truncated parts are still estimated, and
+        the fitted prompt records how many of its tokens each counter produced.
+
+        Args:
+            token_budget (int): Maximum tokens for the whole prompt.
+            counter (Callable): Fast token estimate used for allocation.
+            section_counter (Callable): Optional counter for whole sections, e.g. GeminiTokenCounter.
+        """
+        self.token_budget = token_budget
+        self.counter = counter
+        if section_counter is not None and not isinstance(section_counter, CachedTokenCounter):
+            section_counter = CachedTokenCounter(section_counter)
+        self.section_counter = section_counter
+
+    def fit(self, sections: List[PromptSection], budget: int, costs: Optional[List[int]] = None) -> FittedPrompt:
+        """Keep the sections that fit in budget tokens, in their original order.
+
+        costs holds precomputed token counts of the sections; they are estimated otherwise.
+        """
+        kept: Dict[int, str] = {}
+        truncated, dropped = [], []
+        remaining = budget
+        counted = 0
+        for i in sorted(range(len(sections)), key=lambda i: (sections[i].priority, i)):
+            section = sections[i]
+            cost = costs[i] if costs is not None else self.counter(section.text)
+            if cost <= remaining:
+                kept[i] = section.text
+                remaining -= cost
+                if costs is not None:
+                    counted += cost
+            elif section.truncatable and remaining >= section.min_tokens:
+                kept[i] = truncate_to_tokens(section.text, remaining)
+                remaining -= self.counter(kept[i])
+                truncated.append(section.name)
+            else:
+                dropped.append(section.name)
+        return FittedPrompt(
+            text="\n".join(kept[i] for i in sorted(kept)),
+            tokens=budget - remaining,
+            budget=budget,
+            counted_tokens=counted,
+            truncated=truncated,
+            dropped=dropped,
+        )
+
+    def build(self, template: Callable[[str], str], sections: List[PromptSection]) -> FittedPrompt:
+        """Render template(context) with as many sections as the token budget allows.
+
+        Args:
+            template (Callable): Turns the context text into the full prompt.
+            sections (list): Context sections to choose from.
+        """
+        fixed = self.counter(template(""))
+        budget = max(0, self.token_budget - fixed)
+        costs = self.section_counter.count_all([s.text for s in sections]) if self.section_counter is not None else None
+        fitted = self.fit(sections, budget, costs)
+
+        fitted.text = template(fitted.text)
+        fitted.tokens = fixed + fitted.tokens
+        fitted.budget = self.token_budget
+        return fitted
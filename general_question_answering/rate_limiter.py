@@ -0,0 +1,52 @@
+import asyncio
+import threading
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        """Token-bucket rate limiter shared between threads.
+
+        Tokens refill continuously at `rate` per second up to `capacity`; each
+        call to acquire() takes one, waiting if none are available. A capacity
+        above 1 allows short bursts.
+
+        Args:
+            rate (float): Sustained requests per second. Zero or less disables limiting.
+            capacity (float): Maximum burst size.
+            clock (Callable): Monotonic time source.
+        """
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: float) -> float:
+        """Take tokens from the bucket and return how long the caller must wait for them."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block until `tokens` are available."""
+        if self.rate <= 0:
+            return
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1.0) -> None:
+        """Wait without blocking the event loop until `tokens` are available."""
+        if self.rate <= 0:
+            return
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
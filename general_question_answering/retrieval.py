@@ -0,0 +1,178 @@
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cache import TTLCache
+
+# Rough characters-per-token ratio for English prose; good enough for budgeting.
+CHARS_PER_TOKEN = 4
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have',
+    'how', 'in', 'is', 'it', 'its', 'of', 'on', 'or', 'that', 'the', 'this', 'to',
+    'was', 'were', 'what', 'which', 'who', 'will', 'with', 'does', 'do', 'about',
+    'company', 'company\'s', 'based', 'these', 'their', 'our', 'we',
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9'\-]*")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of model tokens in a piece of text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case and split text into search terms, dropping stopwords."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def item_label(item_key: str) -> str:
+    """Turn a filing field name like 'item_1A' into 'Item 1A'."""
+    return "Item " + item_key.split('_', 1)[1]
+
+
+@dataclass
+class Passage:
+    item: str
+    text: str
+    filing_date: Optional[str] = None
+
+
+def chunk_filing(filing: Dict[str, Any], chunk_tokens: int = 200) -> List[Passage]:
+    """Split every item of a filing into passages of roughly chunk_tokens tokens.
+
+    Paragraphs are kept together where possible; a paragraph longer than the
+    chunk size is cut on whitespace.
+    """
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    filing_date = filing.get('filing_date')
+    passages = []
+
+    for key, text in filing.items():
+        if not key.startswith('item_') or not isinstance(text, str) or not text.strip():
+            continue
+
+        buffer = []
+        size = 0
+        for paragraph in text.split('\n'):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            while len(paragraph) > max_chars:
+                cut = paragraph.rfind(' ', 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                if buffer:
+                    passages.append(Passage(key, "\n".join(buffer), filing_date))
+                    buffer, size = [], 0
+                passages.append(Passage(key, paragraph[:cut], filing_date))
+                paragraph = paragraph[cut:].strip()
+            if size + len(paragraph) > max_chars and buffer:
+                passages.append(Passage(key, "\n".join(buffer), filing_date))
+                buffer, size = [], 0
+            buffer.append(paragraph)
+            size += len(paragraph)
+        if buffer:
+            passages.append(Passage(key, "\n".join(buffer), filing_date))
+
+    return passages
+
+
+class BM25Index:
+    def __init__(self, passages: List[Passage], k1: float = 1.5, b: float = 0.75):
+        """Build an Okapi BM25 index over a list of passages."""
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self._term_freqs = [Counter(tokenize(p.text)) for p in passages]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if passages else 0.0
+
+        doc_freqs = Counter()
+        for tf in self._term_freqs:
+            doc_freqs.update(tf.keys())
+        n = len(passages)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+
+    def search(self, query: str, top_k: int) -> List[Tuple[float, Passage]]:
+        """Return up to top_k (score, passage) pairs, best first."""
+        terms = [t for t in set(tokenize(query)) if t in self._idf]
+        if not terms:
+            return []
+
+        scored = []
+        for tf, length, passage in zip(self._term_freqs, self._lengths, self.passages):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self._avg_length)
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            if score > 0:
+                scored.append((score, passage))
+
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return scored[:top_k]
+
+
+class FilingRetriever:
+    def __init__(self, top_k: int = 8, token_budget: int = 3000, chunk_tokens: int = 200,
+                 index_cache_size: int = 64):
+        """Select the filing passages most relevant to a question.
+
+        Args:
+            top_k (int): Maximum number of passages returned per question.
+            token_budget (int): Upper bound on the estimated tokens of the returned passages.
+            chunk_tokens (int): Target passage size used when chunking filings.
+            index_cache_size (int): Tickers whose passage index is kept in memory; the least
+                recently used one is dropped beyond that and rebuilt when asked about again.
+        """
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.chunk_tokens = chunk_tokens
+        # Indexes only go stale when a ticker's filings change, which index_for checks itself
+        self._indexes = TTLCache(maxsize=index_cache_size, ttl=math.inf)
+        # Turns a filing into passages; replaced by StockAnalyzer to read pre-chunked blocks
+        self.passage_source: Callable[[Dict[str, Any]], List[Passage]] = self.chunk
+
+    def chunk(self, filing: Dict[str, Any]) -> List[Passage]:
+        """Chunk a filing with this retriever's passage size."""
+        return chunk_filing(filing, self.chunk_tokens)
+
+    @staticmethod
+    def _filings_key(filings: List[Dict[str, Any]]) -> Tuple:
+        return tuple(
+            (f.get('filename'), f.get('content_hash'), f.get('filing_date'), f.get('filing_type')) for f in filings
+        )
+
+    def index_for(self, ticker: str, filings: List[Dict[str, Any]]) -> BM25Index:
+        """Return the index for a ticker, chunking its filings only the first time they are seen."""
+        key = self._filings_key(filings)
+        cached = self._indexes.get(ticker)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        passages = []
+        for filing in filings:
+            passages.extend(self.passage_source(filing))
+        index = BM25Index(passages)
+        self._indexes.set(ticker, (key, index))
+        return index
+
+    def retrieve(self, ticker: str, filings: List[Dict[str, Any]], question: str) -> List[Passage]:
+        """Return the top passages for a question, in relevance order, within the token budget."""
+        index = self.index_for(ticker, filings)
+        selected = []
+        used = 0
+        for _, passage in index.search(question, self.top_k):
+            cost = estimate_tokens(passage.text)
+            if used + cost > self.token_budget:
+                continue
+            selected.append(passage)
+            used += cost
+        return selected
@@ -0,0 +1,286 @@
+import os
+import re
+import json
+import math
+import time
+import shutil
+import mmap
+import argparse
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from pymongo.collection import Collection
+from tqdm import tqdm
+from dotenv import load_dotenv
+from market_data import get_mongo_client
+from retrieval import chunk_filing, item_label, tokenize
+from summarize_filings import ITEM_TITLES
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SEARCH_INDEX_DIR = os.path.join(HERE, 'data', 'search_index')
+
+ITEMS = list(ITEM_TITLES)
+# Arrays saved as .npy and memory-mapped when the index is opened
+ARRAYS = ["term_offsets", "doc_ids", "tfs", "doc_lengths", "passage_items", "passage_filings", "text_offsets"]
+
+
+@dataclass
+class SearchHit:
+    score: float
+    ticker: str
+    company: str
+    sector: Optional[str]
+    filing_date: str
+    item: str
+    filename: str
+    snippet: str
+
+
+def make_snippet(text: str, terms: Iterable[str], width: int = 300, highlight: str = "") -> str:
+    """Cut a window of about width characters around the first query term, optionally wrapping terms in highlight."""
+    pattern = re.compile(r"\b(" + "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)) + r")\b",
+                         re.IGNORECASE) if terms else None
+    match = pattern.search(text) if pattern else None
+    start = max(0, (match.start() if match else 0) - width // 3)
+    if start > 0:
+        start = text.find(' ', start) + 1 or start
+    end = min(len(text), start + width)
+    if end < len(text):
+        end = text.rfind(' ', start, end) if text.rfind(' ', start, end) > start else end
+    snippet = " ".join(text[start:end].split())
+    if highlight and pattern:
+        snippet = pattern.sub(lambda m: f"{highlight}{m.group(0)}{highlight}", snippet)
+    return ("..." if start > 0 else "") + snippet + ("..." if end < len(text) else "")
+
+
+class FilingSearchIndex:
+    def __init__(self, path: str = SEARCH_INDEX_DIR):
+        """
+        Cross-company BM25 full-text search over every filing passage.
+
+        The index is built once by build() from sec_data.filings: each item is
+        chunked like the per-ticker retriever, and the postings are stored as
+        numpy arrays next to a blob of passage texts. Opening it memory-maps
+        those files, so a query touches only the postings of its own terms and
+        the texts of the passages it returns.
+
+        Args:
+            path (str): Folder written by build().
+        """
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        self.filings: List[Dict[str, Any]] = meta['filings']
+        self.vocabulary = {term: i for i, term in enumerate(meta['vocabulary'])}
+        self.k1, self.b = meta['k1'], meta['b']
+        self.avg_length = meta['avg_length']
+        self.built = meta['built']
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r'))
+        self.passage_count = len(self.doc_lengths)
+        self._texts_file = open(os.path.join(path, 'passages.txt'), 'rb')
+        self._texts = mmap.mmap(self._texts_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._filing_years = np.array([int(f['filing_date'][:4]) for f in self.filings], dtype=np.int16)
+        self._filing_sectors = np.array([f.get('sector') or '' for f in self.filings])
+        self._filing_tickers = np.array([f['ticker'] for f in self.filings])
+
+    @staticmethod
+    def build(filings: Collection, stocks: Optional[Collection] = None, path: str = SEARCH_INDEX_DIR,
+              chunk_tokens: int = 200, k1: float = 1.5, b: float = 0.75) -> Dict[str, Any]:
+        """
+        Index every filing in the collection and write the index to path.
+
+        Sectors come from the stock_data.stocks documents when stocks is given.
+        The new index replaces the old one only once it is complete.
+        """
+        started = time.perf_counter()
+        sectors = {doc['symbol']: doc.get('sector') for doc in stocks.find({}, {'symbol': 1, 'sector': 1})} \
+            if stocks is not None else {}
+        tmp = path + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        vocabulary: Dict[str, int] = {}
+        term_ids, tfs = array('i'), array('H')
+        terms_per_passage, doc_lengths = array('i'), array('i')
+        passage_items, passage_filings = array('b'), array('i')
+        text_offsets = array('q', [0])
+        filing_meta = []
+        projection = {'_id': 0, 'filename': 1, 'stock_ticker': 1, 'company': 1, 'filing_date': 1,
+                      **{item: 1 for item in ITEMS}}
+        total = filings.count_documents({})
+
+        with open(os.path.join(tmp, 'passages.txt'), 'wb') as blob:
+            cursor = filings.find({}, projection).sort([('stock_ticker', 1), ('filing_date', 1)])
+            for filing in tqdm(cursor, total=total, desc="Indexing filings", unit="filing"):
+                filing_no = len(filing_meta)
+                ticker = filing.get('stock_ticker') or ''
+                filing_meta.append({
+                    'filename': filing.get('filename'), 'ticker': ticker, 'company': filing.get('company', ''),
+                    'filing_date': filing.get('filing_date') or '0000', 'sector': sectors.get(ticker),
+                })
+                for passage in chunk_filing(filing, chunk_tokens):
+                    if passage.item not in ITEM_TITLES:
+                        continue
+                    counts = Counter(tokenize(passage.text))
+                    if not counts:
+                        continue
+                    for term, tf in counts.items():
+                        term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                        tfs.append(min(tf, 65535))
+                    terms_per_passage.append(len(counts))
+                    doc_lengths.append(sum(counts.values()))
+                    passage_items.append(ITEMS.index(passage.item))
+                    passage_filings.append(filing_no)
+                    data = passage.text.encode('utf-8')
+                    blob.write(data)
+                    text_offsets.append(text_offsets[-1] + len(data))
+
+        # Turn the per-passage term lists into per-term postings lists
+        term_ids_np = np.frombuffer(term_ids, dtype=np.int32)
+        order = np.argsort(term_ids_np, kind='stable')
+        doc_ids = np.repeat(np.arange(len(doc_lengths), dtype=np.int32), np.frombuffer(terms_per_passage, dtype=np.int32))
+        arrays = {
+            'term_offsets': np.concatenate([[0], np.cumsum(np.bincount(term_ids_np, minlength=len(vocabulary)))]),
+            'doc_ids': doc_ids[order],
+            'tfs': np.frombuffer(tfs, dtype=np.uint16)[order],
+            'doc_lengths': np.frombuffer(doc_lengths, dtype=np.int32),
+            'passage_items': np.frombuffer(passage_items, dtype=np.int8),
+            'passage_filings': np.frombuffer(passage_filings, dtype=np.int32),
+            'text_offsets': np.frombuffer(text_offsets, dtype=np.int64),
+        }
+        for name, values in arrays.items():
+            np.save(os.path.join(tmp, f'{name}.npy'), values)
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({
+                'filings': filing_meta,
+                'vocabulary': sorted(vocabulary, key=vocabulary.get),
+                'k1': k1, 'b': b,
+                'avg_length': float(arrays['doc_lengths'].mean()) if len(doc_lengths) else 0.0,
+                'built': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }, f)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.rename(tmp, path)
+        return {'filings': len(filing_meta), 'passages': len(doc_lengths), 'terms': len(vocabulary),
+                'postings': len(term_ids), 'seconds': round(time.perf_counter() - started, 1)}
+
+    def text(self, passage: int) -> str:
+        return self._texts[self.text_offsets[passage]:self.text_offsets[passage + 1]].decode('utf-8')
+
+    def sectors(self) -> List[str]:
+        return sorted({f['sector'] for f in self.filings if f.get('sector')})
+
+    def years(self) -> List[int]:
+        return sorted({int(year) for year in self._filing_years})
+
+    def _filing_mask(self, years: Optional[Iterable[int]], sectors: Optional[Iterable[str]],
+                     tickers: Optional[Iterable[str]]) -> Optional[np.ndarray]:
+        mask = None
+        for values, column in ((years, self._filing_years), (sectors, self._filing_sectors),
+                               (tickers, self._filing_tickers)):
+            if values:
+                selected = np.isin(column, list(values))
+                mask = selected if mask is None else mask & selected
+        return mask
+
+    def search(self, query: str, items: Optional[Iterable[str]] = None, years: Optional[Iterable[int]] = None,
+               sectors: Optional[Iterable[str]] = None, tickers: Optional[Iterable[str]] = None,
+               top_k: int = 10, per_company: bool = False, snippet_chars: int = 300,
+               highlight: str = "") -> List[SearchHit]:
+        """
+        Return the passages that best match a query across all companies, best first.
+
+        Args:
+            query (str): Free-text query.
+            items (Iterable[str]): Only these item fields, e.g. ["item_1A"].
+            years (Iterable[int]): Only filings made in these years.
+            sectors (Iterable[str]): Only companies in these sectors.
+            tickers (Iterable[str]): Only these companies, e.g. an index's components.
+            top_k (int): Number of results.
+            per_company (bool): Keep only the best passage of each company.
+            snippet_chars (int): Length of each snippet.
+            highlight (str): Marker placed around query terms in snippets, e.g. "**".
+        """
+        terms = [t for t in dict.fromkeys(tokenize(query)) if t in self.vocabulary]
+        if not terms or not self.passage_count:
+            return []
+
+        scores = np.zeros(self.passage_count, dtype=np.float32)
+        for term in terms:
+            term_id = self.vocabulary[term]
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs, tf = self.doc_ids[start:end], self.tfs[start:end].astype(np.float32)
+            idf = math.log(1 + (self.passage_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self.avg_length)
+            # Each passage appears once per term, so plain fancy-index addition is safe
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        candidates = np.flatnonzero(scores)
+        if items:
+            codes = [ITEMS.index(item) for item in items if item in ITEM_TITLES]
+            candidates = candidates[np.isin(self.passage_items[candidates], codes)]
+        filing_mask = self._filing_mask(years, sectors, tickers)
+        if filing_mask is not None:
+            candidates = candidates[filing_mask[self.passage_filings[candidates]]]
+        if not len(candidates):
+            return []
+
+        # Companies repeat across filings, so look further down the ranking when keeping one hit each
+        depth = min(len(candidates), top_k * (20 if per_company else 1))
+        best = candidates[np.argpartition(-scores[candidates], depth - 1)[:depth]]
+        best = best[np.argsort(-scores[best], kind='stable')]
+
+        hits, seen = [], set()
+        for passage in best:
+            filing = self.filings[self.passage_filings[passage]]
+            if per_company:
+                if filing['ticker'] in seen:
+                    continue
+                seen.add(filing['ticker'])
+            hits.append(SearchHit(
+                score=round(float(scores[passage]), 3), ticker=filing['ticker'], company=filing['company'],
+                sector=filing.get('sector'), filing_date=filing['filing_date'],
+                item=ITEMS[self.passage_items[passage]], filename=filing['filename'],
+                snippet=make_snippet(self.text(passage), terms, snippet_chars, highlight),
+            ))
+            if len(hits) == top_k:
+                break
+        return hits
+
+
+def main():
+    """Build the search index, or query it, from the command line."""
+    parser = argparse.ArgumentParser(description="Full-text search over every company's SEC filings.")
+    parser.add_argument("query", nargs="?", help="Search the existing index for this text")
+    parser.add_argument("--build", action="store_true", help="Build the index from sec_data.filings")
+    parser.add_argument("--path", default=SEARCH_INDEX_DIR, help="Index folder")
+    parser.add_argument("--items", nargs="+", default=None, help="Only these items, e.g. item_1A")
+    parser.add_argument("--years", nargs="+", type=int, default=None, help="Only filings made in these years")
+    parser.add_argument("--sectors", nargs="+", default=None, help="Only companies in these sectors")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--per-company", action="store_true", help="Best passage per company only")
+    args = parser.parse_args()
+
+    if args.build:
+        load_dotenv()
+        mongodb_uri = os.getenv('MONGODB_URI')
+        if not mongodb_uri:
+            raise ValueError("MONGODB_URI not found in environment variables")
+        client = get_mongo_client(mongodb_uri)
+        print(f"Search index built: {FilingSearchIndex.build(client.sec_data.filings, client.stock_data.stocks, args.path)}")
+    if args.query:
+        index = FilingSearchIndex(args.path)
+        started = time.perf_counter()
+        hits = index.search(args.query, items=args.items, years=args.years, sectors=args.sectors,
+                            top_k=args.top_k, per_company=args.per_company)
+        print(f"{len(hits)} results in {(time.perf_counter() - started) * 1000:.1f} ms")
+        for hit in hits:
+            print(f"{hit.score:7.2f}  {hit.ticker:6} {hit.filing_date}  {item_label(hit.item):9} {hit.snippet}")
+
+
+if __name__ == "__main__":
+    main()
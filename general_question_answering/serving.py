@@ -0,0 +1,64 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from metrics import metrics
+
+
+class QueueFullError(Exception):
+    """Raised when a request arrives while the serving queue is already full."""
+
+
+class AdmissionQueue:
+    def __init__(self, concurrency: int = 16, max_size: int = 64):
+        """Bound how many requests a process runs at once and how many may wait.
+
+        Up to `concurrency` requests run at the same time and up to `max_size`
+        more wait their turn in arrival order. Anything beyond that is rejected
+        at once with QueueFullError, so a slow Gemini call or a yfinance stall
+        turns into fast "busy" responses instead of an ever longer backlog.
+
+        Args:
+            concurrency (int): Requests running at once.
+            max_size (int): Requests allowed to wait; 0 rejects whenever all slots are busy.
+        """
+        self.concurrency = concurrency
+        self.max_size = max_size
+        self.running = 0
+        self.waiting = 0
+        # Created on first use so it binds to the event loop that serves requests
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"running": self.running, "waiting": self.waiting,
+                "concurrency": self.concurrency, "max_size": self.max_size}
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Wait for a free slot and hold it for the duration of the block.
+
+        Raises:
+            QueueFullError: If all slots are busy and max_size requests are already waiting.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if self.running + self.waiting >= self.concurrency + self.max_size:
+            if metrics.enabled:
+                metrics.requests.inc("rejected")
+            raise QueueFullError(f"Server busy: {self.running} requests running and {self.waiting} waiting")
+
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        metrics.observe_stage("queue_wait", time.perf_counter() - started)
+
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._semaphore.release()
@@ -0,0 +1,39 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    def __init__(self):
+        """Share one in-progress call per key between concurrent asyncio callers.
+
+        The first caller for a key starts the work; everyone who asks for the
+        same key while it runs awaits that same result or exception. Nothing is
+        kept once the call finishes, so results are only shared by overlapping
+        callers and longer-lived reuse is left to the caches. A caller that is
+        cancelled does not cancel the work the others are waiting for.
+        """
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the result of func(), or of the call already running for key."""
+        future = self._calls.get(key)
+        if future is None or future.get_loop() is not asyncio.get_running_loop():
+            future = asyncio.ensure_future(func())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+            self.started += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        # Mark a failure as seen even if every caller was cancelled before it arrived
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {"started": self.started, "shared": self.shared, "in_flight": len(self._calls)}
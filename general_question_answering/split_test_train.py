@@ -1,8 +1,173 @@
 import os
+import re
 import json
 import random
+import hashlib
+import argparse
 from pathlib import Path
 from shutil import copy2
+from typing import Dict, Optional, Tuple
+
+# Bytes read from each end of a filing when looking for its ticker
+SCAN_BYTES = 4096
+MANIFEST_NAME = ".split_manifest"
+TICKER_PATTERN = re.compile(rb'"stock_ticker"\s*:\s*(?:"([^"]*)"|null)')
+
+
+def _read_ends(file_path: str, size: int) -> Tuple[bytes, bytes]:
+    """Return the first and last SCAN_BYTES of a file."""
+    with open(file_path, 'rb') as f:
+        head = f.read(SCAN_BYTES)
+        if size <= 2 * SCAN_BYTES:
+            return head, head + f.read()
+        f.seek(size - SCAN_BYTES)
+        return head, f.read()
+
+
+def scan_ticker(file_path: str, size: int) -> Tuple[Optional[str], str]:
+    """
+    Find a filing's stock_ticker without parsing the whole document.
+
+    add_ticker_to_data.py appends the ticker as the last key, so the tail is
+    checked first, then the head. The full JSON is only parsed when neither
+    contains the key.
+
+    Returns:
+        Tuple of (ticker or None, fingerprint of size and both ends for the manifest).
+    """
+    head, tail = _read_ends(file_path, size)
+    fingerprint = hashlib.sha1(b"%d:" % size + head + tail).hexdigest()
+    for chunk in (tail, head):
+        match = TICKER_PATTERN.search(chunk)
+        if match:
+            return (match.group(1).decode() if match.group(1) else None), fingerprint
+    with open(file_path, 'r') as f:
+        return json.load(f).get('stock_ticker'), fingerprint
+
+
+def load_manifest(manifest_path: str) -> Dict[str, Dict]:
+    """Read the cached filename -> ticker manifest, or an empty one."""
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def build_manifest(input_folder: str, manifest_path: str) -> Dict[str, Dict]:
+    """
+    Map every filing in input_folder to its ticker, size and fingerprint.
+
+    Entries whose file size and mtime are unchanged are reused from the previous
+    run, so only new or modified files are read.
+    """
+    previous = load_manifest(manifest_path)
+    manifest = {}
+    scanned = 0
+    with os.scandir(input_folder) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.json') or not entry.is_file():
+                continue
+            stat = entry.stat()
+            cached = previous.get(entry.name)
+            if cached and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime:
+                manifest[entry.name] = cached
+                continue
+            ticker, fingerprint = scan_ticker(entry.path, stat.st_size)
+            manifest[entry.name] = {
+                'ticker': ticker, 'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': fingerprint
+            }
+            scanned += 1
+
+    if scanned or len(manifest) != len(previous):
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, separators=(',', ':'))
+        os.replace(tmp_path, manifest_path)
+    print(f"Manifest: {len(manifest)} filings, {scanned} scanned, {len(manifest) - scanned} reused")
+    return manifest
+
+
+def is_test_company(ticker: str, test_ratio: float, seed: int) -> bool:
+    """
+    Deterministically assign a company to the test set.
+
+    The decision depends only on the seed and the ticker, so adding companies
+    to the corpus never moves existing companies between train and test.
+    """
+    digest = hashlib.sha1(f"{seed}:{ticker}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64 < test_ratio
+
+
+def place_file(source: str, target: str, link: str) -> bool:
+    """
+    Put source at target as a hard link, symlink or copy; returns False if it was already there.
+
+    Hard links fall back to a copy when the folders are on different filesystems.
+    A copy whose size and modification time match the source counts as in place.
+    """
+    if os.path.lexists(target):
+        if os.path.exists(target) and os.path.samefile(source, target):
+            return False
+        if link != 'symlink' and not os.path.islink(target):
+            source_stat, target_stat = os.stat(source), os.stat(target)
+            if (source_stat.st_size, source_stat.st_mtime_ns) == (target_stat.st_size, target_stat.st_mtime_ns):
+                return False
+        os.remove(target)
+    if link == 'hard':
+        try:
+            os.link(source, target)
+            return True
+        except OSError:
+            pass
+    elif link == 'symlink':
+        os.symlink(os.path.abspath(source), target)
+        return True
+    copy2(source, target)
+    return True
+
+
+def split_dataset_fast(input_folder, train_folder, test_folder, test_ratio=0.2, seed=42, link='hard',
+                       manifest_path=None):
+    """
+    Fast, repeatable version of split_dataset for a growing corpus.
+
+    Tickers come from a cached manifest instead of parsing every file. Each
+    company is assigned by a seeded hash of its ticker. Files are hard-linked
+    (or symlinked) instead of copied, and files already in place are left alone.
+    Re-splitting therefore only touches new filings and uses no extra disk space.
+
+    Args:
+        input_folder (str): Path to the folder containing the JSON files.
+        train_folder (str): Path to the folder where training data will be stored.
+        test_folder (str): Path to the folder where testing data will be stored.
+        test_ratio (float): Proportion of companies to include in the test set.
+        seed (int): Seed for the company assignment.
+        link (str): 'hard', 'symlink' or 'copy'.
+        manifest_path (str): Manifest location, by default inside input_folder.
+    """
+    Path(train_folder).mkdir(parents=True, exist_ok=True)
+    Path(test_folder).mkdir(parents=True, exist_ok=True)
+    manifest = build_manifest(input_folder, manifest_path or os.path.join(input_folder, MANIFEST_NAME))
+
+    assignment: Dict[str, bool] = {}
+    placed = 0
+    for filename, entry in sorted(manifest.items()):
+        ticker = entry['ticker']
+        if not ticker:
+            continue
+        if ticker not in assignment:
+            assignment[ticker] = is_test_company(ticker, test_ratio, seed)
+        target_folder, other_folder = (test_folder, train_folder) if assignment[ticker] else (train_folder, test_folder)
+        stale = os.path.join(other_folder, filename)
+        if os.path.lexists(stale):
+            os.remove(stale)
+        placed += place_file(os.path.join(input_folder, filename), os.path.join(target_folder, filename), link)
+
+    test_companies = sum(assignment.values())
+    print(f"Dataset split completed: {len(assignment) - test_companies} companies in train, "
+          f"{test_companies} companies in test ({placed} files placed).")
+
 
 def split_dataset(input_folder, train_folder, test_folder, test_ratio=0.2):
     """
@@ -45,10 +210,18 @@ def split_dataset(input_folder, train_folder, test_folder, test_ratio=0.2):
     print(f"Dataset split completed: {len(train_companies)} companies in train, {len(test_companies)} companies in test.")
 
 if __name__ == "__main__":
-    # Define paths
-    input_folder = "./data/10-K"  # Folder containing the JSON files
-    train_folder = "./data/train"        # Folder for training data
-    test_folder = "./data/test"          # Folder for testing data
-    
+    parser = argparse.ArgumentParser(description="Split the 10-K filings into train and test sets by company.")
+    parser.add_argument("--input", default="./data/10-K", help="Folder containing the JSON files")
+    parser.add_argument("--train", default="./data/train", help="Folder for training data")
+    parser.add_argument("--test", default="./data/test", help="Folder for testing data")
+    parser.add_argument("--test-ratio", type=float, default=0.2)
+    parser.add_argument("--fast", action="store_true", help="Use the cached manifest, seeded split and links instead of copies")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for --fast company assignment")
+    parser.add_argument("--link", choices=["hard", "symlink", "copy"], default="hard", help="How --fast places files")
+    args = parser.parse_args()
+
     # Split the dataset
-    split_dataset(input_folder, train_folder, test_folder)
+    if args.fast:
+        split_dataset_fast(args.input, args.train, args.test, args.test_ratio, seed=args.seed, link=args.link)
+    else:
+        split_dataset(args.input, args.train, args.test, args.test_ratio)
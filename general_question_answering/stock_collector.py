@@ -1,15 +1,14 @@
-from typing import List, Set, Dict, Any
+from typing import List, Set, Dict, Any, Optional
 import yfinance as yf
-import pandas as pd
-from pymongo import MongoClient
-from datetime import datetime
-import asyncio
+from pymongo import UpdateOne
+from datetime import datetime, timedelta
 from tqdm import tqdm
 import time
-from dataclasses import asdict
 import logging
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
+from rate_limiter import TokenBucket
+from market_data import PRICE_FIELDS, MarketDataFetcher, get_mongo_client
 
 # Setup logging
 logging.basicConfig(
@@ -18,13 +17,29 @@ logging.basicConfig(
     filename='stock_collector.log'
 )
 
+CHECKPOINT_ID = 'collection_checkpoint'
+
 class StockDataCollector:
-    def __init__(self, mongodb_uri: str, db_name: str = "stock_data"):
-        """Initialize the stock data collector."""
-        self.client = MongoClient(mongodb_uri)
+    def __init__(self, mongodb_uri: str, db_name: str = "stock_data", max_workers: int = 5,
+                 requests_per_second: float = 5.0, batch_size: int = 100, max_pool_size: Optional[int] = None):
+        """Initialize the stock data collector.
+
+        Args:
+            mongodb_uri (str): URI for MongoDB connection.
+            db_name (str): Name of the MongoDB database.
+            max_workers (int): Number of threads fetching stock data.
+            requests_per_second (float): Rate limit shared by all workers.
+            batch_size (int): Number of stocks written per bulk_write call.
+            max_pool_size (int): MongoDB connection pool size; defaults to MONGO_MAX_POOL_SIZE.
+        """
+        self.client = get_mongo_client(mongodb_uri, max_pool_size)
         self.db = self.client[db_name]
         self.stocks_collection = self.db.stocks
         self.metadata_collection = self.db.metadata
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.rate_limiter = TokenBucket(rate=requests_per_second, capacity=max_workers)
+        self.fetcher = MarketDataFetcher()
         
         # Create index
         self.stocks_collection.create_index("symbol", unique=True)
@@ -57,16 +72,18 @@ class StockDataCollector:
         
         return components
 
-    def _process_stock(self, symbol: str) -> Dict[str, Any]:
-        """Process a single stock."""
+    def _process_stock(self, symbol: str, fundamentals_only: bool = False) -> Dict[str, Any]:
+        """Process a single stock, leaving price fields out if fundamentals_only is set."""
         try:
-            from main import StockAnalyzer  # Import the StockAnalyzer from main script
-            analyzer = StockAnalyzer("")  # Empty API key as we don't need Gemini here
-            stock_data = analyzer.get_stock_data(symbol)
+            self.rate_limiter.acquire()
+            stock_dict = self.fetcher.fetch(symbol)
+            if fundamentals_only:
+                for field in PRICE_FIELDS:
+                    stock_dict.pop(field, None)
             
-            # Convert to dictionary and add metadata
-            stock_dict = asdict(stock_data)
+            # Add metadata
             stock_dict['last_updated'] = datetime.utcnow()
+            stock_dict['fundamentals_updated'] = stock_dict['last_updated']
             stock_dict['symbol'] = symbol
             
             return stock_dict
@@ -74,29 +91,132 @@ class StockDataCollector:
             logging.error(f"Error processing {symbol}: {str(e)}")
             return None
 
-    def collect_stock_data(self) -> None:
-        """Collect and store stock data in MongoDB."""
-        components = self.get_index_components()
-        logging.info(f"Found {len(components)} stocks to process")
+    def _stale_symbols(self, symbols: List[str], max_age: timedelta, field: str = 'last_updated') -> List[str]:
+        """Return the symbols whose stored timestamp `field` is missing or older than max_age."""
+        cutoff = datetime.utcnow() - max_age
+        fresh = {
+            doc['symbol'] for doc in self.stocks_collection.find(
+                {'symbol': {'$in': symbols}, field: {'$gte': cutoff}},
+                {'symbol': 1, '_id': 0}
+            )
+        }
+        return [symbol for symbol in symbols if symbol not in fresh]
+
+    def _pending_from_checkpoint(self) -> Optional[List[str]]:
+        """Return the symbols an interrupted run still has to process, or None if there is none."""
+        checkpoint = self.metadata_collection.find_one({'_id': CHECKPOINT_ID})
+        if not checkpoint:
+            return None
+        completed = set(checkpoint.get('completed', []))
+        return [symbol for symbol in checkpoint['symbols'] if symbol not in completed]
+
+    def _save_batch(self, batch: List[Dict[str, Any]]) -> bool:
+        """Upsert a batch of stocks and record them as done in the checkpoint.
+
+        Returns False if the batch could not be saved.
+        """
+        try:
+            self.stocks_collection.bulk_write(
+                [UpdateOne({'symbol': d['symbol']}, {'$set': d}, upsert=True) for d in batch],
+                ordered=False
+            )
+        except Exception as e:
+            logging.error(f"Error saving batch of {len(batch)} stocks: {str(e)}")
+            return False
+        self.metadata_collection.update_one(
+            {'_id': CHECKPOINT_ID},
+            {'$addToSet': {'completed': {'$each': [d['symbol'] for d in batch]}}}
+        )
+        return True
+
+    def collect_prices(self, symbols: List[str], chunk_size: int = 200) -> int:
+        """Refresh only the price and volume fields of many symbols with batched downloads.
+
+        Returns the number of symbols updated.
+        """
+        updated = 0
+        for start in tqdm(range(0, len(symbols), chunk_size), desc="Fetching prices"):
+            chunk = symbols[start:start + chunk_size]
+            self.rate_limiter.acquire()
+            try:
+                prices = self.fetcher.fetch_prices(chunk)
+            except Exception as e:
+                logging.error(f"Error fetching prices for {len(chunk)} symbols: {str(e)}")
+                continue
+
+            now = datetime.utcnow()
+            records = prices.astype(object).where(prices.notna(), None).to_dict('index')
+            operations = [
+                UpdateOne(
+                    {'symbol': symbol},
+                    {'$set': {**fields, 'symbol': symbol, 'last_updated': now, 'prices_updated': now}},
+                    upsert=True
+                )
+                for symbol, fields in records.items()
+            ]
+            if operations:
+                self.stocks_collection.bulk_write(operations, ordered=False)
+                updated += len(operations)
+        return updated
+
+    def collect_stock_data(self, incremental: bool = False, max_age: timedelta = timedelta(hours=24),
+                           resume: bool = True, batch_prices: bool = False,
+                           fundamentals_max_age: timedelta = timedelta(days=7)) -> None:
+        """Collect and store stock data in MongoDB.
+
+        Args:
+            incremental (bool): Only refresh symbols whose last_updated is older than max_age.
+            max_age (timedelta): Staleness threshold used in incremental mode.
+            resume (bool): Continue an interrupted run from its checkpoint instead of starting over.
+            batch_prices (bool): Refresh prices for all symbols with batched downloads, and fetch
+                per-symbol info only where fundamentals are older than fundamentals_max_age.
+            fundamentals_max_age (timedelta): Refresh cadence for fundamentals in batch_prices mode.
+        """
+        symbols = self._pending_from_checkpoint() if resume else None
+        if symbols is not None:
+            logging.info(f"Resuming interrupted run with {len(symbols)} stocks left")
+        else:
+            symbols = sorted(self.get_index_components())
+            logging.info(f"Found {len(symbols)} stocks to process")
+            if incremental:
+                symbols = self._stale_symbols(symbols, max_age)
+                logging.info(f"{len(symbols)} stocks are older than {max_age} and will be refreshed")
+            if batch_prices:
+                logging.info(f"Updated prices for {self.collect_prices(symbols)} stocks")
+                symbols = self._stale_symbols(symbols, fundamentals_max_age, field='fundamentals_updated')
+                logging.info(f"{len(symbols)} stocks need their fundamentals refreshed")
+            self.metadata_collection.replace_one(
+                {'_id': CHECKPOINT_ID},
+                {'symbols': symbols, 'completed': [], 'started': datetime.utcnow()},
+                upsert=True
+            )
         
-        # Process stocks in parallel with a thread pool
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            for stock_dict in tqdm(
-                executor.map(self._process_stock, components),
-                total=len(components)
-            ):
+        # Process stocks in parallel with a thread pool; the shared rate limiter paces the workers
+        batch, failed = [], []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for symbol, stock_dict in zip(symbols, tqdm(
+                executor.map(partial(self._process_stock, fundamentals_only=batch_prices), symbols),
+                total=len(symbols)
+            )):
                 if stock_dict:
-                    try:
-                        self.stocks_collection.update_one(
-                            {'symbol': stock_dict['symbol']},
-                            {'$set': stock_dict},
-                            upsert=True
-                        )
-                    except Exception as e:
-                        logging.error(f"Error saving {stock_dict['symbol']}: {str(e)}")
-                time.sleep(0.5)  # Rate limiting
-        
+                    batch.append(stock_dict)
+                else:
+                    failed.append(symbol)
+                if len(batch) >= self.batch_size:
+                    if not self._save_batch(batch):
+                        failed.extend(d['symbol'] for d in batch)
+                    batch = []
+        if batch and not self._save_batch(batch):
+            failed.extend(d['symbol'] for d in batch)
+
+        # Keep the checkpoint so the next run retries the symbols that failed
+        if failed:
+            logging.warning(f"{len(failed)} stocks failed and remain pending in the checkpoint: "
+                            f"{', '.join(failed[:20])}")
+            return
+
         # Update metadata
+        self.metadata_collection.delete_one({'_id': CHECKPOINT_ID})
         self.metadata_collection.update_one(
             {'_id': 'collection_metadata'},
             {
@@ -113,15 +233,33 @@ class StockDataCollector:
 def main():
     """Main function to run the collector."""
     import os
+    import argparse
     from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Collect stock data into MongoDB.")
+    parser.add_argument("--incremental", action="store_true", help="Only refresh stale symbols")
+    parser.add_argument("--max-age-hours", type=float, default=24, help="Staleness threshold for --incremental")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore the checkpoint of an interrupted run")
+    parser.add_argument("--workers", type=int, default=5, help="Fetch threads")
+    parser.add_argument("--rps", type=float, default=5.0, help="Requests per second across all workers")
+    parser.add_argument("--batch-size", type=int, default=100, help="Stocks per bulk_write call")
+    parser.add_argument("--batch-prices", action="store_true",
+                        help="Fetch prices in batches and fundamentals only when older than --fundamentals-max-age-days")
+    parser.add_argument("--fundamentals-max-age-days", type=float, default=7, help="Fundamentals refresh cadence")
+    args = parser.parse_args()
     
     load_dotenv()
     mongodb_uri = os.getenv('MONGODB_URI')
     if not mongodb_uri:
         raise ValueError("MONGODB_URI not found in environment variables")
     
-    collector = StockDataCollector(mongodb_uri)
-    collector.collect_stock_data()
+    collector = StockDataCollector(mongodb_uri, max_workers=args.workers,
+                                   requests_per_second=args.rps, batch_size=args.batch_size)
+    collector.collect_stock_data(incremental=args.incremental,
+                                 max_age=timedelta(hours=args.max_age_hours),
+                                 resume=not args.no_resume,
+                                 batch_prices=args.batch_prices,
+                                 fundamentals_max_age=timedelta(days=args.fundamentals_max_age_days))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
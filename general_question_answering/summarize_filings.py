@@ -0,0 +1,216 @@
+import os
+import time
+import asyncio
+import logging
+import argparse
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import google.generativeai as genai
+from pymongo.collection import Collection
+from tqdm import tqdm
+from dotenv import load_dotenv
+from market_data import get_mongo_client
+from rate_limiter import TokenBucket
+from retrieval import item_label
+
+# Collection in the sec_data database holding one summary document per filing, keyed by filename
+SUMMARIES_COLLECTION = "filing_summaries"
+
+ITEM_TITLES = {
+    "item_1": "Business", "item_1A": "Risk Factors", "item_1B": "Unresolved Staff Comments",
+    "item_1C": "Cybersecurity", "item_2": "Properties", "item_3": "Legal Proceedings",
+    "item_4": "Mine Safety Disclosures", "item_5": "Market for Registrant's Common Equity",
+    "item_6": "Reserved", "item_7": "Management's Discussion and Analysis",
+    "item_7A": "Quantitative and Qualitative Disclosures About Market Risk",
+    "item_8": "Financial Statements and Supplementary Data",
+    "item_9": "Changes in and Disagreements with Accountants", "item_9A": "Controls and Procedures",
+    "item_9B": "Other Information", "item_9C": "Disclosure Regarding Foreign Jurisdictions that Prevent Inspections",
+    "item_10": "Directors, Executive Officers and Corporate Governance", "item_11": "Executive Compensation",
+    "item_12": "Security Ownership of Certain Beneficial Owners and Management",
+    "item_13": "Certain Relationships and Related Transactions", "item_14": "Principal Accountant Fees and Services",
+    "item_15": "Exhibits and Financial Statement Schedules", "item_16": "Form 10-K Summary",
+}
+
+SUMMARY_PROMPT = """Summarize {label} ({title}) of {company}'s {filing_type} filed on {filing_date} for an equity analyst.
+Keep concrete figures, named risks, business segments, and year-over-year trends. Leave out boilerplate and legal disclaimers.
+Write plain prose of at most {words} words.
+
+{text}"""
+
+# Bumped when SUMMARY_PROMPT changes so old summaries are redone
+PROMPT_VERSION = 1
+
+
+def filing_summaries(collection: Collection, filing: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return a filing's summary document, or None unless its current content was summarized with the current prompt.
+
+    The document's "items" maps item keys to summaries and "done" lists every
+    item the job has finished, including empty ones.
+    """
+    if not filing.get('filename'):
+        return None
+    doc = collection.find_one({"_id": filing['filename']},
+                              {"content_hash": 1, "prompt_version": 1, "items": 1, "done": 1})
+    if not doc or not doc.get('done') or doc.get('content_hash') != filing.get('content_hash'):
+        return None
+    # Summaries written with an older prompt are redone by the next run, not served
+    if doc.get('prompt_version') != PROMPT_VERSION:
+        return None
+    return doc
+
+
+class FilingSummarizer:
+    def __init__(self, filings: Collection, summaries: Collection, model, concurrency: int = 8,
+                 requests_per_second: float = 2.0, max_retries: int = 3, min_chars: int = 2000,
+                 max_words: int = 150, max_input_chars: int = 400_000):
+        """
+        Summarize every item of every filing once and store the results by filename.
+
+        Items shorter than min_chars are stored as they are. Each summary is
+        written as soon as it arrives, and filings whose content_hash matches
+        their stored summaries are skipped, so an interrupted run resumes where
+        it stopped and a reloaded filing is summarized again.
+
+        Args:
+            filings (Collection): sec_data.filings.
+            summaries (Collection): Where summaries are stored, normally sec_data.filing_summaries.
+            model: Gemini model with generate_content_async.
+            concurrency (int): Gemini calls in flight.
+            requests_per_second (float): Gemini request rate limit.
+            max_retries (int): Attempts per item before it is left for the next run.
+            min_chars (int): Items shorter than this are kept verbatim instead of summarized.
+            max_words (int): Target summary length.
+            max_input_chars (int): Item text beyond this is not sent to the model.
+        """
+        self.filings = filings
+        self.summaries = summaries
+        self.model = model
+        self.concurrency = concurrency
+        self.rate_limiter = TokenBucket(rate=requests_per_second, capacity=concurrency)
+        self.max_retries = max_retries
+        self.min_chars = min_chars
+        self.max_words = max_words
+        self.max_input_chars = max_input_chars
+        self.stats = {"filings": 0, "summarized": 0, "verbatim": 0, "failed": 0}
+
+    def pending(self, items: List[str], tickers: Optional[List[str]] = None, force: bool = False) -> List[Dict[str, Any]]:
+        """Return metadata of filings with items still to summarize, plus which of them are done."""
+        query = {"stock_ticker": {"$in": tickers}} if tickers else {}
+        done = {} if force else {
+            doc['_id']: doc for doc in self.summaries.find(
+                {"prompt_version": PROMPT_VERSION}, {"content_hash": 1, "done": 1}
+            )
+        }
+        pending = []
+        for filing in self.filings.find(query, {"_id": 0, "filename": 1, "content_hash": 1, "company": 1,
+                                                "filing_type": 1, "filing_date": 1}):
+            previous = done.get(filing['filename'])
+            finished = set(previous.get('done', [])) if previous and previous.get('content_hash') == filing.get('content_hash') else set()
+            todo = [item for item in items if item not in finished]
+            if todo:
+                pending.append({**filing, "todo": todo, "fresh": not finished})
+        return pending
+
+    async def _summarize(self, filing: Dict[str, Any], item: str, text: str) -> Optional[str]:
+        prompt = SUMMARY_PROMPT.format(
+            label=item_label(item), title=ITEM_TITLES.get(item, ""), company=filing.get('company', ''),
+            filing_type=filing.get('filing_type', '10-K'), filing_date=filing.get('filing_date', ''),
+            words=self.max_words, text=text[:self.max_input_chars]
+        )
+        for attempt in range(1, self.max_retries + 1):
+            await self.rate_limiter.acquire_async()
+            try:
+                response = await self.model.generate_content_async(prompt)
+                return response.text.strip()
+            except Exception as e:
+                logging.warning(f"{filing['filename']} {item} attempt {attempt} failed: {str(e)}")
+                await asyncio.sleep(2 ** attempt)
+        return None
+
+    def _store(self, filing: Dict[str, Any], item: str, summary: Optional[str]) -> None:
+        update = {"$addToSet": {"done": item}}
+        if summary:
+            update["$set"] = {f"items.{item}": summary}
+        self.summaries.update_one({"_id": filing['filename']}, update)
+
+    async def _process(self, filing: Dict[str, Any], progress: tqdm) -> None:
+        """Summarize the outstanding items of one filing."""
+        if filing['fresh']:
+            self.summaries.replace_one({"_id": filing['filename']}, {
+                "filename": filing['filename'], "content_hash": filing.get('content_hash'),
+                "prompt_version": PROMPT_VERSION, "items": {}, "done": [], "updated": datetime.utcnow(),
+            }, upsert=True)
+        texts = self.filings.find_one({"filename": filing['filename']}, {item: 1 for item in filing['todo']}) or {}
+        for item in filing['todo']:
+            text = (texts.get(item) or "").strip()
+            if not text or len(text) < self.min_chars:
+                self._store(filing, item, text)
+                self.stats["verbatim"] += 1
+            else:
+                summary = await self._summarize(filing, item, text)
+                if summary is None:
+                    self.stats["failed"] += 1
+                else:
+                    self._store(filing, item, summary)
+                    self.stats["summarized"] += 1
+            progress.update(1)
+        self.stats["filings"] += 1
+
+    async def run(self, items: List[str], tickers: Optional[List[str]] = None, force: bool = False,
+                  limit: Optional[int] = None) -> Dict[str, int]:
+        """Summarize every pending filing with `concurrency` workers and return counts."""
+        pending = self.pending(items, tickers, force)[:limit]
+        queue: asyncio.Queue = asyncio.Queue()
+        for filing in pending:
+            queue.put_nowait(filing)
+
+        async def worker(progress: tqdm) -> None:
+            while not queue.empty():
+                filing = queue.get_nowait()
+                try:
+                    await self._process(filing, progress)
+                except Exception as e:
+                    logging.error(f"Error summarizing {filing['filename']}: {str(e)}")
+                    self.stats["failed"] += len(filing['todo'])
+
+        with tqdm(total=sum(len(f['todo']) for f in pending), desc="Summarizing filing items", unit="item") as progress:
+            await asyncio.gather(*(worker(progress) for _ in range(self.concurrency)))
+        return dict(self.stats)
+
+
+def main():
+    """Run the summary job from the command line."""
+    parser = argparse.ArgumentParser(description="Summarize SEC filing items once and store them in MongoDB.")
+    parser.add_argument("--items", nargs="+", default=list(ITEM_TITLES), help="Item fields to summarize")
+    parser.add_argument("--tickers", nargs="+", default=None, help="Only these tickers")
+    parser.add_argument("--concurrency", type=int, default=8, help="Gemini calls in flight")
+    parser.add_argument("--rps", type=float, default=2.0, help="Gemini requests per second")
+    parser.add_argument("--min-chars", type=int, default=2000, help="Shorter items are stored verbatim")
+    parser.add_argument("--words", type=int, default=150, help="Target summary length in words")
+    parser.add_argument("--limit", type=int, default=None, help="Only process this many filings")
+    parser.add_argument("--force", action="store_true", help="Summarize again even if summaries exist")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    load_dotenv()
+    api_key = os.getenv('GEMINI_API_KEY')
+    mongodb_uri = os.getenv('MONGODB_URI')
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+    if not mongodb_uri:
+        raise ValueError("MONGODB_URI not found in environment variables")
+
+    genai.configure(api_key=api_key)
+    sec_db = get_mongo_client(mongodb_uri).sec_data
+    summarizer = FilingSummarizer(
+        sec_db.filings, sec_db[SUMMARIES_COLLECTION], genai.GenerativeModel('gemini-1.5-flash'),
+        concurrency=args.concurrency, requests_per_second=args.rps, min_chars=args.min_chars, max_words=args.words
+    )
+    started = time.perf_counter()
+    stats = asyncio.run(summarizer.run(args.items, tickers=args.tickers, force=args.force, limit=args.limit))
+    stats["seconds"] = round(time.perf_counter() - started, 1)
+    print(f"Summary job finished: {stats}")
+
+
+if __name__ == "__main__":
+    main()
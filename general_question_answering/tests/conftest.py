@@ -0,0 +1,9 @@
+import os
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Tests import the application modules and the benchmark fakes the same way the app does
+for path in (APP_DIR, os.path.join(APP_DIR, "benchmarks")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
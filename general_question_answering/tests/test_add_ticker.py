@@ -0,0 +1,41 @@
+import json
+import os
+import stat
+
+import add_ticker_to_data as enrich
+
+
+def _filing(folder, name, cik, ticker=None):
+    data = {"cik": cik, "company": "ALPHABET INC.", "item_1": "Business"}
+    if ticker:
+        data["stock_ticker"] = ticker
+    path = folder / name
+    path.write_text(json.dumps(data, indent=4))
+    return path
+
+
+def test_multi_ticker_cik_keeps_the_corpus_ticker(tmp_path):
+    _filing(tmp_path, "1652044_10K_2022.json", "1652044", "GOOGL")
+    new = _filing(tmp_path, "1652044_10K_2023.json", "1652044")
+    mapping = enrich.resolve_tickers(
+        {"0001652044": ["GOOG", "GOOGL"], "0001067983": ["BRK-A", "BRK-B"], "0000000001": ["ABC-B", "ABC"]},
+        enrich.corpus_tickers(tmp_path),
+    )
+
+    stats = enrich.enrich_folder(tmp_path, mapping, workers=1)
+
+    assert stats["updated"] == 1 and stats["skipped"] == 1
+    assert json.loads(new.read_text())["stock_ticker"] == "GOOGL"
+    # CIKs the corpus has not seen fall back to the fixed share class rule
+    assert mapping["0001067983"] == "BRK-B"
+    assert mapping["0000000001"] == "ABC"
+
+
+def test_rewritten_filing_keeps_its_mode(tmp_path):
+    path = _filing(tmp_path, "1013462_10K_2023.json", "1013462")
+    os.chmod(path, 0o644)
+
+    enrich.enrich_folder(tmp_path, {"0001013462": "ANSS"}, workers=1)
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+    assert json.loads(path.read_text())["stock_ticker"] == "ANSS"
@@ -0,0 +1,31 @@
+import time
+from datetime import datetime, timedelta
+
+import mongomock
+
+from answer_cache import AnswerCache
+
+
+def test_memory_copy_expires_with_the_stored_answer():
+    collection = mongomock.MongoClient().stock_data.answer_cache
+    cache = AnswerCache(collection, ttl=3600)
+    collection.insert_one({"_id": "key", "answer": "cached", "created_at": datetime.utcnow(),
+                           "expires_at": datetime.utcnow() + timedelta(seconds=2)})
+
+    assert cache.get("key") == "cached"
+
+    expires_at, _ = cache.memory._data["key"]
+    assert expires_at - time.monotonic() <= 2
+
+
+def test_old_answers_are_trimmed_every_few_stores():
+    collection = mongomock.MongoClient().stock_data.answer_cache
+    cache = AnswerCache(collection, ttl=3600, max_entries=3, trim_every=5)
+
+    for i in range(7):
+        cache.set(f"key-{i}", f"answer {i}")
+    assert collection.count_documents({}) == 5
+
+    for i in range(7, 10):
+        cache.set(f"key-{i}", f"answer {i}")
+    assert sorted(doc["_id"] for doc in collection.find()) == ["key-7", "key-8", "key-9"]
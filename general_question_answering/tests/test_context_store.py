@@ -0,0 +1,32 @@
+import mongomock
+
+from context_store import ContextStore
+
+
+def test_only_final_blocks_are_kept_for_good():
+    collection = mongomock.MongoClient().sec_data.context_blocks
+    builds = []
+
+    def build(complete):
+        def run():
+            builds.append(complete)
+            return {"items": [["item_1", "  • Item 1: summary"]], "complete": complete}
+        return run
+
+    def final(block):
+        return block["complete"]
+
+    store = ContextStore(collection, provisional_ttl=0)
+    store.get("summary_lines_v1:PARTIAL.json:a", build(False), final=final)
+    store.get("summary_lines_v1:PARTIAL.json:a", build(False), final=final)
+    assert builds == [False, False]
+    assert collection.count_documents({}) == 0
+
+    store.get("summary_lines_v1:DONE.json:b", build(True), final=final)
+    store.get("summary_lines_v1:DONE.json:b", build(True), final=final)
+    assert builds == [False, False, True]
+    assert collection.count_documents({}) == 1
+
+    # Another process finds the finished block in MongoDB
+    ContextStore(collection).get("summary_lines_v1:DONE.json:b", build(True), final=final)
+    assert builds == [False, False, True]
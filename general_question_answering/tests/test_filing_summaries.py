@@ -0,0 +1,53 @@
+import mongomock
+import pytest
+
+import fakes
+import load_data_into_mongodb
+import main
+import market_data
+from summarize_filings import PROMPT_VERSION, SUMMARIES_COLLECTION, filing_summaries
+
+FILING = {"filename": "ANSS_10K_2023.json", "stock_ticker": "ANSS", "filing_type": "10-K",
+          "filing_date": "2023-02-22", "company": "ANSYS INC", "content_hash": "abc",
+          "item_1": "Business text.", "item_1A": "Risk factor text.", "item_7": "MD&A text.",
+          "item_7A": "Market risk text.", "item_9A": "Controls text."}
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    for module, name in ((market_data.yf, "Ticker"), (market_data.yf, "download"),
+                         (market_data, "MongoClient"), (load_data_into_mongodb, "MongoClient")):
+        monkeypatch.setattr(module, name, getattr(module, name))
+    monkeypatch.setattr(market_data, "_clients", {})
+    client = fakes.install(fakes.FakeYahoo(latency=0, fixtures={}))
+    client.sec_data.filings.insert_one(dict(FILING))
+    analyzer = main.StockAnalyzer("test-key", "mongodb://summaries-test")
+    yield analyzer
+    analyzer.executor.shutdown(wait=True)
+    client.drop_database("sec_data")
+
+
+def test_unfinished_lettered_items_keep_their_full_text(analyzer):
+    analyzer.sec_db[SUMMARIES_COLLECTION].insert_one({
+        "_id": FILING["filename"], "content_hash": "abc", "prompt_version": PROMPT_VERSION,
+        "items": {"item_1": "Short business summary."}, "done": ["item_1", "item_7"],
+    })
+    metadata = {key: FILING[key] for key in main.FILING_METADATA_FIELDS if key in FILING}
+
+    lines = dict(analyzer.filing_summary_lines(metadata))
+
+    assert lines["item_1"] == "  • Item 1: Short business summary."
+    assert "item_7" not in lines
+    assert lines["item_1A"] == "  • Item 1A: Risk factor text."
+    assert lines["item_7A"] == "  • Item 7A: Market risk text."
+    assert lines["item_9A"] == "  • Item 9A: Controls text."
+
+
+def test_summaries_from_an_older_prompt_are_not_served():
+    collection = mongomock.MongoClient().sec_data[SUMMARIES_COLLECTION]
+    collection.insert_one({"_id": FILING["filename"], "content_hash": "abc", "prompt_version": PROMPT_VERSION - 1,
+                           "items": {"item_1": "Old summary."}, "done": ["item_1"]})
+    assert filing_summaries(collection, FILING) is None
+
+    collection.update_one({"_id": FILING["filename"]}, {"$set": {"prompt_version": PROMPT_VERSION}})
+    assert filing_summaries(collection, FILING)["items"] == {"item_1": "Old summary."}
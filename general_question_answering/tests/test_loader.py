@@ -0,0 +1,38 @@
+import mongomock
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from context_store import CONTEXT_BLOCKS_COLLECTION
+from load_data_into_mongodb import _flush
+
+
+class PartlyFailingCollection:
+    """Applies an unordered batch except the operations at failing indices, like MongoDB does."""
+
+    def __init__(self, failing):
+        self.database = mongomock.MongoClient().sec_data
+        self.collection = self.database.filings
+        self.failing = failing
+
+    def bulk_write(self, operations, ordered=True):
+        applied = [op for i, op in enumerate(operations) if i not in self.failing]
+        result = self.collection.bulk_write(applied, ordered=ordered)
+        raise BulkWriteError({
+            "writeErrors": [{"index": i, "code": 11000, "errmsg": "E11000 duplicate key"} for i in self.failing],
+            "nInserted": 0, "nUpserted": result.upserted_count, "nModified": result.modified_count,
+        })
+
+
+def test_bulk_write_error_fails_only_the_listed_writes():
+    collection = PartlyFailingCollection(failing={1})
+    blocks = collection.database[CONTEXT_BLOCKS_COLLECTION]
+    blocks.insert_many([{"filename": f"F{i}.json"} for i in range(3)])
+    operations = [UpdateOne({"filename": f"F{i}.json"}, {"$set": {"item_1": "text"}}, upsert=True) for i in range(3)]
+    operations.append(UpdateOne({"filename": "OLD.json"}, {"$set": {"source_mtime": 1.0}}))
+    stats = {"loaded": 0, "errors": 0}
+
+    _flush(collection, operations, ["F0.json", "F1.json", "F2.json", None], stats)
+
+    assert stats == {"loaded": 2, "errors": 1}
+    assert sorted(doc["filename"] for doc in collection.collection.find()) == ["F0.json", "F2.json"]
+    assert [doc["filename"] for doc in blocks.find()] == ["F1.json"]
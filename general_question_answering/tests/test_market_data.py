@@ -0,0 +1,14 @@
+from market_data import PRICE_FIELDS, MarketDataFetcher
+from fakes import FakeYahoo
+
+
+def test_batched_prices_leave_avg_volume_to_info(monkeypatch):
+    yahoo = FakeYahoo(latency=0, fixtures={})
+    monkeypatch.setattr("market_data.yf.download", yahoo.download)
+
+    prices = MarketDataFetcher().fetch_prices(["AAPL", "MSFT"])
+
+    assert list(prices.columns) == PRICE_FIELDS
+    assert "avg_volume" not in prices.columns
+    assert sorted(prices.index) == ["AAPL", "MSFT"]
+    assert (prices["avg_volume_10d"] > 0).all() and (prices["avg_volume_3m"] > 0).all()
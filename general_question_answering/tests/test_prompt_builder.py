@@ -0,0 +1,37 @@
+from prompt_builder import PromptBuilder, PromptSection
+
+
+def _template(context):
+    return f"Answer the question.\n{context}"
+
+
+def _sections():
+    return [PromptSection(f"passage_{i}", f"Passage {i} about revenue and margins. " * 20, priority=i)
+            for i in range(6)]
+
+
+def test_sections_are_counted_locally_by_default():
+    fitted = PromptBuilder(token_budget=500).build(_template, _sections())
+
+    assert fitted.counted_tokens == 0
+    assert fitted.estimated_tokens == fitted.tokens <= 500
+    assert fitted.dropped or fitted.truncated
+
+
+def test_section_counts_are_cached_per_section():
+    counted = []
+
+    def remote_counter(text):
+        counted.append(text)
+        return len(text.split())
+
+    builder = PromptBuilder(token_budget=500, section_counter=remote_counter)
+    first = builder.build(_template, _sections())
+    second = builder.build(_template, _sections())
+
+    assert first.counted_tokens == second.counted_tokens > 0
+    # The template and any truncated section are still estimated
+    assert first.estimated_tokens > 0
+    assert first.counted_tokens + first.estimated_tokens == first.tokens
+    assert len(counted) == 6
+    assert second.text == first.text
@@ -0,0 +1,19 @@
+from retrieval import FilingRetriever
+
+
+def _filings(ticker):
+    return [{"filename": f"{ticker}_10K_2023.json", "item_1": "Revenue grew across every segment. " * 50}]
+
+
+def test_index_cache_keeps_only_recent_tickers():
+    retriever = FilingRetriever(index_cache_size=2)
+    first = retriever.index_for("AAPL", _filings("AAPL"))
+    retriever.index_for("MSFT", _filings("MSFT"))
+    assert retriever.index_for("AAPL", _filings("AAPL")) is first
+
+    retriever.index_for("NVDA", _filings("NVDA"))
+
+    assert len(retriever._indexes) == 2
+    # MSFT was the least recently used, so it is rebuilt while AAPL is still cached
+    assert retriever.index_for("AAPL", _filings("AAPL")) is first
+    assert retriever._indexes.stats()["misses"] == 3
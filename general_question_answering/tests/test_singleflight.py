@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+import fakes
+import load_data_into_mongodb
+import main
+import market_data
+from singleflight import SingleFlight
+
+SYMBOL = "ANSS"
+QUESTIONS = [
+    "What are the main risks?",
+    "How does the company make money?",
+    "What does management say about liquidity?",
+]
+PARAGRAPH = ("The company develops simulation software used by engineers to design products. Revenue comes from "
+             "subscription and perpetual licenses, maintenance and services sold to customers worldwide. ")
+
+
+class CountingCollection:
+    """Counts find() calls on a collection and passes everything else through."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.finds = 0
+
+    def find(self, *args, **kwargs):
+        self.finds += 1
+        return self.collection.find(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+class CountingDatabase:
+    def __init__(self, database, filings: CountingCollection):
+        self.database = database
+        self.filings = filings
+
+    def __getitem__(self, name):
+        return self.filings if name == "filings" else self.database[name]
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    # Let monkeypatch restore what fakes.install replaces
+    for module, name in ((market_data.yf, "Ticker"), (market_data.yf, "download"),
+                         (market_data, "MongoClient"), (load_data_into_mongodb, "MongoClient")):
+        monkeypatch.setattr(module, name, getattr(module, name))
+    monkeypatch.setattr(market_data, "_clients", {})
+    yahoo = fakes.FakeYahoo(latency=0.05, fixtures={})
+    client = fakes.install(yahoo)
+    client.sec_data.filings.insert_many([
+        {"filename": f"{SYMBOL}_10K_{year}.json", "stock_ticker": SYMBOL, "filing_type": "10-K",
+         "filing_date": f"{year}-02-20", "company": "ANSYS INC", "content_hash": str(year),
+         "item_1": PARAGRAPH * 20, "item_1A": PARAGRAPH * 20, "item_7": PARAGRAPH * 20}
+        for year in (2022, 2023)
+    ])
+    analyzer = main.StockAnalyzer("test-key", "mongodb://singleflight-test")
+    analyzer.model = fakes.StubGeminiModel(latency=0.01, tokens_per_sec=1e6, response_tokens=10)
+    analyzer.filings = CountingCollection(analyzer.sec_db.filings)
+    analyzer.sec_db = CountingDatabase(analyzer.sec_db, analyzer.filings)
+    analyzer.yahoo = yahoo
+    yield analyzer
+    analyzer.executor.shutdown(wait=True)
+    client.drop_database("sec_data")
+    client.drop_database("stock_data")
+
+
+def test_concurrent_asks_share_one_fetch(analyzer):
+    async def ask_all():
+        return await asyncio.gather(*(
+            analyzer.ask_about_stock(QUESTIONS[i % len(QUESTIONS)], SYMBOL) for i in range(30)
+        ))
+
+    answers = asyncio.run(ask_all())
+
+    assert all(answers)
+    assert analyzer.yahoo.calls == 1
+    assert analyzer.filings.finds == 1
+    assert analyzer.in_flight.shared > 0
+    assert analyzer.in_flight.stats()["in_flight"] == 0
+
+
+def test_leader_exception_reaches_every_waiter(analyzer):
+    calls = []
+    fetch_filings = analyzer.get_sec_filings
+
+    def failing_filings(*args, **kwargs):
+        calls.append(args)
+        raise RuntimeError("filings unavailable")
+
+    analyzer.get_sec_filings = failing_filings
+
+    async def fetch_all():
+        return await asyncio.gather(*(analyzer.get_stock_data_async(SYMBOL) for _ in range(10)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(fetch_all())
+
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len({id(result) for result in results}) == 1
+    assert analyzer.in_flight.stats()["in_flight"] == 0
+
+    # The key was released, so the next call fetches again and succeeds
+    analyzer.get_sec_filings = fetch_filings
+    stock_data = asyncio.run(analyzer.get_stock_data_async(SYMBOL))
+    assert [f["filename"] for f in stock_data.sec_filings] == [f"{SYMBOL}_10K_2023.json"]
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("key", slow))
+        second = asyncio.ensure_future(flight.do("key", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(run()) == ("done", True)
+    assert flight.stats() == {"started": 1, "shared": 1, "in_flight": 0}
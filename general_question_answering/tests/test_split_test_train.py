@@ -0,0 +1,22 @@
+import os
+
+from split_test_train import place_file
+
+
+def test_copy_is_skipped_when_size_and_mtime_match(tmp_path):
+    source = tmp_path / "AAPL_10K_2023.json"
+    source.write_text('{"item_1": "Apple designs phones."}')
+    target = tmp_path / "train" / source.name
+    target.parent.mkdir()
+
+    assert place_file(str(source), str(target), "copy")
+    assert not place_file(str(source), str(target), "copy")
+
+    # An edited source has a new size or mtime and is copied again
+    source.write_text('{"item_1": "Apple designs phones and computers."}')
+    assert place_file(str(source), str(target), "copy")
+    assert target.read_text() == source.read_text()
+
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert place_file(str(source), str(target), "copy")
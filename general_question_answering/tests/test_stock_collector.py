@@ -0,0 +1,56 @@
+import mongomock
+
+import market_data
+import stock_collector
+from fakes import FakeYahoo
+
+
+def test_collector_run_opens_one_mongo_client(monkeypatch):
+    created = []
+
+    def counting_client(*args, **kwargs):
+        client = mongomock.MongoClient()
+        created.append(client)
+        return client
+
+    monkeypatch.setattr(market_data, "MongoClient", counting_client)
+    monkeypatch.setattr(market_data, "_clients", {})
+    monkeypatch.setattr(stock_collector.yf, "Ticker", FakeYahoo(latency=0, fixtures={}).Ticker)
+    monkeypatch.setattr(stock_collector.StockDataCollector, "get_index_components",
+                        lambda self: {"AAPL", "MSFT", "NVDA"})
+
+    collector = stock_collector.StockDataCollector("mongodb://collector-test", max_workers=2,
+                                                   requests_per_second=1000, batch_size=2)
+    collector.collect_stock_data(resume=False)
+
+    assert len(created) == 1
+    assert collector.stocks_collection.count_documents({}) == 3
+
+
+def test_failed_symbols_stay_pending_in_the_checkpoint(monkeypatch):
+    monkeypatch.setattr(market_data, "MongoClient", lambda *args, **kwargs: mongomock.MongoClient())
+    monkeypatch.setattr(market_data, "_clients", {})
+    monkeypatch.setattr(stock_collector.yf, "Ticker", FakeYahoo(latency=0, fixtures={}).Ticker)
+    monkeypatch.setattr(stock_collector.StockDataCollector, "get_index_components",
+                        lambda self: {"AAPL", "MSFT", "NVDA"})
+
+    collector = stock_collector.StockDataCollector("mongodb://collector-retry-test", max_workers=2,
+                                                   requests_per_second=1000, batch_size=2)
+    fetch = collector.fetcher.fetch
+
+    def flaky_fetch(symbol):
+        if symbol == "MSFT":
+            raise RuntimeError("rate limited")
+        return fetch(symbol)
+
+    monkeypatch.setattr(collector.fetcher, "fetch", flaky_fetch)
+    collector.collect_stock_data(resume=False)
+
+    assert collector._pending_from_checkpoint() == ["MSFT"]
+    assert collector.metadata_collection.find_one({"_id": "collection_metadata"}) is None
+
+    monkeypatch.setattr(collector.fetcher, "fetch", fetch)
+    collector.collect_stock_data()
+
+    assert collector._pending_from_checkpoint() is None
+    assert collector.metadata_collection.find_one({"_id": "collection_metadata"})["total_stocks"] == 3
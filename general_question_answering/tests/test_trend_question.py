@@ -0,0 +1,33 @@
+import pytest
+
+from main import TREND_QUESTION
+
+
+@pytest.mark.parametrize("question", [
+    "How has revenue changed over the last three years?",
+    "How did the risk factors evolve?",
+    "Has the company grown its customer base?",
+    "What is the trend in gross margin?",
+    "Show the year-over-year change in operating income",
+    "What is the YoY growth in subscriptions?",
+    "What happened to debt since 2019?",
+    "How did cash flow develop from 2020 to 2023?",
+    "Is liquidity better compared to the prior year?",
+    "What did management say in the past few filings about supply chains?",
+])
+def test_change_over_time_questions_match(question):
+    assert TREND_QUESTION.search(question)
+
+
+@pytest.mark.parametrize("question", [
+    "What is the company's growth strategy?",
+    "How does it differ from competitors?",
+    "How does the company make money?",
+    "What are the main risks?",
+    "Compare the business segments",
+    "What has management said about liquidity?",
+    "Describe the company's history",
+    "Which products changed the industry?",
+])
+def test_other_questions_do_not_match(question):
+    assert not TREND_QUESTION.search(question)